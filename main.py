@@ -1,45 +1,121 @@
+import time
+_MODULE_STARTED = time.perf_counter()
+
 import json
+import csv
 import tempfile
-from flask import Flask, request, jsonify, make_response
+import itertools
+import hashlib
+import urllib.request
+import bisect
+import hmac
+import queue
+import struct
+import zlib
+import gzip
+import gc
+import atexit
+import re
+from array import array
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from flask import Flask, Response, request, jsonify, make_response, g
 from flask_caching import Cache
+from werkzeug.serving import WSGIRequestHandler, make_server
+from werkzeug.wsgi import ClosingIterator
 import random
 from datetime import datetime, timedelta
-import pytz
 import uuid
 import logging
-from colorama import init, Fore, Style, Back
-import click
+from colorama import Fore, Style, Back
 import sys
 import os
 import flask
-import flask.cli
 import signal
 import platform
-import time
-
-# 禁用Flask的CLI消息
-flask.cli.show_server_banner = lambda *args: None
-
-# 初始化colorama，确保Windows下的颜色支持
-init(autoreset=True, convert=True, strip=False)
+import threading
+from functools import lru_cache
 
 # 检测系统类型和终端编码
 SYSTEM = platform.system().lower()
 IS_WINDOWS = SYSTEM == 'windows'
 
-# Windows终端编码设置
-if IS_WINDOWS:
-    # 设置控制台代码页
-    os.system('chcp 65001')
-    # 设置终端编码
-    sys.stdout.reconfigure(encoding='utf-8')
-    sys.stderr.reconfigure(encoding='utf-8')
+# 启动耗时记录
+class StartupTimer:
+    """记录启动各阶段耗时，供 --import-time 报告使用"""
+    def __init__(self, origin):
+        self.origin = origin
+        self.last = origin
+        self.phases = []
+
+    def mark(self, name):
+        """记录从上一个标记到现在的耗时"""
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    @contextmanager
+    def phase(self, name):
+        """记录一个代码块的耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.phases.append((name, now - started))
+            self.last = now
+
+    def report(self):
+        """生成耗时报告文本"""
+        total = sum(elapsed for _, elapsed in self.phases) or 1e-9
+        width = max(len(name) for name, _ in self.phases) if self.phases else 0
+        lines = [f"{'阶段'.ljust(width)}  {'耗时(ms)':>10}  {'占比':>6}"]
+        for name, elapsed in self.phases:
+            lines.append(f"{name.ljust(width)}  {elapsed * 1000:>10.2f}  {elapsed / total:>6.1%}")
+        lines.append(f"{'合计'.ljust(width)}  {total * 1000:>10.2f}")
+        return "\n".join(lines)
+
+STARTUP = StartupTimer(_MODULE_STARTED)
+STARTUP.mark('导入依赖 (flask, flask_caching, colorama)')
+
+def init_terminal():
+    """初始化终端：颜色支持、Windows控制台编码、屏蔽Flask启动信息
+    只在作为服务启动时调用，导入模块时不产生任何副作用
+    """
+    from colorama import init
+    import flask.cli
+
+    # 禁用Flask的CLI消息
+    flask.cli.show_server_banner = lambda *args: None
+
+    # 初始化colorama，确保Windows下的颜色支持
+    init(autoreset=True, convert=True, strip=False)
+
+    # Windows终端编码设置
+    if IS_WINDOWS:
+        import ctypes
+        # 设置控制台代码页，避免启动子进程执行chcp
+        ctypes.windll.kernel32.SetConsoleOutputCP(65001)
+        # 设置终端编码
+        sys.stdout.reconfigure(encoding='utf-8')
+        sys.stderr.reconfigure(encoding='utf-8')
 
-# 记录启动时间
-START_TIME = datetime.now()
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    """获取时区对象，首次使用时才导入pytz"""
+    import pytz
+    return pytz.timezone(name)
 
 # 跨平台文件锁实现
 class FileLock:
+    """非阻塞的文件锁，锁被占用时立即抛出异常
+
+    acquired/failures 累计本进程获取锁的成功和失败次数，失败意味着这次读写被放弃。
+    """
+    acquired = 0
+    failures = 0
+    _counter_lock = threading.Lock()
+
     def __init__(self, file_path):
         """初始化文件锁
         Args:
@@ -60,10 +136,14 @@ class FileLock:
                 import fcntl
                 self.file = open(self.lock_file, 'w')
                 fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            with FileLock._counter_lock:
+                FileLock.acquired += 1
             return self
         except (IOError, OSError) as e:
             if self.file:
                 self.file.close()
+            with FileLock._counter_lock:
+                FileLock.failures += 1
             logger.error(f"获取文件锁失败: {str(e)}")
             raise
             
@@ -85,12 +165,714 @@ class FileLock:
         except Exception as e:
             logger.error(f"释放文件锁失败: {str(e)}")
 
+    @classmethod
+    def stats(cls):
+        """本进程获取文件锁的成功、失败次数和失败率"""
+        attempts = cls.acquired + cls.failures
+        return {
+            "acquired": cls.acquired,
+            "failures": cls.failures,
+            "failure_rate": round(cls.failures / attempts, 4) if attempts else 0.0
+        }
+
+# 探针就绪状态
+class ReadinessState:
+    """就绪状态登记表
+
+    各子系统（统计存储、缓存、日志）在健康状况变化时登记到这里，
+    探针响应只在状态变化时重新生成，/readyz 直接返回预编码的字节。
+    """
+    CHECK_INTERVAL = 5.0  # 拉取式检查的最小间隔（秒）
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._degraded = {}
+        self._checks = {}
+        self._next_check = 0.0
+        self.response = None
+        self._rebuild()
+
+    def add_check(self, component, check):
+        """注册拉取式检查，check() 返回 (是否正常, 原因)"""
+        self._checks[component] = check
+        self._next_check = 0.0
+
+    def mark(self, component, ok, reason=None):
+        """登记组件状态，状态未变化时不做任何事"""
+        if ok and component not in self._degraded:
+            return
+        if not ok and self._degraded.get(component) == (reason or 'degraded'):
+            return
+        with self._lock:
+            if ok:
+                self._degraded.pop(component, None)
+            else:
+                self._degraded[component] = reason or 'degraded'
+            self._rebuild()
+        if not ok:
+            logger.warning(f"服务就绪状态降级: {component} ({reason or 'degraded'})")
+
+    def refresh(self):
+        """按间隔执行拉取式检查，间隔内直接复用上次结果"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.CHECK_INTERVAL
+        for component, check in list(self._checks.items()):
+            try:
+                ok, reason = check()
+            except Exception as e:
+                ok, reason = False, str(e)
+            self.mark(component, ok, reason)
+
+    @property
+    def ready(self):
+        return not self._degraded
+
+    def _rebuild(self):
+        """重新生成 /readyz 的状态行、响应头和响应体"""
+        if self._degraded:
+            status = '503 Service Unavailable'
+            body = json.dumps({"status": "not_ready", "degraded": dict(sorted(self._degraded.items()))},
+                              ensure_ascii=False).encode('utf-8')
+        else:
+            status = '200 OK'
+            body = b'{"status":"ready"}'
+        self.response = (status, _probe_headers(body), [body])
+
+def _probe_headers(body):
+    """探针响应头，只在生成响应体时计算一次"""
+    return [
+        ('Content-Type', 'application/json; charset=utf-8'),
+        ('Content-Length', str(len(body))),
+        ('Cache-Control', 'no-store'),
+    ]
+
+# 存活探针的响应是固定的
+_HEALTHZ_BODY = b'{"status":"alive"}'
+_HEALTHZ_RESPONSE = ('200 OK', _probe_headers(_HEALTHZ_BODY), [_HEALTHZ_BODY])
+
+class ProbeMiddleware:
+    """在进入Flask之前直接应答 /healthz 和 /readyz
+
+    探针不经过路由、before_request/after_request 以及统计记录，
+    每次请求只做一次路径比较和一次属性读取。
+    """
+    def __init__(self, wsgi_app, readiness):
+        self.wsgi_app = wsgi_app
+        self.readiness = readiness
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO')
+        if path == '/healthz':
+            status, headers, body = _HEALTHZ_RESPONSE
+        elif path == '/readyz':
+            self.readiness.refresh()
+            status, headers, body = self.readiness.response
+        else:
+            return self.wsgi_app(environ, start_response)
+        start_response(status, headers)
+        return body
+
+READINESS = ReadinessState()
+
+# 错误聚合
+class ErrorAggregator:
+    """定长错误环形缓冲区和按指纹聚合的错误统计
+
+    - 最近的错误保存在定长deque中，追加为O(1)
+    - 异常类型和消息模板相同的错误合并为一条聚合记录（次数、首次和最近出现时间），
+      重复的错误不会把其他错误挤出记录
+    - 聚合记录数量有上限，超出时淘汰最久没有再出现的记录
+
+    内存上限只由两个容量和消息截断长度决定，与错误数量无关。
+    """
+    MAX_MESSAGE_LENGTH = 500
+    # 生成消息模板时替换的可变部分
+    TEMPLATE_PATTERNS = [
+        (re.compile(r"'[^']*'|\"[^\"]*\""), '<str>'),
+        (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<uuid>'),
+        (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<hex>'),
+        (re.compile(r'\d+(?:\.\d+)?'), '<num>'),
+    ]
+    SORT_KEYS = ('count', 'last_seen', 'first_seen')
+
+    def __init__(self, capacity=10, group_capacity=100):
+        """
+        Args:
+            capacity: 保留的最近错误条数
+            group_capacity: 保留的聚合记录条数
+        """
+        self.capacity = capacity
+        self.group_capacity = group_capacity
+        self.recent = deque(maxlen=capacity)
+        self.groups = OrderedDict()
+        self.recorded = 0  # 本进程记录过的错误总数，用于识别新增错误
+        self._merged_counts = {}  # 上次与统计文件合并后各聚合记录的计数
+        self._lock = threading.Lock()
+
+    @classmethod
+    def template(cls, message):
+        """把消息中的数字、字符串、ID等可变部分替换为占位符"""
+        for pattern, placeholder in cls.TEMPLATE_PATTERNS:
+            message = pattern.sub(placeholder, message)
+        return message
+
+    @classmethod
+    def fingerprint(cls, error_type, template):
+        """异常类型和消息模板的指纹"""
+        return hashlib.sha1(f"{error_type}:{template}".encode('utf-8')).hexdigest()[:12]
+
+    def record(self, error, timestamp=None):
+        """记录一条错误
+        Args:
+            error: 异常对象或错误消息
+            timestamp: 错误时间字符串，默认为当前时间
+        """
+        if isinstance(error, BaseException):
+            error_type = type(error).__name__
+        else:
+            error_type = 'Error'
+        message = str(error)[:self.MAX_MESSAGE_LENGTH]
+        template = self.template(message)
+        fingerprint = self.fingerprint(error_type, template)
+        timestamp = timestamp or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        with self._lock:
+            self.recorded += 1
+            self.recent.appendleft({
+                'time': timestamp,
+                'error': message,
+                'type': error_type,
+                'fingerprint': fingerprint
+            })
+            group = self.groups.get(fingerprint)
+            if group:
+                group['count'] += 1
+                group['last_seen'] = timestamp
+                group['last_message'] = message
+                self.groups.move_to_end(fingerprint)
+            else:
+                self.groups[fingerprint] = {
+                    'fingerprint': fingerprint,
+                    'type': error_type,
+                    'template': template,
+                    'count': 1,
+                    'first_seen': timestamp,
+                    'last_seen': timestamp,
+                    'last_message': message
+                }
+                if len(self.groups) > self.group_capacity:
+                    self.groups.popitem(last=False)
+
+    def recent_errors(self):
+        """最近的错误，新的在前"""
+        with self._lock:
+            return list(self.recent)
+
+    def group_list(self):
+        """全部聚合记录，按最近出现时间从旧到新"""
+        with self._lock:
+            return [dict(group) for group in self.groups.values()]
+
+    def page(self, page=1, per_page=20, sort='count'):
+        """分页查询聚合记录
+        Args:
+            page: 页码，从1开始
+            per_page: 每页条数
+            sort: 排序字段，count/last_seen/first_seen，均为降序
+        """
+        # 请求线程在锁内插入和移动聚合记录，先在锁内复制再排序分页
+        with self._lock:
+            groups = [dict(group) for group in self.groups.values()]
+        groups.sort(key=lambda group: group[sort], reverse=True)
+        start = (page - 1) * per_page
+        return {
+            'total': len(groups),
+            'page': page,
+            'per_page': per_page,
+            'pages': (len(groups) + per_page - 1) // per_page,
+            'items': groups[start:start + per_page]
+        }
+
+    def load(self, recent, groups):
+        """从统计文件恢复"""
+        with self._lock:
+            self.recent = deque(recent[:self.capacity], maxlen=self.capacity)
+            self.groups = OrderedDict(
+                (group['fingerprint'], group) for group in groups[-self.group_capacity:]
+                if 'fingerprint' in group
+            )
+            self._merged_counts = {fingerprint: group['count'] for fingerprint, group in self.groups.items()}
+
+    def merge(self, recent, groups):
+        """与统计文件中（包含其他进程的）错误记录合并，合并结果同时成为本进程的记录
+
+        聚合记录只累加本进程自上次合并以来新增的计数，多次合并不会重复计数。
+        Returns:
+            (最近的错误, 聚合记录)，格式与统计文件相同
+        """
+        with self._lock:
+            merged = {group['fingerprint']: dict(group) for group in groups if 'fingerprint' in group}
+            for fingerprint, group in self.groups.items():
+                existing = merged.get(fingerprint)
+                if existing is None:
+                    merged[fingerprint] = dict(group)
+                    continue
+                existing['count'] += max(0, group['count'] - self._merged_counts.get(fingerprint, 0))
+                existing['first_seen'] = min(existing['first_seen'], group['first_seen'])
+                if group['last_seen'] >= existing['last_seen']:
+                    existing['last_seen'] = group['last_seen']
+                    existing['last_message'] = group['last_message']
+            ordered = sorted(merged.values(), key=lambda group: group['last_seen'])[-self.group_capacity:]
+            self.groups = OrderedDict((group['fingerprint'], group) for group in ordered)
+            self._merged_counts = {group['fingerprint']: group['count'] for group in ordered}
+
+            seen = set()
+            latest = []
+            for error in sorted(list(self.recent) + list(recent), key=lambda error: error['time'], reverse=True):
+                key = (error['time'], error.get('type'), error['error'])
+                if key not in seen:
+                    seen.add(key)
+                    latest.append(error)
+            self.recent = deque(latest[:self.capacity], maxlen=self.capacity)
+            return list(self.recent), [dict(group) for group in ordered]
+
+    def clear(self):
+        """清空所有错误记录"""
+        with self._lock:
+            self.recent.clear()
+            self.groups.clear()
+            self._merged_counts = {}
+
+# 统计计数预写日志
+class StatsJournal:
+    """统计计数的追加式二进制日志
+
+    请求只把计数增量累加到内存，后台线程每隔 interval 秒把累积的增量编码成一帧
+    追加到日志文件（组提交），定期把日志合并进 flask_api_stats.json 快照后清空日志。
+
+    日志文件格式：
+    - 文件头：魔数 b'SJL1' + 8字节代号，每次清空日志时更换代号
+    - 帧：魔数 b'SJ'、负载长度、负载CRC32，负载为最后请求时间和若干 (类别, 键, 增量)
+    快照中记录已合并的日志代号和偏移，合并后、清空前崩溃也不会重复计数；
+    末尾写了一半的帧通过CRC识别并丢弃。
+    """
+    HEADER = struct.Struct('<4s8s')
+    FRAME = struct.Struct('<2sII')
+    HEADER_MAGIC = b'SJL1'
+    FRAME_MAGIC = b'SJ'
+    # 帧内的计数类别与快照字段的对应关系，b'T' 为总请求数
+    FIELDS = {b'M': 'request_methods', b'S': 'status_codes', b'E': 'endpoints'}
+
+    def __init__(self, stats_file, interval=0.05, checkpoint_interval=30.0,
+                 max_bytes=1024 * 1024, fsync=False):
+        """
+        Args:
+            stats_file: 快照文件路径，日志文件与其同名、扩展名为 .journal
+            interval: 组提交间隔（秒）
+            checkpoint_interval: 合并快照的间隔（秒）
+            max_bytes: 日志超过该大小时提前合并
+            fsync: 每次提交后是否fsync，关闭时只保证进程崩溃不丢数据
+        """
+        self.stats_file = stats_file
+        self.path = os.path.splitext(stats_file)[0] + '.journal'
+        self.interval = interval
+        self.checkpoint_interval = checkpoint_interval
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.commits = 0
+        self.checkpoints = 0
+        self._pending = {}
+        self._last_request = 0.0
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._checkpoint_requested = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._snapshot_fn = None
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0))
+
+    def add(self, deltas, last_request=None):
+        """累加计数增量，不做任何I/O
+        Args:
+            deltas: (类别, 键, 增量) 序列
+            last_request: 最后请求时间戳
+        """
+        with self._lock:
+            pending = self._pending
+            for kind, key, delta in deltas:
+                pending[kind, key] = pending.get((kind, key), 0) + delta
+            if last_request is not None:
+                self._last_request = last_request
+
+    def start(self, snapshot_fn):
+        """启动后台提交线程
+        Args:
+            snapshot_fn: 合并快照时调用，参数为快照加日志的合并结果（快照不存在时只含日志中的计数），
+                返回要写入的快照
+        """
+        self._snapshot_fn = snapshot_fn
+        self._thread = threading.Thread(target=self._run, name='stats-journal', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def discard(self):
+        """启动失败时关闭日志文件，不提交也不合并"""
+        self._stop.set()
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+    def request_checkpoint(self):
+        """在下一次提交时合并快照"""
+        self._checkpoint_requested.set()
+
+    def close(self):
+        """停止后台线程，提交剩余增量并合并快照"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        try:
+            self.checkpoint(self._snapshot_fn)
+        except Exception as e:
+            logger.error(f"合并统计快照失败: {str(e)}")
+        os.close(self._fd)
+
+    def _run(self):
+        next_checkpoint = time.monotonic() + self.checkpoint_interval
+        while not self._stop.wait(self.interval):
+            try:
+                self.commit()
+                if (self._checkpoint_requested.is_set() or time.monotonic() >= next_checkpoint
+                        or os.fstat(self._fd).st_size >= self.max_bytes):
+                    self._checkpoint_requested.clear()
+                    self.checkpoint(self._snapshot_fn)
+                    next_checkpoint = time.monotonic() + self.checkpoint_interval
+                READINESS.mark('stats', True)
+            except Exception as e:
+                logger.error(f"写入统计日志失败: {str(e)}")
+                READINESS.mark('stats', False, f"写入统计日志失败: {str(e)}")
+
+    def commit(self):
+        """把累积的增量编码为一帧追加到日志"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            last_request = self._last_request
+        if not pending:
+            return
+        parts = [struct.pack('<dI', last_request, len(pending))]
+        for (kind, key), delta in pending.items():
+            encoded = key.encode('utf-8')[:255]
+            parts.append(struct.pack('<cB', kind, len(encoded)))
+            parts.append(encoded)
+            parts.append(struct.pack('<q', delta))
+        payload = b''.join(parts)
+        frame = self.FRAME.pack(self.FRAME_MAGIC, len(payload), zlib.crc32(payload)) + payload
+        with self._io_lock, self._locked(shared=True):
+            if os.fstat(self._fd).st_size == 0:
+                self._write_header()
+            os.write(self._fd, frame)
+            if self.fsync:
+                os.fsync(self._fd)
+        self.commits += 1
+
+    def checkpoint(self, snapshot_fn=None):
+        """把快照和日志合并写回快照文件，然后清空日志
+        Returns:
+            写入的快照
+        """
+        self.commit()
+        with self._io_lock, self._locked(shared=False):
+            stats, generation, end = self._merged()
+            if snapshot_fn is not None:
+                stats = snapshot_fn(stats)
+            stats['journal'] = {'generation': generation.hex() if generation else None, 'offset': end}
+            temp_file = f"{self.stats_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(stats, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.stats_file)
+            # 快照落盘后再清空日志并更换代号
+            os.ftruncate(self._fd, 0)
+            self._write_header()
+        self.checkpoints += 1
+        return stats
+
+    def read(self):
+        """读取快照加日志重放的结果（包含其他进程已提交的增量），不写入任何文件"""
+        with self._io_lock, self._locked(shared=True):
+            stats, _, _ = self._merged()
+        return stats
+
+    def with_pending(self, stats):
+        """计数加上本进程尚未提交的增量，返回新的字典，不修改stats"""
+        merged = {'total_requests': stats.get('total_requests', 0),
+                  'last_request_time': stats.get('last_request_time')}
+        for field in self.FIELDS.values():
+            merged[field] = dict(stats.get(field) or {})
+        with self._lock:
+            pending = list(self._pending.items())
+            last_request = self._last_request
+        for (kind, key), delta in pending:
+            self._apply(merged, kind, key, delta)
+        if last_request:
+            merged['last_request_time'] = max(merged['last_request_time'] or '',
+                                              datetime.fromtimestamp(last_request).isoformat())
+        return merged
+
+    def _merged(self):
+        """读取快照并重放日志中尚未合并的帧，调用方持有日志锁
+        Returns:
+            (合并结果, 日志代号, 最后一个完整帧的结束偏移)
+        """
+        data = self._read_journal()
+        generation, offset = self._parse_header(data)
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            stats = {}
+        folded = stats.get('journal') or {}
+        if generation is not None and folded.get('generation') == generation.hex():
+            offset = folded.get('offset', offset)
+        end = self.replay(stats, data, offset)
+        return stats, generation, end
+
+    @classmethod
+    def _apply(cls, stats, kind, key, delta):
+        """把一个计数增量应用到统计字典"""
+        if kind == b'T':
+            stats['total_requests'] = stats.get('total_requests', 0) + delta
+        else:
+            counters = stats.setdefault(cls.FIELDS[kind], {})
+            counters[key] = counters.get(key, 0) + delta
+
+    @classmethod
+    def replay(cls, stats, data, offset):
+        """把日志中offset之后的帧应用到快照
+        Returns:
+            最后一个完整帧的结束偏移
+        """
+        stats.setdefault('total_requests', 0)
+        last_request = 0.0
+        while offset + cls.FRAME.size <= len(data):
+            magic, length, crc = cls.FRAME.unpack_from(data, offset)
+            start = offset + cls.FRAME.size
+            payload = data[start:start + length]
+            if magic != cls.FRAME_MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+                break  # 写了一半的帧
+            timestamp, count = struct.unpack_from('<dI', payload)
+            last_request = max(last_request, timestamp)
+            pos = 12
+            for _ in range(count):
+                kind, size = struct.unpack_from('<cB', payload, pos)
+                key = payload[pos + 2:pos + 2 + size].decode('utf-8', 'replace')
+                delta, = struct.unpack_from('<q', payload, pos + 2 + size)
+                pos += 10 + size
+                cls._apply(stats, kind, key, delta)
+            offset = start + length
+        if last_request:
+            stats['last_request_time'] = max(stats.get('last_request_time') or '',
+                                             datetime.fromtimestamp(last_request).isoformat())
+        return offset
+
+    def _read_journal(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def _parse_header(self, data):
+        """返回 (代号, 第一帧的偏移)，文件头缺失时代号为None"""
+        if len(data) < self.HEADER.size:
+            return None, len(data)
+        magic, generation = self.HEADER.unpack_from(data)
+        if magic != self.HEADER_MAGIC:
+            return None, len(data)
+        return generation, self.HEADER.size
+
+    def _write_header(self):
+        os.write(self._fd, self.HEADER.pack(self.HEADER_MAGIC, os.urandom(8)))
+
+    @contextmanager
+    def _locked(self, shared):
+        """跨进程锁定日志文件：追加时共享锁，合并时独占锁（Windows上均为独占）"""
+        if os.name == 'nt':
+            import msvcrt
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+# 定长计数表
+class CounterTable:
+    """键集合基本固定的计数表
+
+    已知键的计数存放在 array('q') 的固定槽位中，按预先建立的索引直接定位，
+    不为每个计数单独分配整数和字符串对象；未知键放在溢出字典中。
+    对外仍以字符串为键，与统计文件格式一致。
+    """
+    __slots__ = ('_index', '_keys', '_counts', '_overflow', '_parse')
+
+    def __init__(self, keys, parse=str):
+        """
+        Args:
+            keys: 已知键
+            parse: 把统计文件中的字符串键转换为内部键
+        """
+        self._keys = tuple(keys)
+        self._index = {key: i for i, key in enumerate(self._keys)}
+        self._counts = array('q', bytes(8 * len(self._keys)))
+        self._overflow = {}
+        self._parse = parse
+
+    def add(self, key, count=1):
+        """累加计数"""
+        i = self._index.get(key)
+        if i is None:
+            self._overflow[key] = self._overflow.get(key, 0) + count
+        else:
+            self._counts[i] += count
+
+    def items(self):
+        """非零计数的 (字符串键, 计数)"""
+        for key, count in zip(self._keys, self._counts):
+            if count:
+                yield str(key), count
+        for key, count in self._overflow.items():
+            yield str(key), count
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def load(self, counts):
+        """从统计文件的字典加载计数"""
+        self.clear()
+        for key, count in counts.items():
+            try:
+                key = self._parse(key)
+            except ValueError:
+                pass
+            self.add(key, count)
+        return self
+
+    def clear(self):
+        for i in range(len(self._counts)):
+            self._counts[i] = 0
+        self._overflow.clear()
+
+# 延迟直方图
+class LatencyHistogram:
+    """固定桶边界的延迟直方图
+
+    桶边界对所有实例相同，多个进程或节点的直方图按桶相加即可合并。
+    百分位数取所在桶的上界，精度由桶边界决定。
+    """
+    BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.counts = array('q', bytes(8 * (len(self.BOUNDS_MS) + 1)))  # 最后一个桶为超过上限的请求
+        self.sum_ms = 0.0
+
+    def observe(self, ms, weight=1):
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += weight
+        self.sum_ms += ms * weight
+
+    def to_dict(self):
+        return self.render(list(self.counts), self.sum_ms)
+
+    @classmethod
+    def render(cls, counts, sum_ms):
+        """直方图字典，附带总数、平均值和估算的百分位数"""
+        total = sum(counts)
+        return {
+            "bounds_ms": list(cls.BOUNDS_MS),
+            "counts": counts,
+            "count": total,
+            "sum_ms": round(sum_ms, 3),
+            "avg_ms": round(sum_ms / total, 3) if total else 0.0,
+            "p50_ms": cls.percentile(counts, 50),
+            "p95_ms": cls.percentile(counts, 95),
+            "p99_ms": cls.percentile(counts, 99)
+        }
+
+    @classmethod
+    def percentile(cls, counts, pct):
+        """所在桶的上界，落在溢出桶时为None"""
+        total = sum(counts)
+        if not total:
+            return 0
+        rank = pct / 100.0 * total
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return cls.BOUNDS_MS[i] if i < len(cls.BOUNDS_MS) else None
+        return None
+
+    @classmethod
+    def merge(cls, histograms):
+        """合并多个 to_dict() 结果，桶边界不同的直方图被忽略"""
+        counts = [0] * (len(cls.BOUNDS_MS) + 1)
+        sum_ms = 0.0
+        for histogram in histograms:
+            if not histogram or histogram.get("bounds_ms") != list(cls.BOUNDS_MS):
+                continue
+            for i, count in enumerate(histogram["counts"]):
+                counts[i] += count
+            sum_ms += histogram.get("sum_ms", 0.0)
+        return cls.render(counts, sum_ms)
+
+HTTP_METHODS = ('GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'HEAD', 'OPTIONS')
+STATUS_CODES = range(100, 600)
+
 # 全局状态变量
 class ServiceStatus:
     def __init__(self):
         """初始化服务状态"""
         self.stats_file = os.path.join(tempfile.gettempdir(), 'flask_api_stats.json')
-        self._load_or_init_stats()
+        self.error_log = ErrorAggregator(
+            capacity=int(os.environ.get('ERROR_BUFFER_CAPACITY', 10)),
+            group_capacity=int(os.environ.get('ERROR_GROUP_CAPACITY', 100))
+        )
+        self._lock = threading.Lock()
+        self.journal = None
+        if os.environ.get('STATS_JOURNAL', '1') != '0':
+            try:
+                self._start_journal()
+            except Exception as e:
+                # 与直接读写统计文件时一样，统计不可用不应使所有请求失败
+                logger.error(f"启用统计预写日志失败，改为直接读写统计文件: {str(e)}")
+                READINESS.mark('stats:journal', False, f"启用统计预写日志失败: {str(e)}")
+                if self.journal is not None:
+                    self.journal.discard()
+                self.journal = None
+        if self.journal is None:
+            self._load_or_init_stats()
+
+    def _start_journal(self):
+        """打开预写日志，载入快照加日志重放的结果并启动后台提交线程"""
+        # 计数增量写入预写日志，统计文件只在合并快照时重写
+        self.journal = StatsJournal(
+            self.stats_file,
+            interval=int(os.environ.get('STATS_JOURNAL_INTERVAL_MS', 50)) / 1000,
+            checkpoint_interval=float(os.environ.get('STATS_CHECKPOINT_INTERVAL', 30)),
+            fsync=os.environ.get('STATS_JOURNAL_FSYNC', '0') == '1'
+        )
+        self._init_fields()
+        self.journal.checkpoint(self._adopt_snapshot)
+        self.journal.start(self._merge_snapshot)
         
     def _load_or_init_stats(self):
         """
@@ -117,15 +899,7 @@ class ServiceStatus:
                 with FileLock(self.stats_file):
                     try:
                         with open(self.stats_file, 'r', encoding='utf-8') as f:
-                            stats = json.load(f)
-                            self.start_time = datetime.fromisoformat(stats.get('start_time', datetime.now().isoformat()))
-                            self.total_requests = stats.get('total_requests', 0)
-                            self.last_request_time = datetime.fromisoformat(stats['last_request_time']) if stats.get('last_request_time') else None
-                            self.active_connections = stats.get('active_connections', 0)
-                            self.request_methods = stats.get('request_methods', {})
-                            self.status_codes = stats.get('status_codes', {})
-                            self.endpoints = stats.get('endpoints', {})
-                            self.errors = stats.get('errors', [])
+                            self._apply_snapshot(json.load(f))
                     except (json.JSONDecodeError, ValueError) as e:
                         logger.error(f"解析统计文件失败: {str(e)}")
                         self._init_stats()
@@ -135,35 +909,105 @@ class ServiceStatus:
             logger.error(f"加载统计信息失败: {str(e)}")
             self._init_stats()
 
-    def _init_stats(self):
-        """初始化统计信息"""
+    def _apply_snapshot(self, stats):
+        """用统计文件的内容设置统计字段"""
+        self.start_time = datetime.fromisoformat(stats.get('start_time', datetime.now().isoformat()))
+        self.total_requests = stats.get('total_requests', 0)
+        self.last_request_time = datetime.fromisoformat(stats['last_request_time']) if stats.get('last_request_time') else None
+        self.active_connections = stats.get('active_connections', 0)
+        self.request_methods = CounterTable(HTTP_METHODS).load(stats.get('request_methods', {}))
+        self.status_codes = CounterTable(STATUS_CODES, parse=int).load(stats.get('status_codes', {}))
+        self.endpoints = stats.get('endpoints', {})
+        self.latency = LatencyHistogram()
+        self.error_log.load(stats.get('errors', []), stats.get('error_groups', []))
+
+    def _init_fields(self):
+        """把统计字段设为初始值"""
         self.start_time = datetime.now()
         self.total_requests = 0
         self.last_request_time = None
         self.active_connections = 0
-        self.request_methods = {}
-        self.status_codes = {}
+        self.request_methods = CounterTable(HTTP_METHODS)
+        self.status_codes = CounterTable(STATUS_CODES, parse=int)
         self.endpoints = {}
-        self.errors = []
-        self._save_stats()
+        self.latency = LatencyHistogram()
+        self.error_log.clear()
+
+    def _init_stats(self):
+        """初始化统计信息"""
+        self._init_fields()
+        if self.journal:
+            # 丢弃快照和日志中已有的计数
+            self.journal.checkpoint(lambda stats: self._snapshot())
+        else:
+            self._save_stats()
+
+    def _snapshot(self):
+        """统计文件格式的当前统计信息"""
+        with self._lock:
+            return {
+                'start_time': self.start_time.isoformat(),
+                'total_requests': self.total_requests,
+                'last_request_time': self.last_request_time.isoformat() if self.last_request_time else None,
+                'active_connections': self.active_connections,
+                'request_methods': self.request_methods.to_dict(),
+                'status_codes': self.status_codes.to_dict(),
+                'endpoints': dict(self.endpoints),
+                'errors': self.error_log.recent_errors(),
+                'error_groups': self.error_log.group_list()
+            }
+
+    def _adopt_snapshot(self, stats):
+        """启动时：采用快照加日志重放的结果，快照不存在时初始化"""
+        if 'start_time' in stats:
+            try:
+                self._apply_snapshot(stats)
+            except ValueError as e:
+                logger.error(f"解析统计文件失败: {str(e)}")
+                self._init_fields()
+        return self._snapshot()
+
+    def _merge_snapshot(self, stats):
+        """定期合并：计数以快照加日志为准（包含其他进程的增量），合并结果同时载入内存；
+        错误记录与快照中的合并，启动时间和活跃连接数以本进程内存为准
+        """
+        if 'start_time' not in stats:
+            return self._snapshot()
+        snapshot = self._snapshot()
+        for field in ('start_time', 'active_connections'):
+            stats[field] = snapshot[field]
+        stats['errors'], stats['error_groups'] = self.error_log.merge(stats.get('errors', []),
+                                                                      stats.get('error_groups', []))
+        self._adopt_counters(stats)
+        return stats
+
+    def _adopt_counters(self, stats):
+        """用快照加日志的计数（加上本进程尚未提交的增量）替换内存中的计数
+        刚更新内存、尚未写入日志的增量暂时不计入，下一次载入时补上
+        """
+        with self._lock:
+            counts = self.journal.with_pending(stats)
+            self.total_requests = counts['total_requests']
+            if counts['last_request_time']:
+                last_request = datetime.fromisoformat(counts['last_request_time'])
+                if self.last_request_time is None or last_request > self.last_request_time:
+                    self.last_request_time = last_request
+            self.request_methods.load(counts['request_methods'])
+            self.status_codes.load(counts['status_codes'])
+            self.endpoints = counts['endpoints']
 
     def _save_stats(self):
         """
         保存统计信息到文件。
         使用FileLock确保并发安全，使用临时文件确保写入原子性。
+        启用预写日志时只请求在下一次提交时合并快照。
         """
+        if self.journal:
+            self.journal.request_checkpoint()
+            return
         temp_file = f"{self.stats_file}.tmp"
         try:
-            stats = {
-                'start_time': self.start_time.isoformat(),
-                'total_requests': self.total_requests,
-                'last_request_time': self.last_request_time.isoformat() if self.last_request_time else None,
-                'active_connections': self.active_connections,
-                'request_methods': self.request_methods,
-                'status_codes': self.status_codes,
-                'endpoints': self.endpoints,
-                'errors': self.errors
-            }
+            stats = self._snapshot()
             
             with FileLock(self.stats_file):
                 # 先写入临时文件
@@ -176,9 +1020,11 @@ class ServiceStatus:
                     
                 # 原子性地重命名临时文件
                 os.replace(temp_file, self.stats_file)
+            READINESS.mark('stats', True)
                 
         except Exception as e:
             logger.error(f"保存统计信息失败: {str(e)}")
+            READINESS.mark('stats', False, f"保存统计信息失败: {str(e)}")
             # 清理临时文件
             if os.path.exists(temp_file):
                 try:
@@ -186,39 +1032,78 @@ class ServiceStatus:
                 except OSError:
                     pass
 
-    def request_started(self):
-        """记录请求开始"""
-        self.active_connections += 1
-        # 记录请求方法
+    def request_started(self, weight=1):
+        """记录请求开始
+        Args:
+            weight: 计数权重，抽样统计时为抽样间隔N
+        """
         method = request.method
-        self.request_methods[method] = self.request_methods.get(method, 0) + 1
-        # 记录端点访问
         endpoint = request.endpoint or 'unknown'
-        self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
-        self._save_stats()
+        with self._lock:
+            self.active_connections += 1
+            # 记录请求方法
+            self.request_methods.add(method, weight)
+            # 记录端点访问
+            self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + weight
+        self._commit(((b'M', method, weight), (b'E', endpoint, weight)))
 
     def request_finished(self):
         """记录请求结束"""
-        self.active_connections = max(0, self.active_connections - 1)
-        self._save_stats()
+        with self._lock:
+            self.active_connections = max(0, self.active_connections - 1)
+        self._commit(())
 
-    def record_request(self):
+    def record_request(self, weight=1):
         """记录新的请求"""
-        self.total_requests += 1
-        self.last_request_time = datetime.now()
-        self._save_stats()
+        now = datetime.now()
+        with self._lock:
+            self.total_requests += weight
+            self.last_request_time = now
+        self._commit(((b'T', '', weight),), now.timestamp())
 
-    def record_status_code(self, status_code):
+    def record_status_code(self, status_code, weight=1):
         """记录响应状态码"""
-        self.status_codes[str(status_code)] = self.status_codes.get(str(status_code), 0) + 1
-        self._save_stats()
+        with self._lock:
+            self.status_codes.add(status_code, weight)
+        self._commit(((b'S', str(status_code), weight),))
+
+    def record_latency(self, ms, weight=1):
+        """记录请求处理耗时（毫秒），只保存在内存中"""
+        with self._lock:
+            self.latency.observe(ms, weight)
+
+    def _commit(self, deltas, last_request=None):
+        """持久化计数变化
+        启用预写日志时只在内存中累加增量，由后台线程组提交；否则整体重写统计文件
+        """
+        if self.journal:
+            if deltas:
+                self.journal.add(deltas, last_request)
+        else:
+            self._save_stats()
+
+    def flush(self):
+        """停止前持久化所有计数：启用预写日志时提交剩余增量并合并快照，否则重写统计文件"""
+        if self.journal:
+            self.journal.close()
+        else:
+            self._save_stats()
+
+    def record_error(self, error, save=True):
+        """记录错误信息
+        Args:
+            error: 异常对象或错误消息
+            save: 是否立即保存，调用方随后会保存统计时传False避免重复写文件
+        """
+        self.error_log.record(error)
+        if save:
+            self._save_stats()
 
-    def record_error(self, error_msg):
-        """记录错误信息，保留最近的10条"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        self.errors.insert(0, {'time': timestamp, 'error': error_msg})
-        self.errors = self.errors[:10]  # 只保留最近10条错误
-        self._save_stats()
+    def get_error_groups(self, page=1, per_page=20, sort='count'):
+        """分页获取错误聚合记录"""
+        if not self.journal:
+            self._load_or_init_stats()
+        return self.error_log.page(page, per_page, sort)
 
     def get_uptime(self):
         """获取服务运行时间
@@ -227,20 +1112,31 @@ class ServiceStatus:
         """
         return datetime.now() - self.start_time
 
-    def get_statistics(self):
-        """获取完整的统计信息"""
-        # 重新加载统计信息以确保数据最新
-        self._load_or_init_stats()
-        return {
-            "uptime": str(self.get_uptime()),
-            "total_requests": self.total_requests,
-            "active_connections": self.active_connections,
-            "last_request": self.last_request_time.strftime('%Y-%m-%d %H:%M:%S') if self.last_request_time else None,
-            "request_methods": dict(sorted(self.request_methods.items())),
-            "status_codes": dict(sorted(self.status_codes.items())),
-            "popular_endpoints": dict(sorted(self.endpoints.items(), key=lambda x: x[1], reverse=True)),
-            "recent_errors": self.errors
-        }
+    def get_statistics(self, reload=True):
+        """获取完整的统计信息
+        Args:
+            reload: 未启用预写日志时是否先从文件重新加载
+        """
+        # 重新加载统计信息以包含其他进程的计数：启用预写日志时读取快照加日志，否则重新读取统计文件
+        if reload and self.journal:
+            try:
+                self._adopt_counters(self.journal.read())
+            except (OSError, ValueError) as e:
+                logger.error(f"读取统计日志失败: {str(e)}")
+        elif reload:
+            self._load_or_init_stats()
+        with self._lock:
+            return {
+                "uptime": str(self.get_uptime()),
+                "total_requests": self.total_requests,
+                "active_connections": self.active_connections,
+                "last_request": self.last_request_time.strftime('%Y-%m-%d %H:%M:%S') if self.last_request_time else None,
+                "request_methods": dict(sorted(self.request_methods.items())),
+                "status_codes": dict(sorted(self.status_codes.items())),
+                "popular_endpoints": dict(sorted(self.endpoints.items(), key=lambda x: x[1], reverse=True)),
+                "latency": self.latency.to_dict(),
+                "recent_errors": self.error_log.recent_errors()
+            }
 
     def reset(self):
         """重置服务状态"""
@@ -248,9 +1144,22 @@ class ServiceStatus:
 
 # 监控数据存储
 class MonitoringDataStore:
-    def __init__(self):
-        """初始化监控数据存储"""
-        self.monitoring_dir = "monitoring"
+    """按日期分文件保存监控记录
+
+    记录先进入本进程的待写队列，再追加到监控文件。文件锁被其他进程占用时记录留在队列中，
+    由下一次保存或停止时的 flush 写入，不会因为一次锁冲突而丢失。
+    """
+    def __init__(self, monitoring_dir="monitoring", max_pending=1000):
+        """初始化监控数据存储
+        Args:
+            max_pending: 待写队列的上限，文件长期无法写入时只保留最新的记录
+        """
+        self.monitoring_dir = monitoring_dir
+        self.max_pending = max_pending
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        # 本进程内同一时间只有一个线程写文件，文件锁只在进程之间竞争
+        self._write_lock = threading.Lock()
         self.ensure_dir_exists()
         
     def ensure_dir_exists(self):
@@ -263,36 +1172,80 @@ class MonitoringDataStore:
         date_str = datetime.now().strftime("%Y-%m-%d")
         return os.path.join(self.monitoring_dir, f"monitoring-{date_str}.json")
     
+    @property
+    def pending(self):
+        """尚未写入文件的记录数"""
+        return len(self._pending)
+
     def save_metrics(self, metrics):
         """保存监控指标"""
-        try:
-            file_path = self.get_current_date_file()
-            with FileLock(file_path):
-                # 读取现有数据或初始化新文件
-                if os.path.exists(file_path):
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                else:
-                    data = {"records": []}
-                
-                # 添加新记录
-                data["records"].append({
-                    "timestamp": datetime.now().isoformat(),
-                    "metrics": metrics
-                })
-                
-                # 写入文件
-                temp_file = f"{file_path}.tmp"
-                with open(temp_file, "w", encoding="utf-8") as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False)
-                
-                # 原子性替换
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                os.rename(temp_file, file_path)
-                
-        except Exception as e:
-            logger.error(f"保存监控数据失败: {str(e)}")
+        now = datetime.now()
+        with self._pending_lock:
+            self._pending.append((now.strftime("%Y-%m-%d"), {"timestamp": now.isoformat(), "metrics": metrics}))
+            del self._pending[:-self.max_pending]
+        self.flush()
+
+    def flush(self, timeout=0.0):
+        """把待写队列中的记录追加到监控文件
+        Args:
+            timeout: 文件锁被占用时重试的最长秒数，0表示只尝试一次
+        Returns:
+            队列是否已全部写入
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._write_pending():
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def _write_pending(self):
+        with self._write_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, []
+            # 按日期分组，每个文件读写一次
+            groups = {}
+            for date_str, record in pending:
+                groups.setdefault(date_str, []).append(record)
+            groups = list(groups.items())
+            for i, (date_str, records) in enumerate(groups):
+                file_path = os.path.join(self.monitoring_dir, f"monitoring-{date_str}.json")
+                try:
+                    self._append(file_path, records)
+                except OSError as e:
+                    # 锁被占用或暂时无法写入：本组和之后的记录放回队列，下次再写
+                    unwritten = [(key, record) for key, group in groups[i:] for record in group]
+                    with self._pending_lock:
+                        self._pending[:0] = unwritten
+                        del self._pending[:-self.max_pending]
+                    logger.error(f"保存监控数据失败，{len(unwritten)} 条记录稍后重试: {str(e)}")
+                    return False
+                except Exception as e:
+                    logger.error(f"保存监控数据失败: {str(e)}")
+            return True
+
+    def _append(self, file_path, records):
+        with FileLock(file_path):
+            # 读取现有数据或初始化新文件
+            if os.path.exists(file_path):
+                with open(file_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            else:
+                data = {"records": []}
+
+            # 添加新记录
+            data["records"].extend(records)
+
+            # 写入文件
+            temp_file = f"{file_path}.tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+
+            # 原子性替换
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            os.rename(temp_file, file_path)
     
     def cleanup_old_data(self, retention_days=7):
         """清理超过保留天数的旧数据"""
@@ -313,100 +1266,450 @@ class MonitoringDataStore:
         except Exception as e:
             logger.error(f"清理旧监控数据失败: {str(e)}")
 
+# 系统指标采样记录
+class MetricSample:
+    """一次系统指标采样，保存原始数值，只在输出时格式化
+
+    不可用的指标为NaN（计数为-1），格式化为 "N/A"。
+    """
+    __slots__ = ('timestamp', 'cpu_percent', 'memory_bytes', 'read_bps', 'write_bps',
+                 'read_count', 'write_count')
+
+    def __init__(self, timestamp, cpu_percent=float('nan'), memory_bytes=float('nan'),
+                 read_bps=float('nan'), write_bps=float('nan'), read_count=-1, write_count=-1):
+        self.timestamp = timestamp
+        self.cpu_percent = cpu_percent
+        self.memory_bytes = memory_bytes
+        self.read_bps = read_bps
+        self.write_bps = write_bps
+        self.read_count = read_count
+        self.write_count = write_count
+
+    @staticmethod
+    def format_percent(value):
+        return "N/A" if value != value else f"{value:.1f}%"
+
+    @staticmethod
+    def format_mb(value, suffix="MB"):
+        return "N/A" if value != value else f"{value / (1024 * 1024):.1f}{suffix}"
+
+    def render(self):
+        """格式化为监控文件和状态接口使用的字典"""
+        return {
+            "cpu_usage": self.format_percent(self.cpu_percent),
+            "memory_usage": self.format_mb(self.memory_bytes),
+            "disk_io": {
+                "read_speed": self.format_mb(self.read_bps, "MB/s"),
+                "write_speed": self.format_mb(self.write_bps, "MB/s"),
+                "read_count": max(self.read_count, 0),
+                "write_count": max(self.write_count, 0)
+            },
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat()
+        }
+
+# 系统指标历史
+class MetricHistory:
+    """定长的系统指标环形缓冲区
+
+    按字段分列存放在 array 中（每个采样56字节），不为每个采样保留对象；
+    查询时在原始数值上直接计算，需要时再还原为 MetricSample。
+    """
+    FLOAT_FIELDS = ('timestamp', 'cpu_percent', 'memory_bytes', 'read_bps', 'write_bps')
+    INT_FIELDS = ('read_count', 'write_count')
+
+    def __init__(self, capacity=3600):
+        self.capacity = capacity
+        self._columns = {field: array('d', bytes(8 * capacity)) for field in self.FLOAT_FIELDS}
+        self._columns.update({field: array('q', bytes(8 * capacity)) for field in self.INT_FIELDS})
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, sample):
+        with self._lock:
+            i = self._next
+            for field, column in self._columns.items():
+                column[i] = getattr(sample, field)
+            self._next = (i + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def _indexes(self, since):
+        """从新到旧，时间不早于since的采样下标"""
+        timestamps = self._columns['timestamp']
+        for n in range(1, self._size + 1):
+            i = (self._next - n) % self.capacity
+            if timestamps[i] < since:
+                break
+            yield i
+
+    def since(self, since):
+        """时间不早于since的采样，从新到旧"""
+        with self._lock:
+            columns = self._columns
+            return [MetricSample(*(columns[field][i] for field in self.FLOAT_FIELDS + self.INT_FIELDS))
+                    for i in self._indexes(since)]
+
+    def column(self, field, since):
+        """时间不早于since的某个字段的有效值（去掉NaN）"""
+        with self._lock:
+            values = self._columns[field]
+            return [values[i] for i in self._indexes(since) if values[i] == values[i]]
+
 # 系统资源监控
 class SystemMonitor:
-    def __init__(self):
-        """初始化系统监控"""
+    def __init__(self, monitoring_dir="monitoring", retention_days=7, history_size=3600,
+                 publish_interval=None):
+        """初始化系统监控
+        Args:
+            history_size: 内存中保留的最近采样数
+            publish_interval: 后台发布本进程指标的间隔（秒），0表示只在查询 /status 时发布；
+                None表示取环境变量 WORKER_METRICS_INTERVAL，默认10
+        """
+        if publish_interval is None:
+            value = os.environ.get('WORKER_METRICS_INTERVAL', '10')
+            try:
+                publish_interval = float(value)
+            except ValueError:
+                logger.warning(f"WORKER_METRICS_INTERVAL 无效: {value!r}，使用默认的10秒")
+                publish_interval = 10.0
         self.last_cpu_times = None
         self.last_disk_io = None
         self.last_check_time = None
-        self.data_store = MonitoringDataStore()
+        self.retention_days = retention_days
+        self.data_store = MonitoringDataStore(monitoring_dir)
+        self.history = MetricHistory(history_size)
+        # 计算速率用的上一次读数，并发的 /status 请求通过锁串行更新
+        self._rate_lock = threading.Lock()
+        self.last_process_cpu = None
+        self.workers_dir = os.path.join(monitoring_dir, 'workers')
+        self._last_publish = 0.0
+        self.publish_interval = publish_interval
+        self._publisher_pid = None
+        self._publisher_stop = threading.Event()
         
-    def get_cpu_usage(self):
-        """获取CPU使用率"""
+    def _cpu_percent(self, interval):
         try:
             import psutil
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            return f"{cpu_percent:.1f}%"
+            return psutil.cpu_percent(interval=interval)
         except Exception as e:
             logger.error(f"获取CPU使用率失败: {str(e)}")
-            return "N/A"
-            
-    def get_memory_usage(self):
-        """获取内存使用情况"""
+            return float('nan')
+
+    def _memory_bytes(self):
         try:
             import psutil
-            memory = psutil.virtual_memory()
-            used_mb = memory.used / (1024 * 1024)
-            return f"{used_mb:.1f}MB"
+            return float(psutil.virtual_memory().used)
         except Exception as e:
             logger.error(f"获取内存使用情况失败: {str(e)}")
-            return "N/A"
-            
-    def get_disk_io(self):
-        """获取磁盘I/O统计"""
+            return float('nan')
+
+    def _disk_io(self):
+        """返回 (读速度, 写速度, 读次数, 写次数)，首次调用速度为0"""
         try:
             import psutil
-            disk_io = psutil.disk_io_counters()
-            current_time = time.time()
-            
-            if self.last_disk_io and self.last_check_time:
-                time_delta = current_time - self.last_check_time
-                read_speed = (disk_io.read_bytes - self.last_disk_io.read_bytes) / time_delta
-                write_speed = (disk_io.write_bytes - self.last_disk_io.write_bytes) / time_delta
-                
+            with self._rate_lock:
+                disk_io = psutil.disk_io_counters()
+                current_time = time.time()
+                read_speed = write_speed = 0.0
+                if self.last_disk_io and self.last_check_time:
+                    time_delta = current_time - self.last_check_time
+                    if time_delta > 0:
+                        read_speed = (disk_io.read_bytes - self.last_disk_io.read_bytes) / time_delta
+                        write_speed = (disk_io.write_bytes - self.last_disk_io.write_bytes) / time_delta
                 self.last_disk_io = disk_io
                 self.last_check_time = current_time
-                
-                return {
-                    "read_speed": f"{read_speed / (1024 * 1024):.1f}MB/s",
-                    "write_speed": f"{write_speed / (1024 * 1024):.1f}MB/s",
-                    "read_count": disk_io.read_count,
-                    "write_count": disk_io.write_count
-                }
-            
-            self.last_disk_io = disk_io
-            self.last_check_time = current_time
-            return {
-                "read_speed": "0MB/s",
-                "write_speed": "0MB/s",
-                "read_count": disk_io.read_count,
-                "write_count": disk_io.write_count
-            }
+            return read_speed, write_speed, disk_io.read_count, disk_io.write_count
         except Exception as e:
             logger.error(f"获取磁盘I/O统计失败: {str(e)}")
-            return {
-                "read_speed": "N/A",
-                "write_speed": "N/A",
-                "read_count": 0,
-                "write_count": 0
-            }
+            return float('nan'), float('nan'), -1, -1
+
+    def get_cpu_usage(self):
+        """获取CPU使用率"""
+        return MetricSample.format_percent(self._cpu_percent(0.1))
             
-    def get_all_metrics(self):
-        """获取所有系统指标并保存"""
-        metrics = {
-            "cpu_usage": self.get_cpu_usage(),
-            "memory_usage": self.get_memory_usage(),
-            "disk_io": self.get_disk_io(),
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # 保存监控数据
-        self.data_store.save_metrics(metrics)
-        
-        # 每天清理一次旧数据
-        if datetime.now().hour == 0 and datetime.now().minute == 0:
-            self.data_store.cleanup_old_data()
+    def get_memory_usage(self):
+        """获取内存使用情况"""
+        return MetricSample.format_mb(self._memory_bytes())
             
-        return metrics
+    def get_disk_io(self):
+        """获取磁盘I/O统计"""
+        read_speed, write_speed, read_count, write_count = self._disk_io()
+        return MetricSample(time.time(), read_bps=read_speed, write_bps=write_speed,
+                            read_count=read_count, write_count=write_count).render()["disk_io"]
 
-# 创建全局实例
-SERVICE_STATUS = ServiceStatus()
-SYSTEM_MONITOR = SystemMonitor()
+    def collect(self, cpu_interval=None):
+        """采样一次并加入历史记录
+        Args:
+            cpu_interval: CPU使用率的测量时长，None表示取上一次采样以来的平均值，不阻塞
+        """
+        sample = MetricSample(time.time(), self._cpu_percent(cpu_interval), self._memory_bytes(),
+                              *self._disk_io())
+        self.history.append(sample)
+        return sample
 
-# 配置日志处理器
-class CustomFilter(logging.Filter):
-    """自定义日志过滤器"""
+    def sample(self):
+        """采样系统指标，不写入监控文件
+        CPU使用率取自上一次采样以来的平均值，不会阻塞
+        """
+        return self.collect().render()
+
+    def process_metrics(self):
+        """本进程的资源指标，数值为原始单位（字节、秒、个数），另附格式化字符串
+        不支持的指标为None
+        """
+        import psutil
+        process = psutil.Process()
+        metrics = {"pid": process.pid, "timestamp": time.time()}
+        with process.oneshot():
+            try:
+                # USS需要读取 /proc/<pid>/smaps，开销较大，只在这里读取
+                memory = process.memory_full_info()
+                metrics["uss_bytes"] = memory.uss
+                # 常驻内存中不属于本进程独占的部分，即与其他进程（预派生时为主进程和其他工作进程）共享的页
+                metrics["shared_bytes"] = memory.rss - memory.uss
+                metrics["pss_bytes"] = getattr(memory, 'pss', None)
+            except (psutil.AccessDenied, AttributeError):
+                memory = process.memory_info()
+                metrics["uss_bytes"] = metrics["shared_bytes"] = metrics["pss_bytes"] = None
+            metrics["rss_bytes"] = memory.rss
+            cpu = process.cpu_times()
+            metrics["cpu_user_seconds"] = cpu.user
+            metrics["cpu_system_seconds"] = cpu.system
+            metrics["threads"] = process.num_threads()
+            try:
+                metrics["open_fds"] = process.num_fds() if os.name != 'nt' else process.num_handles()
+            except (psutil.AccessDenied, AttributeError):
+                metrics["open_fds"] = None
+            ctx = process.num_ctx_switches()
+            metrics["ctx_switches_voluntary"] = ctx.voluntary
+            metrics["ctx_switches_involuntary"] = ctx.involuntary
+
+        # 进程CPU使用率：两次读数之间的CPU秒数除以经过的时间
+        cpu_seconds = metrics["cpu_user_seconds"] + metrics["cpu_system_seconds"]
+        with self._rate_lock:
+            last = self.last_process_cpu
+            self.last_process_cpu = (metrics["timestamp"], cpu_seconds)
+        elapsed = metrics["timestamp"] - last[0] if last else 0.0
+        metrics["cpu_percent"] = round((cpu_seconds - last[1]) / elapsed * 100, 2) if elapsed > 0 else 0.0
+
+        metrics["gc"] = {
+            "counts": list(gc.get_count()),
+            "frozen": gc.get_freeze_count(),
+            "collections": [generation["collections"] for generation in gc.get_stats()],
+            "collected": [generation["collected"] for generation in gc.get_stats()]
+        }
+        metrics["formatted"] = {
+            "rss": MetricSample.format_mb(metrics["rss_bytes"]),
+            "uss": MetricSample.format_mb(metrics["uss_bytes"]) if metrics["uss_bytes"] is not None else "N/A",
+            "shared": MetricSample.format_mb(metrics["shared_bytes"]) if metrics["shared_bytes"] is not None else "N/A",
+            "cpu_usage": MetricSample.format_percent(metrics["cpu_percent"]),
+            "cpu_time": f"{cpu_seconds:.1f}s"
+        }
+        self.publish_worker(metrics)
+        return metrics
+
+    def publish_worker(self, metrics, min_interval=1.0):
+        """把本进程的指标写入工作进程目录，供其他进程汇总，最多每秒一次"""
+        now = time.monotonic()
+        if now - self._last_publish < min_interval:
+            return
+        self._last_publish = now
+        try:
+            os.makedirs(self.workers_dir, exist_ok=True)
+            path = os.path.join(self.workers_dir, f"worker-{metrics['pid']}.json")
+            temp_file = f"{path}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(metrics, f)
+            os.replace(temp_file, path)
+        except OSError as e:
+            logger.error(f"写入工作进程指标失败: {str(e)}")
+
+    def start_publisher(self):
+        """启动后台线程定期发布本进程指标
+        工作进程无论是否收到 /status 请求都会出现在汇总中；派生的子进程没有父进程的线程，按进程号判断是否已启动
+        """
+        if self.publish_interval <= 0:
+            return
+        with self._rate_lock:
+            if self._publisher_pid == os.getpid():
+                return
+            self._publisher_pid = os.getpid()
+            self._publisher_stop = threading.Event()
+        threading.Thread(target=self._publish_loop, args=(self._publisher_stop,),
+                         name='worker-metrics', daemon=True).start()
+
+    def _publish_loop(self, stop):
+        while True:
+            try:
+                self.process_metrics()
+            except Exception as e:
+                logger.error(f"采集工作进程指标失败: {str(e)}")
+            if stop.wait(self.publish_interval):
+                return
+
+    def flush(self, timeout=5.0):
+        """停止时调用：先写入尚未保存的监控记录，再退出工作进程指标汇总
+        Args:
+            timeout: 等待其他进程释放监控文件锁的最长秒数
+        """
+        if not self.data_store.flush(timeout):
+            logger.error(f"停止时仍有 {self.data_store.pending} 条监控记录未能写入")
+        self.retire_worker()
+
+    def retire_worker(self):
+        """停止发布并删除本进程发布的工作进程指标，停止后不再计入汇总"""
+        self._publisher_stop.set()
+        try:
+            os.remove(os.path.join(self.workers_dir, f"worker-{os.getpid()}.json"))
+        except FileNotFoundError:
+            pass
+
+    def worker_metrics(self, stale_after=60):
+        """汇总所有工作进程最近发布的指标，忽略已退出或超过stale_after秒未更新的进程"""
+        import psutil
+        workers = []
+        now = time.time()
+        try:
+            names = os.listdir(self.workers_dir)
+        except OSError:
+            names = []
+        for name in names:
+            if not (name.startswith('worker-') and name.endswith('.json')):
+                continue
+            path = os.path.join(self.workers_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    metrics = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - metrics.get("timestamp", 0) > stale_after or not psutil.pid_exists(metrics["pid"]):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            workers.append(metrics)
+
+        def total(field):
+            values = [worker[field] for worker in workers if worker.get(field) is not None]
+            return sum(values) if values else None
+
+        rss = total("rss_bytes")
+        uss = total("uss_bytes")
+        pss = total("pss_bytes")
+        return {
+            "count": len(workers),
+            "pids": sorted(worker["pid"] for worker in workers),
+            "rss_bytes": rss,
+            "uss_bytes": uss,
+            "shared_bytes": total("shared_bytes"),
+            "pss_bytes": pss,
+            "cpu_seconds": round((total("cpu_user_seconds") or 0) + (total("cpu_system_seconds") or 0), 2),
+            "cpu_percent": total("cpu_percent"),
+            "threads": total("threads"),
+            "open_fds": total("open_fds"),
+            "ctx_switches_voluntary": total("ctx_switches_voluntary"),
+            "ctx_switches_involuntary": total("ctx_switches_involuntary"),
+            "formatted": {
+                "rss": MetricSample.format_mb(rss) if rss is not None else "N/A",
+                "uss": MetricSample.format_mb(uss) if uss is not None else "N/A",
+                "pss": MetricSample.format_mb(pss) if pss is not None else "N/A"
+            }
+        }
+
+    def history_summary(self, window=300):
+        """最近window秒内采样的汇总，直接在原始数值上计算"""
+        since = time.time() - window
+        cpu = self.history.column('cpu_percent', since)
+        memory = self.history.column('memory_bytes', since)
+        nan = float('nan')
+        return {
+            "window_seconds": window,
+            "samples": len(self.history.column('timestamp', since)),
+            "cpu_avg": MetricSample.format_percent(sum(cpu) / len(cpu) if cpu else nan),
+            "cpu_max": MetricSample.format_percent(max(cpu) if cpu else nan),
+            "memory_max": MetricSample.format_mb(max(memory) if memory else nan)
+        }
+            
+    def get_all_metrics(self):
+        """获取所有系统指标并保存"""
+        metrics = self.collect(cpu_interval=0.1).render()
+        
+        # 保存监控数据
+        self.data_store.save_metrics(metrics)
+        
+        # 每天清理一次旧数据
+        if datetime.now().hour == 0 and datetime.now().minute == 0:
+            self.data_store.cleanup_old_data(self.retention_days)
+            
+        return metrics
+
+# 延迟初始化的子系统
+class LazySubsystem:
+    """首次使用时才创建实例的子系统代理
+
+    导入模块时不读写统计文件、不创建监控目录；
+    在Werkzeug重载器的监视进程中，未用到的子系统永远不会初始化。
+    """
+    def __init__(self, name, factory):
+        self._lazy_name = name
+        self._lazy_factory = factory
+        self._lazy_kwargs = {}
+        self._lazy_instance = None
+        self._lazy_lock = threading.Lock()
+
+    def configure(self, **kwargs):
+        """设置创建实例时使用的参数，实例已创建时不再生效"""
+        if self._lazy_instance is not None:
+            logger.warning(f"{self._lazy_name} 已初始化，忽略新的配置")
+            return
+        self._lazy_kwargs.update(kwargs)
+
+    @property
+    def initialized(self):
+        return self._lazy_instance is not None
+
+    def discard(self):
+        """丢弃已创建的实例，下次使用时重新创建
+        派生的子进程继承了父进程的实例，但没有继承其后台线程，需要在子进程中重新创建
+        """
+        self._lazy_instance = None
+        self._lazy_lock = threading.Lock()
+
+    def get(self):
+        """获取实例，必要时创建"""
+        instance = self._lazy_instance
+        if instance is None:
+            with self._lazy_lock:
+                if self._lazy_instance is None:
+                    with STARTUP.phase(f"初始化 {self._lazy_name}"):
+                        self._lazy_instance = self._lazy_factory(**self._lazy_kwargs)
+                instance = self._lazy_instance
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+# 创建全局实例（首次访问时初始化）
+SERVICE_STATUS = LazySubsystem('ServiceStatus', ServiceStatus)
+SYSTEM_MONITOR = LazySubsystem('SystemMonitor', SystemMonitor)
+
+_metrics_publisher_pid = None
+
+def ensure_metrics_publisher():
+    """本进程第一次处理请求时启动工作进程指标的后台发布"""
+    global _metrics_publisher_pid
+    pid = os.getpid()
+    if _metrics_publisher_pid != pid:
+        _metrics_publisher_pid = pid
+        SYSTEM_MONITOR.start_publisher()
+
+# 配置日志处理器
+class CustomFilter(logging.Filter):
+    """自定义日志过滤器"""
     def filter(self, record):
         msg = str(record.msg)
         # 过滤掉不需要的消息
@@ -434,21 +1737,24 @@ class ColoredFormatter(logging.Formatter):
         }
         
         # 如果是werkzeug的请求日志，使用简化格式
+        # 请求日志的状态码在参数中：'"%s" %s %s' % (请求行, 状态码, 大小)
         if 'werkzeug' in record.name and record.levelname == 'INFO':
-            if '200' in record.msg:
+            args = record.args if isinstance(record.args, tuple) else ()
+            code = str(args[1]) if len(args) >= 2 else ''
+            if code.startswith('2'):
                 prefix = f"{Fore.GREEN}✓{Style.RESET_ALL}"
-            elif '404' in record.msg:
+            elif code.startswith('4'):
                 prefix = f"{Fore.YELLOW}⚠{Style.RESET_ALL}"
-            elif '500' in record.msg:
+            elif code.startswith('5'):
                 prefix = f"{Fore.RED}✗{Style.RESET_ALL}"
             else:
                 prefix = f"{Fore.BLUE}→{Style.RESET_ALL}"
-            return f"{prefix} {record.msg}"
+            return f"{prefix} {record.getMessage()}"
             
+        # 只给输出加颜色，不修改记录本身，其他处理器（如日志文件）不会写入颜色代码
         color = colors.get(record.levelname, '')
-        if color:
-            record.msg = f"{color}{record.msg}{Style.RESET_ALL}"
-        return super().format(record)
+        message = super().format(record)
+        return f"{color}{message}{Style.RESET_ALL}" if color else message
 
 def format_timedelta(td):
     """格式化时间差"""
@@ -464,19 +1770,21 @@ def format_timedelta(td):
     else:
         return f"{seconds}秒"
 
-def print_stop_banner(stop_time, is_error=False):
+def print_stop_banner(stop_time, is_error=False, report=None):
     """打印停止服务的横幅
     参数:
         stop_time: 停止时间
         is_error: 是否因错误而停止
+        report: ShutdownCoordinator 的停止报告
     显示内容包括:
         - 停止状态（正常/异常）
         - 运行时长
         - 启动和停止时间
+        - 停止过程（排空耗时、丢弃的请求、子系统刷新）
         - 详细的请求统计信息
     """
-    # 获取完整的统计信息
-    stats = SERVICE_STATUS.get_statistics()
+    # 获取完整的统计信息，停止流程已刷新统计时直接使用内存中的计数
+    stats = SERVICE_STATUS.get_statistics(reload=report is None)
     runtime = SERVICE_STATUS.get_uptime()
     hours, remainder = divmod(runtime.total_seconds(), 3600)
     minutes, seconds = divmod(remainder, 60)
@@ -491,6 +1799,19 @@ def print_stop_banner(stop_time, is_error=False):
     
     # 格式化热门端点统计
     endpoint_stats = "\n".join([f"{Fore.BLUE}▸ {endpoint}: {count}" for endpoint, count in stats["popular_endpoints"].items()])
+
+    # 格式化停止过程
+    shutdown_stats = ""
+    if report:
+        flushed = "、".join(
+            f"{name} {result['ms']}ms" if result["ok"] else f"{name} 失败({result['error']})"
+            for name, result in report["flush"].items()
+        )
+        shutdown_stats = f"""
+{Fore.BLUE}▸ 排空耗时: {report['drain_seconds']}秒
+{Fore.BLUE}▸ 丢弃请求: {report['dropped']}（未完成 {report['abandoned']}，排空后拒绝 {report['rejected']}）
+{Fore.BLUE}▸ 数据刷新: {flushed or '无'}
+"""
     
     banner = f"""
 {Fore.CYAN}═════════════════════════════════════{Style.RESET_ALL}
@@ -503,7 +1824,7 @@ def print_stop_banner(stop_time, is_error=False):
 
 {Fore.MAGENTA}▸ 启动时间: {SERVICE_STATUS.start_time.strftime('%Y-%m-%d %H:%M:%S')}
 {Fore.MAGENTA}▸ 停止时间: {stop_time.strftime('%Y-%m-%d %H:%M:%S')}
-
+{shutdown_stats}
 {Fore.CYAN}═════════════════════════════════════{Style.RESET_ALL}
 {Fore.YELLOW}           基本统计信息           {Style.RESET_ALL}
 {Fore.CYAN}═════════════════════════════════════{Style.RESET_ALL}
@@ -528,17 +1849,200 @@ def print_stop_banner(stop_time, is_error=False):
 {Fore.YELLOW}     感谢使用 OASB GreetAPI 服务      {Style.RESET_ALL}
 {Fore.CYAN}=========================================={Style.RESET_ALL}
 """
+    import click
     click.echo(banner)
 
+# 优雅停止
+class ShutdownCoordinator:
+    """收到SIGTERM/SIGINT后按顺序停止服务
+
+    1. 就绪探针返回 draining，关闭监听套接字，不再接受新连接
+    2. 等待进行中的请求完成，最多 drain_timeout 秒；期间已有长连接上的请求照常处理，响应后关闭连接
+    3. 并行刷新所有登记的缓冲子系统（统计、监控、访问日志等），整体最多 flush_timeout 秒
+    4. 最后打印停止横幅，包括排空耗时和被丢弃的请求数
+    信号处理函数只设置标志，停止流程在主线程中执行；停止过程中再次收到信号时立即退出。
+    """
+
+    def __init__(self, drain_timeout=10.0, flush_timeout=5.0):
+        self.drain_timeout = drain_timeout
+        self.flush_timeout = flush_timeout
+        self.in_flight = 0
+        self.rejected = 0
+        self.draining = False
+        self.closed = False
+        self.report = None
+        self.managed = False
+        self._cond = threading.Condition()
+        self._requested = threading.Event()
+        self._flushers = []
+
+    def register_flush(self, name, fn):
+        """登记停止时需要刷新的子系统，fn 在独立线程中调用"""
+        self._flushers.append((name, fn))
+
+    def wrap(self, wsgi_app):
+        """统计进行中请求的WSGI中间件，排空结束后到达的请求直接返回503"""
+        def tracked(environ, start_response):
+            with self._cond:
+                if self.closed:
+                    self.rejected += 1
+                    rejected = True
+                else:
+                    self.in_flight += 1
+                    rejected = False
+            if rejected:
+                start_response('503 Service Unavailable', _SHUTDOWN_HEADERS)
+                return [_SHUTDOWN_BODY]
+            try:
+                return ClosingIterator(wsgi_app(environ, start_response), self._finished)
+            except BaseException:
+                self._finished()
+                raise
+        return tracked
+
+    def _finished(self):
+        with self._cond:
+            self.in_flight -= 1
+            if self.in_flight <= 0:
+                self._cond.notify_all()
+
+    def request(self):
+        """信号处理函数中调用，返回是否为第一次请求停止"""
+        if self._requested.is_set():
+            return False
+        self._requested.set()
+        return True
+
+    def serve(self, server):
+        """在后台线程运行服务器，主线程等待停止信号后执行停止流程"""
+        self.managed = True
+        thread = threading.Thread(target=server.serve_forever, name='http-server', daemon=True)
+        thread.start()
+        # 带超时等待，使主线程能及时处理信号
+        while not self._requested.wait(0.5):
+            if not thread.is_alive():
+                break
+        return self.shutdown(server)
+
+    def shutdown(self, server=None):
+        """停止接受连接、排空请求、刷新子系统，返回停止报告"""
+        started = time.monotonic()
+        READINESS.mark('shutdown', False, 'draining')
+        with self._cond:
+            self.draining = True
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        # 推送连接不会自行结束，通知其关闭后才能排空
+        STATUS_BROADCASTER.close()
+
+        deadline = started + self.drain_timeout
+        with self._cond:
+            while self.in_flight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            abandoned = self.in_flight
+            self.closed = True
+        drain_seconds = time.monotonic() - started
+        if abandoned:
+            logger.warning(f"排空超时，{abandoned} 个请求未完成")
+
+        flushed = self.flush()
+        self.report = {
+            "drain_seconds": round(drain_seconds, 3),
+            "abandoned": abandoned,
+            "rejected": self.rejected,
+            "dropped": abandoned + self.rejected,
+            "flush": flushed,
+            "total_seconds": round(time.monotonic() - started, 3)
+        }
+        return self.report
+
+    def flush(self):
+        """并行调用所有刷新函数，返回每个子系统的耗时或错误"""
+        results = {}
+
+        def run(name, fn):
+            started = time.perf_counter()
+            try:
+                fn()
+                results[name] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 2)}
+            except Exception as e:
+                results[name] = {"ok": False, "error": str(e)}
+                logger.error(f"停止时刷新 {name} 失败: {str(e)}")
+
+        threads = [threading.Thread(target=run, args=flusher, name=f"flush-{flusher[0]}", daemon=True)
+                   for flusher in self._flushers]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + self.flush_timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        for name, _ in self._flushers:
+            results.setdefault(name, {"ok": False, "error": f"超过{self.flush_timeout}秒未完成"})
+        return results
+
+_SHUTDOWN_BODY = json.dumps({
+    "code": 503,
+    "status": "error",
+    "error": {
+        "code": "ShuttingDown",
+        "message": "服务正在停止",
+        "suggestion": "请重试，请求将由其他节点处理"
+    }
+}, ensure_ascii=False).encode('utf-8')
+_SHUTDOWN_HEADERS = _probe_headers(_SHUTDOWN_BODY) + [('Connection', 'close'), ('Retry-After', '1')]
+
+SHUTDOWN = ShutdownCoordinator(
+    drain_timeout=float(os.environ.get('SHUTDOWN_DRAIN_TIMEOUT', 10)),
+    flush_timeout=float(os.environ.get('SHUTDOWN_FLUSH_TIMEOUT', 5))
+)
+
+def _flush_logging():
+    if ACCESS_LOG.initialized:
+        ACCESS_LOG.close()
+    for handler in logger.handlers:
+        handler.flush()
+
+# 只刷新已初始化的子系统，停止时不为此创建实例
+SHUTDOWN.register_flush('stats', lambda: SERVICE_STATUS.initialized and SERVICE_STATUS.flush())
+SHUTDOWN.register_flush('monitoring',
+                        lambda: SYSTEM_MONITOR.initialized and SYSTEM_MONITOR.flush(SHUTDOWN.flush_timeout))
+SHUTDOWN.register_flush('logging', _flush_logging)
+
 def handle_exit(signum, frame):
-    """处理退出信号
-    确保服务优雅地停止，只显示一次终止通知
+    """处理退出信号（SIGTERM/SIGINT）
+    由 ShutdownCoordinator 托管服务器时只设置停止标志，停止流程在主线程中执行；
+    调试模式下直接在信号处理函数中排空和刷新。再次收到信号时立即退出。
     """
-    # 检查是否是主进程
+    if not SHUTDOWN.request():
+        logger.warning("再次收到退出信号，立即退出")
+        os._exit(1)
+    if SHUTDOWN.managed:
+        return
+    report = SHUTDOWN.shutdown()
+    # 检查是否是主进程，只显示一次终止通知
     if not os.environ.get('WERKZEUG_RUN_MAIN'):
-        print_stop_banner(datetime.now())
+        print_stop_banner(datetime.now(), report=report)
     sys.exit(0)
 
+class MonitoredFileHandler(logging.FileHandler):
+    """写入失败时登记日志子系统降级的文件处理器"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failed = False
+
+    def emit(self, record):
+        self.failed = False
+        super().emit(record)
+        READINESS.mark(f"logging:{os.path.basename(self.baseFilename)}", not self.failed, "写入日志文件失败")
+
+    def handleError(self, record):
+        self.failed = True
+        super().handleError(record)
+
 # 配置日志
 def setup_logging():
     """配置日志系统"""
@@ -553,20 +2057,20 @@ def setup_logging():
     console_handler.addFilter(CustomFilter())
     
     # 创建文件处理器
-    app_file_handler = logging.FileHandler(os.path.join(log_dir, 'app.log'), encoding='utf-8')
+    app_file_handler = MonitoredFileHandler(os.path.join(log_dir, 'app.log'), encoding='utf-8')
     app_file_handler.setFormatter(logging.Formatter(
         '[%(asctime)s] [%(levelname)s] [%(process)d] %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     ))
     
-    error_file_handler = logging.FileHandler(os.path.join(log_dir, 'error.log'), encoding='utf-8')
+    error_file_handler = MonitoredFileHandler(os.path.join(log_dir, 'error.log'), encoding='utf-8')
     error_file_handler.setFormatter(logging.Formatter(
         '[%(asctime)s] [%(levelname)s] [%(process)d] %(message)s\n%(pathname)s:%(lineno)d\n',
         datefmt='%Y-%m-%d %H:%M:%S'
     ))
     error_file_handler.setLevel(logging.ERROR)
     
-    performance_file_handler = logging.FileHandler(os.path.join(log_dir, 'performance.log'), encoding='utf-8')
+    performance_file_handler = MonitoredFileHandler(os.path.join(log_dir, 'performance.log'), encoding='utf-8')
     performance_file_handler.setFormatter(logging.Formatter(
         '[%(asctime)s] %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
@@ -604,71 +2108,312 @@ def setup_logging():
     
     return app_logger, perf_logger
 
-logger = setup_logging()
+# 日志记录器在导入时即可使用，处理器由 init_logging() 在创建应用时安装
+logger = logging.getLogger('app')
+perf_logger = logging.getLogger('performance')
+_logging_lock = threading.Lock()
+_logging_ready = False
 
-# 配置缓存
-cache_config = {
-    "CACHE_TYPE": "SimpleCache",
-    "CACHE_DEFAULT_TIMEOUT": 300
-}
+def init_logging():
+    """安装日志处理器，多次调用只生效一次"""
+    global _logging_ready
+    with _logging_lock:
+        if not _logging_ready:
+            setup_logging()
+            _logging_ready = True
 
-app = Flask(__name__)
-app.config.update(cache_config)
-app.logger.handlers.clear()
-cache = Cache(app)
+# 访问日志
+def parse_size(size):
+    """把 "10MB" 这类大小字符串转换为字节数，数字原样返回"""
+    if isinstance(size, (int, float)):
+        return int(size)
+    units = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+    size = str(size).strip().upper()
+    for unit, factor in units.items():
+        if size.endswith(unit):
+            return int(float(size[:-len(unit)]) * factor)
+    return int(size)
 
-# JSON和编码配置
-app.config.update({
-    'JSONIFY_PRETTYPRINT_REGULAR': True,  # 启用JSON自动格式化
-    'JSON_SORT_KEYS': False,  # 保持JSON键的原始顺序
-    'JSON_AS_ASCII': False,  # 允许JSON包含非ASCII字符
-    'JSONIFY_MIMETYPE': "application/json; charset=utf-8",  # 设置正确的MIME类型
-})
+class AccessLogWriter:
+    """结构化访问日志
 
-# 设置默认编码
-import sys
-if sys.version_info[0] < 3:
-    reload(sys)
-    sys.setdefaultencoding('utf-8')
+    请求线程只做抽样判断并把一条元组放入队列，编码和写文件由后台线程完成：
+    - 每行一个JSON对象（JSONL），键为 ts/method/path/status/bytes/ms/cache
+    - 批量写入带缓冲的文件，每隔 flush_interval 秒刷新一次
+    - 文件超过 max_bytes 时轮转为 .1、.2 …，最多保留 backup_count 个
+    - 按 sample_rate 抽样，5xx响应始终记录
+    - 队列积压超过 max_queue 条时丢弃新记录并登记就绪探针降级，不会拖慢请求
+    """
+    BATCH_SIZE = 512
+
+    def __init__(self, path='logs/access.log', sample_rate=1.0, max_bytes=10 * 1024 * 1024,
+                 backup_count=5, flush_interval=1.0, max_queue=10000):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self._queue = queue.SimpleQueue()
+        self._backlogged = False
+        self._stop = threading.Event()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'ab', buffering=64 * 1024)
+        self._thread = threading.Thread(target=self._run, name='access-log', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, method, path, status, size, latency, cache_hit):
+        """记录一个请求，在请求线程中调用，不做I/O"""
+        if status < 500 and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        if self._queue.qsize() >= self.max_queue:
+            self.dropped += 1
+            if not self._backlogged:
+                self._backlogged = True
+                READINESS.mark('access_log', False, "访问日志队列积压")
+            return
+        self._queue.put((time.time(), method, path, status, size, latency, cache_hit))
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "queued": self._queue.qsize(),
+            "sample_rate": self.sample_rate
+        }
+
+    def close(self):
+        """写完队列中的记录后关闭文件"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        # 唤醒等待队列的写入线程，不必等到下一个刷新间隔
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.BATCH_SIZE:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if self._stop.is_set():
+                batch = [entry for entry in batch if entry is not None]
+            try:
+                if batch:
+                    self._write(batch)
+                if time.monotonic() >= next_flush or self._stop.is_set():
+                    self._file.flush()
+                    next_flush = time.monotonic() + self.flush_interval
+                if self._backlogged and self._queue.qsize() < self.max_queue // 2:
+                    self._backlogged = False
+                    READINESS.mark('access_log', True)
+            except OSError as e:
+                logger.error(f"写入访问日志失败: {str(e)}")
+                READINESS.mark('access_log', False, f"写入访问日志失败: {str(e)}")
+            if self._stop.is_set() and self._queue.empty():
+                self._file.close()
+                return
+
+    def _write(self, batch):
+        lines = []
+        for timestamp, method, path, status, size, latency, cache_hit in batch:
+            lines.append(json.dumps({
+                'ts': round(timestamp, 3),
+                'method': method,
+                'path': path,
+                'status': status,
+                'bytes': size,
+                'ms': round(latency * 1000, 2),
+                'cache': cache_hit
+            }, ensure_ascii=False, separators=(',', ':')))
+        lines.append('')
+        self._file.write('\n'.join(lines).encode('utf-8'))
+        self.written += len(batch)
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        """按大小轮转：access.log -> access.log.1 -> access.log.2 …"""
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'ab', buffering=64 * 1024)
+
+ACCESS_LOG = LazySubsystem('AccessLog', AccessLogWriter)
+
+# 缓存扩展在 create_app() 中绑定到应用
+cache = Cache()
+
+def check_cache_ready():
+    """缓存后端往返检查"""
+    cache.set('__readyz__', 1, timeout=60)
+    if cache.get('__readyz__') != 1:
+        return False, "缓存读写校验失败"
+    return True, None
+
+READINESS.add_check('cache', check_cache_ready)
+
+def _env_list(name, default):
+    """读取逗号分隔的环境变量列表"""
+    value = os.environ.get(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+# 请求统计分级
+class RequestClassifier:
+    """请求统计分级器
+
+    根据端点名、路径前缀或User-Agent把请求分为三档：
+    - full: 完整统计，每个请求都记录
+    - sampled: 抽样统计，每N个请求记录1个，计数按N放大
+    - none: 不做任何统计
+
+    规则按 端点 → 路径前缀 → User-Agent 的顺序匹配；
+    没有匹配到路由的请求（404扫描等）使用 unrouted_tier，其余请求完整统计。
+    """
+    FULL = 'full'
+    SAMPLED = 'sampled'
+    NONE = 'none'
+
+    def __init__(self, endpoints=None, path_prefixes=None, user_agents=None,
+                 sample_rate=10, unrouted_tier=SAMPLED):
+        """
+        Args:
+            endpoints: {端点名: 档位}
+            path_prefixes: {路径前缀: 档位}
+            user_agents: {User-Agent子串(不区分大小写): 档位}
+            sample_rate: 抽样间隔N
+            unrouted_tier: 未匹配路由请求的档位
+        """
+        self.endpoints = dict(endpoints or {})
+        self.path_prefixes = tuple(sorted((path_prefixes or {}).items(), key=lambda x: -len(x[0])))
+        self.user_agents = tuple((agent.lower(), tier) for agent, tier in (user_agents or {}).items())
+        self.sample_rate = max(1, int(sample_rate))
+        self.unrouted_tier = unrouted_tier
+        self._sample_counter = itertools.count()
+        self._agent_tier = lru_cache(maxsize=512)(self._match_agent)
+
+    @classmethod
+    def from_env(cls):
+        """从环境变量构建分级规则"""
+        endpoints = {name: cls.NONE for name in _env_list('STATS_SKIP_ENDPOINTS', ['static'])}
+        endpoints.update({name: cls.SAMPLED for name in _env_list('STATS_SAMPLED_ENDPOINTS', [])})
+        prefixes = {prefix: cls.NONE for prefix in _env_list(
+            'STATS_SKIP_PATHS', ['/favicon.ico', '/robots.txt', '/apple-touch-icon'])}
+        prefixes.update({prefix: cls.SAMPLED for prefix in _env_list('STATS_SAMPLED_PATHS', [])})
+        agents = {agent: cls.SAMPLED for agent in _env_list(
+            'STATS_SAMPLED_AGENTS', ['bot', 'spider', 'crawler', 'slurp'])}
+        agents.update({agent: cls.NONE for agent in _env_list('STATS_SKIP_AGENTS', [])})
+        return cls(
+            endpoints=endpoints,
+            path_prefixes=prefixes,
+            user_agents=agents,
+            sample_rate=int(os.environ.get('STATS_SAMPLE_RATE', 10)),
+            unrouted_tier=os.environ.get('STATS_UNROUTED_TIER', cls.SAMPLED),
+        )
+
+    def _match_agent(self, user_agent):
+        user_agent = user_agent.lower()
+        for agent, tier in self.user_agents:
+            if agent in user_agent:
+                return tier
+        return None
+
+    def tier(self, endpoint, path, user_agent):
+        """返回请求所属档位"""
+        tier = self.endpoints.get(endpoint)
+        if tier is not None:
+            return tier
+        for prefix, prefix_tier in self.path_prefixes:
+            if path.startswith(prefix):
+                return prefix_tier
+        if user_agent and self.user_agents:
+            tier = self._agent_tier(user_agent)
+            if tier is not None:
+                return tier
+        if endpoint is None:
+            return self.unrouted_tier
+        return self.FULL
+
+    def weight(self, endpoint, path, user_agent):
+        """返回请求的统计权重：0表示不统计，1为完整统计，N为抽样命中"""
+        tier = self.tier(endpoint, path, user_agent)
+        if tier == self.FULL:
+            return 1
+        if tier == self.SAMPLED:
+            return self.sample_rate if next(self._sample_counter) % self.sample_rate == 0 else 0
+        return 0
+
+REQUEST_CLASSIFIER = RequestClassifier.from_env()
 
-@app.before_request
 def before_request():
     """请求前处理：记录请求开始并更新统计
-    所有请求都会被记录，包括：
-    - API请求
-    - 静态文件请求
-    - 404和其他错误请求
+    请求先经过 REQUEST_CLASSIFIER 分级：
+    - 完整统计：API请求等
+    - 抽样统计：爬虫、404扫描等，按抽样间隔放大计数
+    - 不统计：favicon等静态资源
     """
+    g.request_started = time.perf_counter()
+    if _metrics_publisher_pid != os.getpid():
+        ensure_metrics_publisher()
+    g.stats_weight = REQUEST_CLASSIFIER.weight(
+        request.endpoint, request.path, request.headers.get('User-Agent', ''))
+    if not g.stats_weight:
+        return
     # 记录请求开始，更新活跃连接数和请求方法统计
-    SERVICE_STATUS.request_started()
+    SERVICE_STATUS.request_started(g.stats_weight)
     # 记录新请求，更新总请求数和最后请求时间
-    SERVICE_STATUS.record_request()
+    SERVICE_STATUS.record_request(g.stats_weight)
 
-@app.after_request
 def after_request(response):
     """请求后处理：更新请求统计
-    记录响应状态码并更新连接状态
+    记录响应状态码；活跃连接数只在 teardown_request 中减少，避免重复计数
     """
-    SERVICE_STATUS.record_status_code(response.status_code)
-    SERVICE_STATUS.request_finished()
+    weight = g.get('stats_weight')
+    started = g.get('request_started')
+    latency = time.perf_counter() - started if started else 0.0
+    if weight:
+        SERVICE_STATUS.record_status_code(response.status_code, weight)
+        SERVICE_STATUS.record_latency(latency * 1000, weight)
+    if ACCESS_LOG_ENABLED:
+        ACCESS_LOG.record(request.method, request.path, response.status_code,
+                          response.content_length or 0, latency, g.get('cache_hit'))
     return response
 
-@app.teardown_request
 def teardown_request(exception=None):
     """请求结束处理：确保连接状态正确更新
     记录错误信息并更新连接状态
     即使发生异常也会执行，确保连接计数准确
+    错误无论请求档位如何都会记录
     """
+    weight = g.get('stats_weight')
     if exception:
-        error_msg = str(exception)
-        logger.error(f"请求处理发生错误: {error_msg}")
-        SERVICE_STATUS.record_error(error_msg)
-    SERVICE_STATUS.request_finished()
+        logger.error(f"请求处理发生错误: {str(exception)}")
+        # 已统计的请求随后会在 request_finished 中保存
+        SERVICE_STATUS.record_error(exception, save=not weight)
+    if weight:
+        SERVICE_STATUS.request_finished()
 
 # API版本控制
 API_VERSION = "v1.2.0"
-app.config['JSON_AS_ASCII'] = False  # 支持中文
-app.config['JSONIFY_MIMETYPE'] = "application/json;charset=utf-8"
 
 # 定义一些有趣的常量
 GREETINGS = [
@@ -703,6 +2448,345 @@ QUOTES = [
     "微笑着面对它，消除恐惧的最好办法就是面对恐惧 🌈"
 ]
 
+# 按时段区分的问候语和表情
+TIME_GREETINGS = {
+    'morning': ("早上好", "🖼️"),
+    'noon': ("中午好", "🌞"),
+    'afternoon': ("下午好", "☀️"),
+    'evening': ("晚上好", "🌃"),
+    'night': ("夜深了", "🌙"),
+}
+
+# 每个小时所属的时段，下标为小时
+HOUR_BUCKETS = tuple(
+    'morning' if 5 <= hour < 12 else
+    'noon' if 12 <= hour < 14 else
+    'afternoon' if 14 <= hour < 18 else
+    'evening' if 18 <= hour < 22 else
+    'night'
+    for hour in range(24)
+)
+
+MOOD_EMOJIS = ['😊', '🥳', '🌟', '✨']
+
+# 用户喜好推荐，key为favorite参数
+FAVORITE_RESPONSES = {
+    'music': ("🎵 听说你喜欢音乐，今天推荐: {}", ['古典', '流行', '爵士']),
+    'sports': ("⚽ 运动爱好者！今天适合: {}", ['跑步', '瑜伽', '游泳']),
+    'food': ("🍄‍ 美食家！试试: {}", ['川菜', '粤菜', '湘菜']),
+}
+FAVORITE_DEFAULT = "🎁 发现你的独特喜好！"
+
+DEFAULT_LOCALE = 'zh-CN'
+
+# 语言配置
+class LocaleProfile:
+    """单个语言的问候配置
+
+    包括时区、各小时所属的时段以及问候语模板。
+    模板在加载内容目录时编译为绑定的 str.format 方法，请求中直接调用。
+    """
+    __slots__ = ('locale', 'timezone', 'aliases', 'hour_buckets', 'format_greeting',
+                 'format_personalized', 'format_mood', 'messages')
+
+    DEFAULT_TEMPLATES = {
+        'greeting': "{time_greeting} {time_emoji} {greeting} {emoji}",
+        'personalized': "{greeting}, {name}！",
+        'mood': "{mood}% {emoji}",
+        'empty_name': "name参数不能为空",
+        'empty_name_suggestion': "请提供有效的名字参数",
+        'example': "http://localhost:5000/api/greeting?name=小明",
+    }
+
+    def __init__(self, locale, timezone='Asia/Shanghai', aliases=(), buckets=None, templates=None):
+        """
+        Args:
+            locale: 语言标签，如 zh-CN
+            timezone: 计算时段使用的时区
+            aliases: 额外匹配的语言标签
+            buckets: {时段: [开始小时, 结束小时)}，开始大于结束时跨越午夜；默认使用 HOUR_BUCKETS
+            templates: 覆盖 DEFAULT_TEMPLATES 中的模板
+        """
+        self.locale = locale
+        self.timezone = timezone
+        self.aliases = tuple(aliases)
+        self.hour_buckets = self.compile_buckets(buckets) if buckets else HOUR_BUCKETS
+        templates = dict(self.DEFAULT_TEMPLATES, **(templates or {}))
+        self.format_greeting = templates['greeting'].format
+        self.format_personalized = templates['personalized'].format
+        self.format_mood = templates['mood'].format
+        self.messages = {key: templates[key] for key in ('empty_name', 'empty_name_suggestion', 'example')}
+
+    @staticmethod
+    def compile_buckets(buckets):
+        """把时段区间编译为按小时下标的元组"""
+        hours = list(HOUR_BUCKETS)
+        for bucket, (start, end) in buckets.items():
+            span = range(start, end) if start < end else list(range(start, 24)) + list(range(0, end))
+            for hour in span:
+                hours[hour] = sys.intern(bucket)
+        return tuple(hours)
+
+    @classmethod
+    def from_dict(cls, locale, data):
+        """从内容文件中的 profile 字段创建"""
+        return cls(
+            locale,
+            timezone=data.get('timezone', 'Asia/Shanghai'),
+            aliases=data.get('aliases', ()),
+            buckets=data.get('buckets'),
+            templates=data.get('templates')
+        )
+
+@lru_cache(maxsize=256)
+def parse_accept_language(header):
+    """解析Accept-Language，按权重从高到低返回语言标签元组
+    结果缓存在有界LRU中，同一个网关发来的相同请求头只解析一次
+    """
+    tags = []
+    for index, part in enumerate(header.split(',')[:16]):
+        tag, _, params = part.partition(';')
+        tag = tag.strip().replace('_', '-')
+        if not tag:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            tags.append((-quality, index, tag))
+    tags.sort()
+    return tuple(tag for _, _, tag in tags)
+
+# 内容目录
+class AliasTable:
+    """Walker别名法加权随机选择表
+
+    构建时间O(n)，每次抽取只需两次随机数和两次数组访问。
+    文本保存在元组中，概率和别名保存在紧凑的array中。
+    """
+    __slots__ = ('items', 'prob', 'alias', 'size', 'uniform')
+
+    def __init__(self, items, weights):
+        self.items = tuple(items)
+        self.size = size = len(self.items)
+        self.uniform = len(set(weights)) <= 1
+        self.prob = array('d', [1.0]) * size
+        self.alias = array('I', range(size))
+        if self.uniform:
+            return
+
+        total = float(sum(weights))
+        scaled = [weight * size / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def pick(self, rng=random):
+        """按权重随机抽取一条"""
+        index = int(rng.random() * self.size)
+        if self.uniform or rng.random() < self.prob[index]:
+            return self.items[index]
+        return self.items[self.alias[index]]
+
+    def pick_many(self, count, rng=random):
+        """按权重批量抽取count条
+
+        先整批生成列下标和别名判定用的随机数，再一次性查表，
+        与逐条调用pick相比省去每条的方法调用和属性查找。
+        """
+        draw, size, items = rng.random, self.size, self.items
+        columns = [int(draw() * size) for _ in range(count)]
+        if self.uniform:
+            return [items[index] for index in columns]
+        prob, alias = self.prob, self.alias
+        return [items[index] if draw() < prob[index] else items[alias[index]] for index in columns]
+
+class ContentCatalog:
+    """问候内容目录
+
+    内容条目按 (类别, 语言, 时段) 建立索引，每个索引对应一张别名表；
+    文本在加载时驻留(sys.intern)，重复的文本只保存一份。
+    查找时依次回退到"任意时段"和默认语言。
+    """
+    ANY_BUCKET = '*'
+    FIELDS = ('category', 'locale', 'bucket', 'text', 'weight')
+
+    def __init__(self, entries, profiles=None, default_locale=DEFAULT_LOCALE):
+        """
+        Args:
+            entries: 可迭代的内容条目字典，字段见 FIELDS
+            profiles: {语言: LocaleProfile}
+            default_locale: 找不到指定语言的内容时使用的语言
+        """
+        self.default_locale = default_locale
+        groups = {}
+        for entry in entries:
+            key = (
+                sys.intern(entry['category']),
+                sys.intern(entry.get('locale') or default_locale),
+                sys.intern(entry.get('bucket') or self.ANY_BUCKET)
+            )
+            items, weights = groups.setdefault(key, ([], []))
+            items.append(sys.intern(entry['text']))
+            weights.append(float(entry.get('weight') or 1.0))
+        self._tables = {key: AliasTable(items, weights) for key, (items, weights) in groups.items()}
+        self._resolved = {}
+        self.locales = frozenset(key[1] for key in self._tables)
+        self.size = sum(table.size for table in self._tables.values())
+
+        # 每个语言的问候配置，只有内容没有配置的语言使用默认模板
+        self.profiles = {locale: LocaleProfile(locale) for locale in self.locales}
+        self.profiles[default_locale] = LocaleProfile(default_locale)
+        self.profiles.update(profiles or {})
+        self.locales = frozenset(self.profiles)
+
+        # 语言标签索引：完整标签、别名、主语言子标签（小写）
+        self._locale_index = {}
+        for locale in [default_locale] + sorted(self.locales - {default_locale}):
+            profile = self.profiles[locale]
+            for tag in (locale,) + profile.aliases:
+                self._locale_index.setdefault(tag.lower(), locale)
+                self._locale_index.setdefault(tag.split('-', 1)[0].lower(), locale)
+
+    def negotiate(self, tags):
+        """从按优先级排列的语言标签中选出目录支持的语言"""
+        index = self._locale_index
+        for tag in tags:
+            if tag == '*':
+                return self.default_locale
+            tag = tag.lower()
+            locale = index.get(tag) or index.get(tag.split('-', 1)[0])
+            if locale:
+                return locale
+        return self.default_locale
+
+    def profile(self, locale=None):
+        """获取语言配置，不支持的语言使用默认语言"""
+        return self.profiles.get(locale) or self.profiles[self.default_locale]
+
+    def table(self, category, locale=None, bucket=ANY_BUCKET):
+        """查找别名表，找不到时返回None"""
+        key = (category, locale, bucket)
+        table = self._resolved.get(key)
+        if table is None:
+            tables = self._tables
+            locale = locale or self.default_locale
+            table = (tables.get((category, locale, bucket))
+                     or tables.get((category, locale, self.ANY_BUCKET))
+                     or tables.get((category, self.default_locale, bucket))
+                     or tables.get((category, self.default_locale, self.ANY_BUCKET)))
+            if table is not None:
+                # 只缓存命中的查找，避免任意参数撑大缓存
+                self._resolved[key] = table
+        return table
+
+    def pick(self, category, locale=None, bucket=ANY_BUCKET, rng=random):
+        """随机抽取一条内容，类别不存在时返回None"""
+        table = self.table(category, locale, bucket)
+        return table.pick(rng) if table is not None else None
+
+    def pick_many(self, category, count, locale=None, bucket=ANY_BUCKET, rng=random):
+        """批量随机抽取count条内容，类别不存在时返回count个None"""
+        table = self.table(category, locale, bucket)
+        return table.pick_many(count, rng) if table is not None else [None] * count
+
+    @staticmethod
+    def builtin_entries():
+        """内置的中文内容"""
+        for category, texts in (('greeting', GREETINGS), ('emoji', EMOJIS), ('tip', TIPS),
+                                ('quote', QUOTES), ('mood_emoji', MOOD_EMOJIS)):
+            for text in texts:
+                yield {'category': category, 'text': text}
+        for bucket, (text, emoji) in TIME_GREETINGS.items():
+            yield {'category': 'time_greeting', 'bucket': bucket, 'text': text}
+            yield {'category': 'time_emoji', 'bucket': bucket, 'text': emoji}
+        for favorite, (template, choices) in FAVORITE_RESPONSES.items():
+            for choice in choices:
+                yield {'category': f'favorite:{favorite}', 'text': template.format(choice)}
+        yield {'category': 'favorite:other', 'text': FAVORITE_DEFAULT}
+
+    @classmethod
+    def read_file(cls, path):
+        """读取一个内容文件，返回 (条目列表, 语言配置或None)
+        JSON文件可以是条目列表，或者
+        {"locale": ..., "profile": {...}, "entries": [...], "categories": {类别: [文本或条目]}}；
+        CSV文件的表头为 category,locale,bucket,text,weight
+        """
+        if path.endswith('.csv'):
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                return [row for row in csv.DictReader(f) if row.get('category') and row.get('text')], None
+
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            return data, None
+        locale = data.get('locale')
+        profile = LocaleProfile.from_dict(locale, data['profile']) if locale and 'profile' in data else None
+        entries = [dict({'locale': locale}, **entry) for entry in data.get('entries', [])]
+        for category, items in data.get('categories', {}).items():
+            for item in items:
+                entry = {'text': item} if isinstance(item, str) else dict(item)
+                entry.setdefault('locale', locale)
+                entry['category'] = category
+                entries.append(entry)
+        return entries, profile
+
+    @classmethod
+    def load(cls, content_dir=None):
+        """加载内置内容和内容目录下的所有JSON/CSV文件"""
+        entries = list(cls.builtin_entries())
+        profiles = {}
+        if content_dir and os.path.isdir(content_dir):
+            for filename in sorted(os.listdir(content_dir)):
+                if filename.endswith(('.json', '.csv')):
+                    path = os.path.join(content_dir, filename)
+                    try:
+                        file_entries, profile = cls.read_file(path)
+                    except (OSError, ValueError, KeyError, TypeError) as e:
+                        logger.error(f"加载内容文件失败 {filename}: {str(e)}")
+                        continue
+                    entries.extend(file_entries)
+                    if profile:
+                        profiles[profile.locale] = profile
+        return cls(entries, profiles)
+
+class ContentRegistry:
+    """当前生效的内容目录，重新加载时整体原子替换"""
+    def __init__(self, content_dir=None):
+        self.content_dir = content_dir
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        catalog = self._catalog
+        if catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    with STARTUP.phase('加载内容目录'):
+                        self._catalog = ContentCatalog.load(self.content_dir)
+                catalog = self._catalog
+        return catalog
+
+    def reload(self):
+        """重新加载内容目录，加载完成前请求继续使用旧目录"""
+        catalog = ContentCatalog.load(self.content_dir)
+        self._catalog = catalog
+        logger.info(f"内容目录已重新加载: {catalog.size} 条内容, 语言 {sorted(catalog.locales)}")
+        return catalog
+
+CONTENT = ContentRegistry(os.environ.get(
+    'CONTENT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content')))
+
 def get_system_compatible_emoji(emoji_map):
     """根据系统类型返回合适的表情符号
     Windows系统使用简单符号，其他系统使用emoji
@@ -755,67 +2839,699 @@ def print_banner(host='localhost', port=5000, is_debug=False):
 
 {Fore.CYAN}====================================={Style.RESET_ALL}
 """
+    import click
     click.echo(banner)
 
-def get_greeting_by_time():
-    """根据时间返回适当的问候语"""
-    china_tz = pytz.timezone('Asia/Shanghai')
-    current_time = datetime.now(china_tz)
-    hour = current_time.hour
-    
-    if 5 <= hour < 12:
-        return "早上好", "🖼️"
-    elif 12 <= hour < 14:
-        return "中午好", "🌞"
-    elif 14 <= hour < 18:
-        return "下午好", "☀️"
-    elif 18 <= hour < 22:
-        return "晚上好", "🌃"
-    else:
-        return "夜深了", "🌙"
+def get_greeting_by_time(locale=None, now=None, rng=random):
+    """根据时间返回适当的问候语
+    Args:
+        locale: 语言，默认中文；时段按该语言的时区和时段划分计算
+        now: 当前时间（该语言时区），默认取当前时间
+        rng: 随机数生成器
+    """
+    catalog = CONTENT.current
+    profile = catalog.profile(locale)
+    if now is None:
+        now = datetime.now(get_timezone(profile.timezone))
+    bucket = profile.hour_buckets[now.hour]
+    return (catalog.pick('time_greeting', profile.locale, bucket, rng),
+            catalog.pick('time_emoji', profile.locale, bucket, rng))
+
+def resolve_locale(catalog):
+    """根据 lang 参数或 Accept-Language 请求头确定响应语言"""
+    lang = request.args.get('lang')
+    header = lang if lang else request.headers.get('Accept-Language', '')
+    return catalog.negotiate(parse_accept_language(header[:256]))
+
+# 个性化参数缓存
+class LFUCache:
+    """按访问频率淘汰、按字节计算容量的缓存
+
+    - 每个访问频率对应一个保持插入顺序的桶，命中时条目移入高一级的桶
+    - 超出字节预算时，从最低频率的桶中淘汰最早进入的条目
+    少数热门键的频率持续增长，不会被大量只出现一次的键挤出。
+    get/put 均为O(1)（淘汰时跳过空桶为均摊O(1)）。
+    """
+    # 每个条目在索引字典、频率桶和记录列表上的固定开销估算
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes=1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = {}  # key -> [value, 频率, 字节数]
+        self._buckets = {}  # 频率 -> OrderedDict(key -> None)
+        self._min_freq = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def sizeof(cls, obj):
+        """估算对象占用的字节数，递归计算元组和__slots__对象"""
+        size = sys.getsizeof(obj)
+        if isinstance(obj, tuple):
+            size += sum(cls.sizeof(item) for item in obj)
+        elif hasattr(obj, '__slots__'):
+            size += sum(cls.sizeof(getattr(obj, slot, None)) for slot in obj.__slots__)
+        return size
+
+    def get(self, key):
+        """命中时返回值并提升频率，未命中返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key, entry)
+            return entry[0]
+
+    def put(self, key, value):
+        """写入条目，超出预算时按频率淘汰"""
+        size = self.sizeof(key) + self.sizeof(value) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.bytes += size - entry[2]
+                entry[0], entry[2] = value, size
+                self._touch(key, entry)
+            else:
+                while self._entries and self.bytes + size > self.max_bytes:
+                    self._evict()
+                self._entries[key] = [value, 1, size]
+                self._buckets.setdefault(1, OrderedDict())[key] = None
+                self._min_freq = 1
+                self.bytes += size
+
+    def _touch(self, key, entry):
+        """把条目移入高一级频率的桶"""
+        freq = entry[1]
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        entry[1] = freq + 1
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+
+    def _evict(self):
+        """淘汰最低频率桶中最早进入的条目"""
+        while self._min_freq not in self._buckets:
+            self._min_freq += 1
+        bucket = self._buckets[self._min_freq]
+        key, _ = bucket.popitem(last=False)
+        if not bucket:
+            del self._buckets[self._min_freq]
+        self.bytes -= self._entries.pop(key)[2]
+        self.evictions += 1
+
+    def most_frequent(self, limit):
+        """按访问频率从高到低返回最多limit个 (键, 值, 频率)，同频率时最近进入的在前"""
+        result = []
+        with self._lock:
+            for freq in sorted(self._buckets, reverse=True):
+                for key in reversed(self._buckets[freq]):
+                    result.append((key, self._entries[key][0], freq))
+                    if len(result) >= limit:
+                        return result
+        return result
+
+    def stats(self):
+        """命中率和内存占用"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions
+        }
+
+class Personalization:
+    """规范化后的问候参数
+    name: None 表示未提供，空字符串表示提供了但无效
+    """
+    __slots__ = ('name', 'favorite', 'locale', 'cache_key')
+
+    def __init__(self, name, favorite, locale):
+        self.name = name
+        self.favorite = favorite
+        self.locale = locale
+        # 规范化后的缓存键，与参数顺序和无关参数无关
+        self.cache_key = f"view/greeting|{locale}|{favorite}|{'-' if name is None else '=' + name}"
+
+    @classmethod
+    def normalize(cls, name, favorite, locale):
+        """规范化原始参数"""
+        if name:
+            try:
+                # 确保name是有效的UTF-8字符串
+                name = name.encode('utf-8').decode('utf-8').strip()
+            except UnicodeError:
+                name = None
+        return cls(name, favorite.strip().lower(), locale)
+
+PERSONALIZATION_CACHE = LFUCache(int(os.environ.get('PERSONALIZATION_CACHE_BYTES', 1024 * 1024)))
+
+def get_personalization():
+    """获取当前请求规范化后的问候参数，同一组原始参数只规范化一次"""
+    personalization = g.get('personalization')
+    if personalization is None:
+        raw = (request.args.get('name', type=str), request.args.get('favorite', ''),
+               resolve_locale(CONTENT.current))
+        personalization = PERSONALIZATION_CACHE.get(raw)
+        if personalization is None:
+            personalization = Personalization.normalize(*raw)
+            PERSONALIZATION_CACHE.put(raw, personalization)
+        g.personalization = personalization
+    return personalization
+
+# 并发请求合并
+class _Call:
+    """一次进行中的计算"""
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    """同一个键的并发计算只执行一次
+
+    第一个到达的请求（leader）执行计算，其余请求（follower）等待结果。
+    等待超时或leader计算失败时，follower自行计算，不会被无限期阻塞。
+    """
+
+    def __init__(self, timeout=2.0):
+        self.timeout = timeout
+        self.leaders = 0
+        self.coalesced = 0
+        self.fallbacks = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """执行或等待key对应的计算
+        Returns:
+            (结果, 角色)，角色为 leader、coalesced 或 fallback
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if call.event.wait(self.timeout) and call.error is None:
+                return call.value, 'coalesced'
+            with self._lock:
+                self.fallbacks += 1
+            return fn(), 'fallback'
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.event.set()
+        return call.value, 'leader'
+
+    def stats(self):
+        """合并计数"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "fallbacks": self.fallbacks
+        }
+
+class KeyLockTable:
+    """同一主机上多个工作进程之间按键加锁
+
+    键按哈希映射到固定数量的锁文件（锁文件不删除，避免删除和加锁之间的竞争），
+    配合共享缓存后端（如filesystem、redis）使用：持锁的进程计算并写入缓存，
+    其他进程拿到锁后先检查缓存。
+    """
+    POLL_INTERVAL = 0.005  # 获取锁的轮询间隔（秒）
+
+    def __init__(self, directory, slots=64):
+        self.directory = directory
+        self.slots = slots
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def hold(self, key, timeout):
+        """在timeout秒内尝试获取key对应的锁
+        超时后不持锁继续执行，产生的结果是 False
+        """
+        slot = int(hashlib.sha1(key.encode('utf-8')).hexdigest()[:8], 16) % self.slots
+        lock_file = open(os.path.join(self.directory, f"greeting-{slot:02d}.lock"), 'a+b')
+        deadline = time.monotonic() + timeout
+        acquired = False
+        try:
+            while True:
+                try:
+                    self._lock(lock_file)
+                    acquired = True
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        break
+                    time.sleep(self.POLL_INTERVAL)
+            yield acquired
+        finally:
+            if acquired:
+                self._unlock(lock_file)
+            lock_file.close()
+
+    @staticmethod
+    def _lock(lock_file):
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    @staticmethod
+    def _unlock(lock_file):
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+GREETING_CACHE_TIMEOUT = 60  # 问候响应缓存1分钟
+GREETING_SINGLE_FLIGHT = SingleFlight(float(os.environ.get('SINGLEFLIGHT_TIMEOUT', 2.0)))
+GREETING_LOCK_TABLE = (KeyLockTable(os.environ['SINGLEFLIGHT_LOCK_DIR'])
+                       if os.environ.get('SINGLEFLIGHT_LOCK_DIR') else None)
+
+# 问候缓存快照
+class CacheSnapshot:
+    """问候缓存的热点快照，用于重启后预热
+
+    - 启用后按缓存键记录访问频率（LFUCache，只保存过期时间，不保存响应）
+    - 保存时按频率从高到低取最多 max_entries 个仍有效的条目，
+      以定长记录头加键和响应体的二进制格式写入，整体zlib压缩，原子替换快照文件
+    - 启动时在接受请求之前载入，每个条目按剩余的有效期写回缓存，已过期的条目跳过
+    停止时（包括调试模式重载前）保存一次，interval 大于0时另外定期保存。
+    """
+    MAGIC = b'GCS1'
+    HEADER = struct.Struct('<4sII')  # 魔数、CRC32、条目数
+    RECORD = struct.Struct('<dIHHI')  # 过期时间、访问频率、状态码、键长度、响应体长度
+
+    def __init__(self, path, max_entries=1000, interval=0):
+        self.path = path
+        self.max_entries = max_entries
+        self.interval = interval
+        self.enabled = False
+        self.saved = 0
+        self.loaded = 0
+        self.expired = 0
+        self.last_save = None
+        self.heat = None
+        self._app = None
+        self._stop = threading.Event()
+        self._save_lock = threading.Lock()
+
+    def enable(self, app):
+        """载入快照并开始记录访问频率，返回载入的条目数"""
+        self._app = app
+        # 跟踪的键数多于快照条目数，留出候选
+        self.heat = LFUCache(self.max_entries * 4 * (LFUCache.ENTRY_OVERHEAD + 200))
+        self.enabled = True
+        loaded = self.load()
+        if self.interval > 0:
+            threading.Thread(target=self._run, name='cache-snapshot', daemon=True).start()
+        atexit.register(self.close)
+        return loaded
+
+    def track(self, key, timeout):
+        """记录新写入缓存的条目及其过期时间"""
+        if self.enabled:
+            self.heat.put(key, time.time() + timeout)
+
+    def touch(self, key):
+        """记录一次缓存命中"""
+        if self.enabled:
+            self.heat.get(key)
+
+    def close(self):
+        """停止定期保存并保存最后一次快照"""
+        if not self.enabled or self._stop.is_set():
+            return
+        self._stop.set()
+        self.save()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f"保存缓存快照失败: {str(e)}")
 
-def get_mood_index():
+    def save(self):
+        """把最热的有效条目写入快照文件，返回写入的条目数"""
+        now = time.time()
+        records = []
+        with self._save_lock, self._app.app_context():
+            for key, expires, freq in self.heat.most_frequent(self.max_entries * 2):
+                if expires <= now + 1:
+                    continue
+                entry = cache.get(key)
+                if entry is None:
+                    continue
+                body, status_code = entry
+                encoded = key.encode('utf-8')
+                records.append(self.RECORD.pack(expires, min(freq, 0xFFFFFFFF), status_code,
+                                                len(encoded), len(body)))
+                records.append(encoded)
+                records.append(body)
+                if len(records) >= self.max_entries * 3:
+                    break
+            payload = zlib.compress(b''.join(records))
+            temp_file = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, zlib.crc32(payload), len(records) // 3))
+                f.write(payload)
+            os.replace(temp_file, self.path)
+        self.saved = len(records) // 3
+        self.last_save = {
+            "time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "entries": self.saved,
+            "bytes": self.HEADER.size + len(payload)
+        }
+        return self.saved
+
+    def load(self):
+        """按剩余有效期把快照中的条目写回缓存，返回载入的条目数"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning(f"读取缓存快照失败: {str(e)}")
+            return 0
+        if len(data) < self.HEADER.size:
+            return 0
+        magic, crc, count = self.HEADER.unpack_from(data)
+        payload = data[self.HEADER.size:]
+        if magic != self.MAGIC or zlib.crc32(payload) != crc:
+            logger.warning("缓存快照格式无效或已损坏，跳过预热")
+            return 0
+        payload = zlib.decompress(payload)
+
+        now = time.time()
+        offset = 0
+        with self._app.app_context():
+            for _ in range(count):
+                expires, freq, status_code, key_length, body_length = self.RECORD.unpack_from(payload, offset)
+                offset += self.RECORD.size
+                key = payload[offset:offset + key_length].decode('utf-8')
+                offset += key_length
+                body = payload[offset:offset + body_length]
+                offset += body_length
+                remaining = expires - now
+                if remaining < 1:
+                    self.expired += 1
+                    continue
+                cache.set(key, (body, status_code), timeout=int(remaining))
+                self.heat.put(key, expires)
+                self.loaded += 1
+        logger.info(f"缓存预热: 载入 {self.loaded} 个条目，跳过 {self.expired} 个已过期条目")
+        return self.loaded
+
+    def stats(self):
+        if not self.enabled:
+            return "未启用"
+        return {
+            "path": self.path,
+            "tracked": self.heat.stats()["entries"],
+            "loaded": self.loaded,
+            "expired": self.expired,
+            "last_save": self.last_save
+        }
+
+GREETING_CACHE_SNAPSHOT = CacheSnapshot(
+    path=os.environ.get('GREETING_CACHE_SNAPSHOT',
+                        os.path.join(tempfile.gettempdir(), 'flask_api_greeting_cache.bin')),
+    max_entries=int(os.environ.get('GREETING_CACHE_SNAPSHOT_ENTRIES', 1000)),
+    interval=float(os.environ.get('GREETING_CACHE_SNAPSHOT_INTERVAL', 0))
+)
+SHUTDOWN.register_flush('cache_snapshot', GREETING_CACHE_SNAPSHOT.close)
+
+def get_mood_index(rng=random):
     """生成今日心情指数"""
-    return random.randint(80, 100)
+    return rng.randint(80, 100)
+
+# 预编码的固定响应
+class PrebuiltResponse:
+    """内容固定的JSON响应，第一次使用时编码并压缩，之后每次请求只复用字节
+
+    同时保存gzip压缩版本，客户端接受gzip时返回压缩版本。
+    预派生工作进程时在派生前构建，所有工作进程共享同一份字节。
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.body = None
+        self.gzipped = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        """编码并压缩响应体（需要应用上下文），已构建时直接返回"""
+        if self.body is None:
+            with self._lock:
+                if self.body is None:
+                    body = jsonify(self.data).get_data()
+                    self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+                    self.body = body
+        return self
+
+    def response(self):
+        """按请求的Accept-Encoding创建响应"""
+        self.build()
+        if request.accept_encodings['gzip'] and len(self.gzipped) < len(self.body):
+            response = Response(self.gzipped, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(self.body, mimetype='application/json')
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+INDEX_PAGE = PrebuiltResponse({
+    "api_name": "✨ OASB GreetAPI",
+    "description": "基于Flask的智能问候服务平台，每次请求都会收到独特的回应",
+    "endpoints": {
+        "基础问候": "/api/greeting?name=你的名字",
+        "示例": "/api/greeting?name=小明"
+    },
+    "features": [
+        "🎈 根据时间智能问候",
+        "🎲 随机温馨提示",
+        "📝 每日随机格言",
+        "🌈 心情指数",
+        "🎨 丰富的表情"
+    ],
+    "tips": "复制上面的地址到浏览器试试看吧~",
+    "support": "支持中文和表情符号，每次都有不同惊喜 ✨"
+})
 
-@app.route('/')
 def index():
     """首页：显示API使用说明"""
-    return jsonify({
-        "api_name": "✨ OASB GreetAPI",
-        "description": "基于Flask的智能问候服务平台，每次请求都会收到独特的回应",
-        "endpoints": {
-            "基础问候": "/api/greeting?name=你的名字",
-            "示例": "/api/greeting?name=小明"
-        },
-        "features": [
-            "🎈 根据时间智能问候",
-            "🎲 随机温馨提示",
-            "📝 每日随机格言",
-            "🌈 心情指数",
-            "🎨 丰富的表情"
-        ],
-        "tips": "复制上面的地址到浏览器试试看吧~",
-        "support": "支持中文和表情符号，每次都有不同惊喜 ✨"
-    })
+    return INDEX_PAGE.response()
+
+# 状态推送
+class StatusSubscriber:
+    """一个状态推送订阅者，事件队列有界"""
+    __slots__ = ('events', 'lagging')
+
+    def __init__(self, queue_size):
+        self.events = queue.Queue(maxsize=queue_size)
+        self.lagging = False
+
+class StatusBroadcaster:
+    """为所有 /status/stream 订阅者共享的状态采样器
+
+    - 有订阅者时后台线程每隔 interval 秒采样一次内存中的统计和系统指标，
+      与上一次采样比较后生成增量事件，编码一次后分发给所有订阅者
+    - 订阅者数量有上限，超出时拒绝新订阅
+    - 每个订阅者的队列有界；客户端读取过慢导致队列满时清空其队列，
+      改为发送一次完整快照（resync），不会阻塞采样线程或占用无界内存
+    """
+
+    def __init__(self, interval=1.0, max_subscribers=50, queue_size=16):
+        self.interval = interval
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.samples = 0
+        self.resyncs = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._seq = 0
+        self._counters = {}
+        self._errors_recorded = 0
+        self._state = None
+        self.closed = False
+
+    def subscribe(self):
+        """注册订阅者，已满时返回None
+        新订阅者先收到一次完整快照
+        """
+        with self._lock:
+            if self.closed or len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscriber = StatusSubscriber(self.queue_size)
+            if self._state is None:
+                self._sample()
+            subscriber.events.put_nowait(self._encode('snapshot', self._state))
+            self._subscribers.add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='status-stream', daemon=True)
+                self._thread.start()
+            return subscriber
+
+    def close(self):
+        """停止推送，通知所有订阅者结束连接"""
+        with self._lock:
+            self.closed = True
+            for subscriber in self._subscribers:
+                self._resync(subscriber, None)
+
+    def unsubscribe(self, subscriber):
+        """注销订阅者"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stats(self):
+        """推送计数"""
+        return {
+            "subscribers": len(self._subscribers),
+            "max_subscribers": self.max_subscribers,
+            "samples": self.samples,
+            "resyncs": self.resyncs
+        }
+
+    def _run(self):
+        """采样循环，没有订阅者时退出"""
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._subscribers or self.closed:
+                    self._thread = None
+                    self._state = None
+                    return
+                delta = self._sample()
+                message = self._encode('delta', delta)
+                snapshot = None
+                for subscriber in self._subscribers:
+                    if not subscriber.lagging:
+                        try:
+                            subscriber.events.put_nowait(message)
+                            continue
+                        except queue.Full:
+                            subscriber.lagging = True
+                            self.resyncs += 1
+                    if snapshot is None:
+                        snapshot = self._encode('snapshot', self._state)
+                    self._resync(subscriber, snapshot)
+
+    def _resync(self, subscriber, snapshot):
+        """清空落后订阅者的队列并放入完整快照"""
+        try:
+            while True:
+                subscriber.events.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.events.put_nowait(snapshot)
+        subscriber.lagging = False
+
+    def _sample(self):
+        """采样一次，更新完整状态并返回与上一次相比的增量
+        只读取内存中的统计，不重新加载统计文件或预写日志，持有订阅锁期间没有磁盘读写
+        """
+        stats = SERVICE_STATUS.get_statistics(reload=False)
+        counters = {
+            "total_requests": stats["total_requests"],
+            "active_connections": stats["active_connections"]
+        }
+        for group in ("request_methods", "status_codes", "popular_endpoints"):
+            for key, value in stats[group].items():
+                counters[f"{group}.{key}"] = value
+        changed = {key: value for key, value in counters.items() if self._counters.get(key) != value}
+        recorded = SERVICE_STATUS.error_log.recorded
+        new_errors = stats["recent_errors"][:recorded - self._errors_recorded]
+        system = SYSTEM_MONITOR.sample()
+
+        self.samples += 1
+        self._counters = counters
+        self._errors_recorded = recorded
+        self._state = {
+            "uptime": stats["uptime"],
+            "last_request": stats["last_request"],
+            "counters": counters,
+            "system_metrics": system,
+            "recent_errors": stats["recent_errors"]
+        }
+        return {
+            "uptime": stats["uptime"],
+            "last_request": stats["last_request"],
+            "counters": changed,
+            "system_metrics": system,
+            "new_errors": new_errors
+        }
+
+    def _encode(self, event, data):
+        """编码为SSE事件"""
+        self._seq += 1
+        return f"id: {self._seq}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+STATUS_BROADCASTER = StatusBroadcaster(
+    interval=float(os.environ.get('STATUS_STREAM_INTERVAL', 1.0)),
+    max_subscribers=int(os.environ.get('STATUS_STREAM_MAX_SUBSCRIBERS', 50)),
+    queue_size=int(os.environ.get('STATUS_STREAM_QUEUE_SIZE', 16))
+)
+STATUS_STREAM_HEARTBEAT = 15.0  # 无事件时发送注释行保持连接的间隔（秒）
 
-@app.route('/status')
 def service_status():
     """服务状态检查接口
     返回当前服务的详细运行状态，包括：
     - 基本信息：运行时长、启动时间、版本等
     - 请求统计：总数、活跃连接数、最后请求时间
-    - 详细统计：请求方法分布、状态码统计、热门端点
+    - 详细统计：请求方法分布、状态码统计、热门端点、延迟直方图
     - 系统资源：CPU、内存、磁盘使用情况
     - 错误信息：最近的错误记录
     """
+    return jsonify(build_status())
+
+def build_status():
+    """生成 /status 的内容，集群汇总时本节点直接调用"""
     # 获取完整统计信息
     stats = SERVICE_STATUS.get_statistics()
     
     # 获取系统资源信息
     system_metrics = SYSTEM_MONITOR.get_all_metrics()
     
-    return jsonify({
+    return {
         "status": "running",
         "version": API_VERSION,
         "start_time": SERVICE_STATUS.start_time.strftime('%Y-%m-%d %H:%M:%S'),
@@ -832,151 +3548,1256 @@ def service_status():
         "detailed_stats": {
             "request_methods": stats["request_methods"],
             "status_codes": stats["status_codes"],
-            "popular_endpoints": stats["popular_endpoints"]
+            "popular_endpoints": stats["popular_endpoints"],
+            "latency": stats["latency"]
         },
         
         # 系统资源
         "system_metrics": {
             "cpu_usage": system_metrics["cpu_usage"],
             "memory_usage": system_metrics["memory_usage"],
-            "disk_io": system_metrics["disk_io"]
+            "disk_io": system_metrics["disk_io"],
+            "history": SYSTEM_MONITOR.history_summary(),
+            "process": SYSTEM_MONITOR.process_metrics(),
+            "workers": SYSTEM_MONITOR.worker_metrics()
         },
         
+        # 个性化参数缓存
+        "personalization_cache": PERSONALIZATION_CACHE.stats(),
+        
+        # 问候响应并发合并
+        "greeting_single_flight": GREETING_SINGLE_FLIGHT.stats(),
+
+        # 问候缓存快照
+        "greeting_cache_snapshot": GREETING_CACHE_SNAPSHOT.stats(),
+        
+        # 状态推送
+        "status_stream": STATUS_BROADCASTER.stats(),
+        
+        # 访问日志
+        "access_log": ACCESS_LOG.stats() if ACCESS_LOG_ENABLED else "未启用",
+
+        # 文件锁
+        "file_locks": FileLock.stats(),
+        
         # 错误信息
         "recent_errors": stats["recent_errors"] if stats["recent_errors"] else "无错误记录"
+    }
+
+def status_stream():
+    """状态推送接口（Server-Sent Events）
+    连接后先推送一次完整快照（event: snapshot），之后按采样间隔推送增量（event: delta），
+    只包含变化的计数、最新系统指标和新增错误。
+    """
+    subscriber = STATUS_BROADCASTER.subscribe()
+    if subscriber is None:
+        return make_response(jsonify({
+            "code": 503,
+            "status": "error",
+            "error": {
+                "code": "TooManySubscribers",
+                "message": "状态推送订阅者已达上限",
+                "suggestion": "请稍后重试或改用 /status 轮询"
+            }
+        }), 503, {'Retry-After': '5'})
+
+    def events():
+        try:
+            yield f"retry: {int(STATUS_BROADCASTER.interval * 1000)}\n\n"
+            while True:
+                try:
+                    event = subscriber.events.get(timeout=STATUS_STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    # 服务正在停止
+                    return
+                yield event
+        finally:
+            STATUS_BROADCASTER.unsubscribe(subscriber)
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# 集群状态汇总
+class ClusterAggregator:
+    """并发查询各节点的 /status 并合并为集群视图
+
+    - 所有节点并发查询，整体等待不超过 timeout 秒，超时或出错的节点标记后跳过
+    - 合并计数、延迟直方图和各节点工作进程的资源占用
+    - 合并结果缓存 ttl 秒，缓存过期时并发的请求只触发一次查询
+    节点列表中不要包含本节点的地址，本节点的状态直接在进程内读取（include_self）。
+    """
+
+    def __init__(self, peers=(), timeout=1.0, ttl=5.0, include_self=True):
+        self.peers = [peer.rstrip('/') for peer in peers]
+        self.timeout = timeout
+        self.ttl = ttl
+        self.include_self = include_self
+        self._cached = None  # (过期时间, 合并结果)
+        self._flight = SingleFlight(timeout * 2)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def status(self):
+        """返回 (合并结果, 是否来自缓存)"""
+        cached = self._cached
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1], True
+        payload, _ = self._flight.do('cluster', self._refresh)
+        return payload, False
+
+    def _refresh(self):
+        payload = self.merge(self._collect())
+        self._cached = (time.monotonic() + self.ttl, payload)
+        return payload
+
+    def _fetch(self, peer):
+        started = time.perf_counter()
+        req = urllib.request.Request(f"{peer}/status", headers={'Accept': 'application/json',
+                                                               'User-Agent': 'GreetAPI-cluster'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            data = json.load(response)
+        return data, time.perf_counter() - started
+
+    def _collect(self):
+        """查询所有节点，返回节点结果列表"""
+        futures = {}
+        if self.peers:
+            with self._lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(max_workers=min(32, len(self.peers)),
+                                                        thread_name_prefix='cluster')
+            futures = {self._executor.submit(self._fetch, peer): peer for peer in self.peers}
+
+        nodes = []
+        if self.include_self:
+            started = time.perf_counter()
+            nodes.append({"node": "self", "status": "ok", "data": build_status(),
+                          "latency_ms": round((time.perf_counter() - started) * 1000, 2)})
+
+        from concurrent.futures import wait
+        done, _ = wait(futures, timeout=self.timeout)
+        for future, peer in futures.items():
+            if future not in done:
+                future.cancel()
+                nodes.append({"node": peer, "status": "timeout", "error": f"超过{self.timeout}秒未响应"})
+                continue
+            try:
+                data, elapsed = future.result()
+                nodes.append({"node": peer, "status": "ok", "data": data,
+                              "latency_ms": round(elapsed * 1000, 2)})
+            except Exception as e:
+                nodes.append({"node": peer, "status": "error", "error": f"{type(e).__name__}: {str(e)}"})
+        return nodes
+
+    @staticmethod
+    def _add(target, counts):
+        for key, value in (counts or {}).items():
+            target[key] = target.get(key, 0) + value
+
+    @classmethod
+    def merge(cls, nodes):
+        """合并节点结果"""
+        alive = [node for node in nodes if node["status"] == "ok"]
+        methods, status_codes, endpoints = {}, {}, {}
+        worker_totals = {}
+        hosts = []
+        errors = []
+        total_requests = active_connections = 0
+        last_request = None
+        for node in alive:
+            data = node["data"]
+            basic = data.get("basic_stats", {})
+            detailed = data.get("detailed_stats", {})
+            total_requests += basic.get("total_requests", 0)
+            active_connections += basic.get("active_connections", 0)
+            if basic.get("last_request") and (last_request is None or basic["last_request"] > last_request):
+                last_request = basic["last_request"]
+            cls._add(methods, detailed.get("request_methods"))
+            cls._add(status_codes, detailed.get("status_codes"))
+            cls._add(endpoints, detailed.get("popular_endpoints"))
+
+            system = data.get("system_metrics", {})
+            hosts.append({"node": node["node"], "cpu_usage": system.get("cpu_usage"),
+                          "memory_usage": system.get("memory_usage")})
+            workers = system.get("workers") or {}
+            for field in ("count", "rss_bytes", "uss_bytes", "pss_bytes", "cpu_seconds", "threads", "open_fds"):
+                if isinstance(workers.get(field), (int, float)):
+                    worker_totals[field] = worker_totals.get(field, 0) + workers[field]
+
+            if isinstance(data.get("recent_errors"), list):
+                errors.extend(dict(error, node=node["node"]) for error in data["recent_errors"])
+
+        status = "ok" if len(alive) == len(nodes) else "degraded" if alive else "unavailable"
+        worker_totals["formatted"] = {
+            field: MetricSample.format_mb(worker_totals[field]) if field in worker_totals else "N/A"
+            for field in ("rss_bytes", "uss_bytes", "pss_bytes")
+        }
+        return {
+            "status": status,
+            "generated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "nodes": [{key: value for key, value in node.items() if key != "data"} for node in nodes],
+            "totals": {
+                "nodes": len(nodes),
+                "nodes_ok": len(alive),
+                "total_requests": total_requests,
+                "active_connections": active_connections,
+                "last_request": last_request,
+                "request_methods": dict(sorted(methods.items())),
+                "status_codes": dict(sorted(status_codes.items())),
+                "popular_endpoints": dict(sorted(endpoints.items(), key=lambda x: x[1], reverse=True))
+            },
+            "latency": LatencyHistogram.merge(
+                node["data"].get("detailed_stats", {}).get("latency") for node in alive),
+            "system_metrics": {"hosts": hosts, "workers": worker_totals},
+            "recent_errors": sorted(errors, key=lambda error: error.get("time", ""), reverse=True)[:20]
+        }
+
+CLUSTER = ClusterAggregator(
+    peers=_env_list('CLUSTER_PEERS', ()),
+    timeout=float(os.environ.get('CLUSTER_TIMEOUT', 1.0)),
+    ttl=float(os.environ.get('CLUSTER_TTL', 5.0))
+)
+
+def cluster_status():
+    """集群状态汇总接口
+    并发查询配置的节点并合并计数、延迟直方图和资源占用；
+    部分节点超时或出错时返回 status=degraded，所有节点都不可用时返回503
+    """
+    payload, cached = CLUSTER.status()
+    response = make_response(jsonify(dict(payload, cached=cached, ttl=CLUSTER.ttl)),
+                             503 if payload["status"] == "unavailable" else 200)
+    return response
+
+def status_errors():
+    """错误聚合查询接口
+    按指纹分页返回错误聚合记录，支持参数：
+    - page: 页码，默认1
+    - per_page: 每页条数，默认20，最大100
+    - sort: 排序字段 count/last_seen/first_seen，默认count
+    """
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    sort = request.args.get('sort', 'count')
+    if page < 1 or not 1 <= per_page <= 100 or sort not in ErrorAggregator.SORT_KEYS:
+        return make_response(jsonify({
+            "code": 400,
+            "status": "error",
+            "error": {
+                "code": "InvalidParameter",
+                "message": "分页参数无效",
+                "suggestion": "page需大于0，per_page需在1-100之间，sort可选count/last_seen/first_seen"
+            }
+        }), 400)
+
+    return jsonify({
+        "code": 200,
+        "status": "success",
+        "data": SERVICE_STATUS.get_error_groups(page, per_page, sort)
     })
 
-@app.route('/api/greeting')
-@cache.cached(timeout=60, query_string=True)  # 缓存1分钟
+# 问候接口固定的跨域和安全响应头，启动时构建一次
+GREETING_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),  # 允许跨域访问
+    ('Access-Control-Allow-Methods', 'GET'),
+    ('X-Content-Type-Options', 'nosniff'),
+    ('X-Frame-Options', 'DENY'),
+)
+GREETING_CACHE_CONTROL = 'public, max-age=60'
+
+def greeting_response(body, status_code, locale, cache_status, negotiated=False):
+    """用编码好的JSON创建问候接口响应并附加响应头
+    Args:
+        negotiated: 语言由 Accept-Language 协商得到（没有 lang 参数），共享缓存需按该请求头区分响应
+    """
+    response = make_response(body, status_code)
+    response.mimetype = 'application/json'
+    response.headers.extend(GREETING_HEADERS)
+    # 只有成功的响应可以被共享缓存保存，参数错误的响应不缓存
+    response.headers['Cache-Control'] = GREETING_CACHE_CONTROL if status_code == 200 else 'no-store'
+    if negotiated:
+        response.vary.add('Accept-Language')
+    response.headers['Content-Language'] = locale
+    response.headers['X-Cache'] = cache_status
+    return response
+
+def store_greeting(personalization):
+    """生成问候响应并写入缓存"""
+    entry = build_greeting(personalization)
+    cache.set(personalization.cache_key, entry, timeout=GREETING_CACHE_TIMEOUT)
+    GREETING_CACHE_SNAPSHOT.track(personalization.cache_key, GREETING_CACHE_TIMEOUT)
+    return entry
+
+def load_greeting(personalization):
+    """缓存未命中时加载问候响应
+    启用跨进程锁表时，拿到锁后先检查缓存，其他进程可能已经写入
+    """
+    if GREETING_LOCK_TABLE is None:
+        return store_greeting(personalization)
+    key = personalization.cache_key
+    with GREETING_LOCK_TABLE.hold(key, GREETING_SINGLE_FLIGHT.timeout):
+        return cache.get(key) or store_greeting(personalization)
+
 def greeting():
-    """处理问候请求，确保正确处理Unicode字符"""
-    # 设置响应编码
-    flask.Flask.response_class.charset = 'utf-8'
-    
-    # 设置响应头，确保正确的字符编码
-    response = make_response()
-    response.headers['Content-Type'] = 'application/json; charset=utf-8'
     """处理问候请求
     返回个性化的问候消息，包括：
     - 基于时间的问候语
     - 心情指数
     - 温馨提示
     - 励志名言
+    相同参数的响应缓存1分钟；缓存过期时并发的相同请求只计算一次。
     请求统计由中间件自动处理
     """
-    # 生成唯一会话ID
-    session_id = str(uuid.uuid4())[:8]
-    
-    # 获取并处理参数，确保正确的Unicode编码
-    name = request.args.get('name', type=str)
-    if name:
-        try:
-            # 确保name是有效的UTF-8字符串
-            name = name.encode('utf-8').decode('utf-8')
-        except UnicodeError:
-            name = None
-    
-    favorite = request.args.get('favorite', '').lower()
-    
-    # 获取时间相关问候
-    time_greeting, time_emoji = get_greeting_by_time()
-    
+    personalization = get_personalization()
+    entry = cache.get(personalization.cache_key)
+    if entry is not None:
+        GREETING_CACHE_SNAPSHOT.touch(personalization.cache_key)
+        g.cache_hit = True
+        cache_status = 'HIT'
+    else:
+        entry, role = GREETING_SINGLE_FLIGHT.do(
+            personalization.cache_key, lambda: load_greeting(personalization))
+        g.cache_hit = role == 'coalesced'
+        cache_status = 'COALESCED' if g.cache_hit else 'MISS'
+    body, status_code = entry
+    return greeting_response(body, status_code, personalization.locale, cache_status,
+                             negotiated=not request.args.get('lang'))
+
+def build_greeting(personalization):
+    """生成问候响应
+    Returns:
+        (编码后的JSON, 状态码)
+    """
+    response_data, status_code = generate_greeting(personalization)
+    return jsonify(response_data).get_data(), status_code
+
+def generate_greeting(personalization, now=None, rng=random, session_id=None):
+    """生成一条问候响应数据，不依赖请求上下文
+    Args:
+        personalization: 规范化后的问候参数
+        now: 生成时间（该语言时区），默认取当前时间
+        rng: 随机数生成器，传入带种子的random.Random可复现结果
+        session_id: 会话ID，默认随机生成
+    Returns:
+        (响应字典, 状态码)，与 /api/greeting 的JSON结构相同
+    """
+    catalog = CONTENT.current
+    profile = catalog.profile(personalization.locale)
+    locale = personalization.locale
+    if now is None:
+        now = datetime.now(get_timezone(profile.timezone))
+    time_greeting, time_emoji = get_greeting_by_time(locale, now, rng)
+    parts = {
+        'time_greeting': time_greeting,
+        'time_emoji': time_emoji,
+        'greeting': catalog.pick('greeting', locale, rng=rng),
+        'emoji': catalog.pick('emoji', locale, rng=rng),
+        'mood': get_mood_index(rng),
+        'mood_emoji': catalog.pick('mood_emoji', locale, rng=rng),
+        'tip': catalog.pick('tip', locale, rng=rng),
+        'quote': catalog.pick('quote', locale, rng=rng),
+    }
+    if session_id is None:
+        # 生成唯一会话ID
+        session_id = str(uuid.uuid4())[:8]
+    return assemble_greeting(catalog, profile, personalization, now, session_id, parts, rng)
+
+def generate_greetings(count, names=(None,), favorite='', locale=None, now=None, rng=random):
+    """批量生成问候响应数据（离线导出用）
+
+    每个字段的内容按列整批抽取（AliasTable.pick_many），再逐条组装，
+    结构与 /api/greeting 完全相同。第i条使用 names[i % len(names)]，
+    名字与在线接口一样经过 Personalization.normalize 规范化。
+
+    Args:
+        count: 生成条数
+        names: 名字列表，None 表示未提供name参数
+        favorite: 喜好
+        locale: 语言，默认使用目录的默认语言
+        now: 生成时间（该语言时区），默认取当前时间
+        rng: 随机数生成器
+    Returns:
+        [(响应字典, 状态码), ...]
+    """
+    catalog = CONTENT.current
+    locale = locale if locale in catalog.locales else catalog.default_locale
+    profile = catalog.profile(locale)
+    if now is None:
+        now = datetime.now(get_timezone(profile.timezone))
+    bucket = profile.hour_buckets[now.hour]
+    people = [Personalization.normalize(name, favorite, locale) for name in names]
+
+    columns = {
+        'time_greeting': catalog.pick_many('time_greeting', count, profile.locale, bucket, rng),
+        'time_emoji': catalog.pick_many('time_emoji', count, profile.locale, bucket, rng),
+        'greeting': catalog.pick_many('greeting', count, locale, rng=rng),
+        'emoji': catalog.pick_many('emoji', count, locale, rng=rng),
+        'mood': [80 + int(rng.random() * 21) for _ in range(count)],
+        'mood_emoji': catalog.pick_many('mood_emoji', count, locale, rng=rng),
+        'tip': catalog.pick_many('tip', count, locale, rng=rng),
+        'quote': catalog.pick_many('quote', count, locale, rng=rng),
+    }
+    session_ids = ['%08x' % rng.getrandbits(32) for _ in range(count)]
+    keys = tuple(columns)
+    return [assemble_greeting(catalog, profile, people[index % len(people)], now, session_ids[index],
+                              dict(zip(keys, row)), rng)
+            for index, row in enumerate(zip(*columns.values()))]
+
+def assemble_greeting(catalog, profile, personalization, now, session_id, parts, rng=random):
+    """把抽取好的内容组装成问候响应
+    Args:
+        parts: 时段问候语、表情、问候语、心情指数和提示等已抽取的内容
+    Returns:
+        (响应字典, 状态码)
+    """
+    # 规范化后的参数（name已去除首尾空白）
+    name = personalization.name
+    favorite = personalization.favorite
+    locale = personalization.locale
+
     # 构建优化后的响应结构
-    status = "success" if name and name.strip() else "info"
+    status = "success" if name else "info"
     response_data = {
         "code": 200,
         "status": status,
         "data": {
-            "greeting": f"{time_greeting} {time_emoji} {random.choice(GREETINGS)} {random.choice(EMOJIS)}",
-            "mood": f"{get_mood_index()}% {random.choice(['😊', '🥳', '🌟', '✨'])}",
-            "tip": random.choice(TIPS),
-            "quote": random.choice(QUOTES)
+            "greeting": profile.format_greeting(
+                time_greeting=parts['time_greeting'],
+                time_emoji=parts['time_emoji'],
+                greeting=parts['greeting'],
+                emoji=parts['emoji']
+            ),
+            "mood": profile.format_mood(mood=parts['mood'], emoji=parts['mood_emoji']),
+            "tip": parts['tip'],
+            "quote": parts['quote']
         },
         "meta": {
             "api_version": API_VERSION,
             "session_id": session_id,
-            "timestamp": datetime.now(pytz.timezone('Asia/Shanghai')).strftime("%Y-%m-%d %H:%M:%S")
+            "locale": locale,
+            "timestamp": now.strftime("%Y-%m-%d %H:%M:%S")
         }
     }
 
-    # 创建响应对象，确保正确处理Unicode字符
-    response = make_response(jsonify(response_data))
-    response.headers.update({
-        'Content-Type': 'application/json; charset=utf-8',
-        'Access-Control-Allow-Origin': '*',  # 允许跨域访问
-        'Access-Control-Allow-Methods': 'GET',
-        'X-Content-Type-Options': 'nosniff',
-        'X-Frame-Options': 'DENY'
-    })
-    
-    # 设置缓存控制
-    if cache.cached:
-        response.headers['Cache-Control'] = 'public, max-age=60'
-    else:
-        response.headers['Cache-Control'] = 'no-store'
-
     # 未提供name参数的情况
     if name is None:
-        response_data["data"]["example"] = "http://localhost:5000/api/greeting?name=小明"
-        return make_response(jsonify(response_data), 200)
+        response_data["data"]["example"] = profile.messages['example']
+        return response_data, 200
     
     # 验证name参数
-    name = name.strip()
     if not name:
         response_data.update({
             "code": 400,
             "status": "error",
             "error": {
                 "code": "InvalidParameter",
-                "message": "name参数不能为空",
-                "suggestion": "请提供有效的名字参数"
+                "message": profile.messages['empty_name'],
+                "suggestion": profile.messages['empty_name_suggestion']
             }
         })
-        return make_response(jsonify(response_data), 400)
+        return response_data, 400
     
     # 添加个性化内容
-    response_data["data"]["greeting"] += f", {name}！"
+    response_data["data"]["greeting"] = profile.format_personalized(
+        greeting=response_data["data"]["greeting"], name=name)
     
     # 添加用户喜好相关的内容
     if favorite:
-        favorite_responses = {
-            'music': f"🎵 听说你喜欢音乐，今天推荐: {random.choice(['古典', '流行', '爵士'])}",
-            'sports': f"⚽ 运动爱好者！今天适合: {random.choice(['跑步', '瑜伽', '游泳'])}",
-            'food': f"🍄‍ 美食家！试试: {random.choice(['川菜', '粤菜', '湘菜'])}"
-        }
-        response_data["data"]["recommendation"] = favorite_responses.get(favorite, "🎁 发现你的独特喜好！")
+        response_data["data"]["recommendation"] = (
+            catalog.pick(f'favorite:{favorite}', locale, rng=rng)
+            or catalog.pick('favorite:other', locale, rng=rng))
     
-    return make_response(jsonify(response_data), 200)
+    return response_data, 200
+
+# 按需性能分析
+class Profiler:
+    """按需启动的采样分析器，空闲时不运行任何代码
+
+    - CPU模式：按固定频率读取 sys._current_frames()，把各线程的调用栈按栈聚合计数，
+      输出collapsed格式（可直接交给flamegraph.pl等工具）或speedscope JSON
+    - 分配模式：用tracemalloc在开始和结束各取一次快照，比较两者得到分配增长最多的位置
+    同一时间只允许一次分析，采样线程就是发起请求的线程，不额外创建线程。
+    """
+    # 栈顶为这些函数的线程视为空闲（等待锁、I/O或休眠），默认不计入
+    IDLE_FUNCTIONS = frozenset({
+        'wait', 'select', 'poll', 'epoll', 'accept', 'recv', 'recv_into', 'readinto',
+        'sleep', 'get', '_wait_for_tstate_lock', 'serve_forever', 'handle_request'
+    })
+    MAX_SECONDS = 60
+    MAX_HZ = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self):
+        return self._lock.locked()
+
+    @contextmanager
+    def session(self):
+        """独占一次分析，已有分析在进行时产生 False"""
+        acquired = self._lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._lock.release()
+
+    def sample_stacks(self, seconds, hz=100, include_idle=False, thread_prefix=None):
+        """采样各线程的调用栈
+        阻塞在C函数中的线程（如队列等待）无法识别为空闲，可以用 thread_prefix 只采样指定线程
+        Returns:
+            ({(线程名, 调用栈): 次数}, 实际采样时长)，调用栈为从外到内的 (函数名, 文件, 行号) 元组
+        """
+        interval = 1.0 / hz
+        own = threading.get_ident()
+        counts = {}
+        code_keys = {}
+        started = time.perf_counter()
+        deadline = started + seconds
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                thread_name = names.get(ident, str(ident))
+                if thread_prefix and not thread_name.startswith(thread_prefix):
+                    continue
+                if not include_idle and frame.f_code.co_name in self.IDLE_FUNCTIONS:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    key = code_keys.get(code)
+                    if key is None:
+                        key = code_keys[code] = (code.co_name, code.co_filename, code.co_firstlineno)
+                    stack.append(key)
+                    frame = frame.f_back
+                stack.reverse()
+                sample = (thread_name, tuple(stack))
+                counts[sample] = counts.get(sample, 0) + 1
+            now = time.perf_counter()
+            if now >= deadline:
+                return counts, now - started
+            time.sleep(min(interval, deadline - now))
+
+    @staticmethod
+    def collapsed(counts):
+        """collapsed格式：每行 "线程;外层函数;…;内层函数 次数" """
+        lines = []
+        for (thread_name, stack), count in sorted(counts.items(), key=lambda item: -item[1]):
+            frames = ';'.join(f"{name} ({os.path.basename(filename)}:{line})" for name, filename, line in stack)
+            lines.append(f"{thread_name};{frames} {count}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def speedscope(counts, duration, hz):
+        """speedscope文件格式，每个线程一个 sampled 类型的profile"""
+        frames = []
+        frame_index = {}
+        profiles = {}
+        for (thread_name, stack), count in counts.items():
+            indexes = []
+            for frame in stack:
+                index = frame_index.get(frame)
+                if index is None:
+                    index = frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indexes.append(index)
+            profile = profiles.setdefault(thread_name, {
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(duration, 6),
+                "samples": [],
+                "weights": []
+            })
+            profile["samples"].append(indexes)
+            profile["weights"].append(round(count / hz, 6))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+            "name": f"OASB GreetAPI {os.getpid()}",
+            "exporter": f"OASB GreetAPI {API_VERSION}"
+        }
+
+    @staticmethod
+    def allocations(seconds, top=25, depth=1):
+        """比较seconds秒前后的内存分配快照
+        Returns:
+            按增长字节数排序的前top个分配位置
+        """
+        import tracemalloc
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(depth)
+        try:
+            before = tracemalloc.take_snapshot()
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+        key_type = 'traceback' if depth > 1 else 'lineno'
+        stats = after.compare_to(before, key_type)[:top]
+        return [{
+            "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            "size_diff": stat.size_diff,
+            "count_diff": stat.count_diff,
+            "size": stat.size,
+            "count": stat.count
+        } for stat in stats]
+
+PROFILER = Profiler()
+
+def profile_error(status_code, code, message, suggestion):
+    """分析接口的错误响应"""
+    return make_response(jsonify({
+        "code": status_code,
+        "status": "error",
+        "error": {"code": code, "message": message, "suggestion": suggestion}
+    }), status_code)
+
+def debug_profile():
+    """按需性能分析接口
+    需要设置环境变量 DEBUG_PROFILE_TOKEN，并在请求头中携带
+    Authorization: Bearer <token>。参数：
+    - seconds: 分析时长，默认5，最大60
+    - mode: cpu（调用栈采样，默认）或 alloc（内存分配对比）
+    - format: collapsed（默认）或 speedscope，仅cpu模式
+    - hz: 采样频率，默认100，最大1000，仅cpu模式
+    - idle: 为1时包含等待中的线程，仅cpu模式
+    - thread: 只采样名称以该前缀开头的线程，仅cpu模式
+    - top: 返回的分配位置数，默认25，仅alloc模式
+    - depth: 分配调用栈深度，默认1，仅alloc模式
+    """
+    token = os.environ.get('DEBUG_PROFILE_TOKEN')
+    if not token:
+        # 未配置令牌时接口视为不存在
+        return profile_error(404, "NotFound", "接口不存在", "设置 DEBUG_PROFILE_TOKEN 后启用性能分析接口")
+    provided = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(provided.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+        return profile_error(401, "Unauthorized", "令牌无效", "在请求头中携带 Authorization: Bearer <token>")
+
+    seconds = request.args.get('seconds', 5.0, type=float)
+    mode = request.args.get('mode', 'cpu')
+    output = request.args.get('format', 'collapsed')
+    hz = request.args.get('hz', 100, type=int)
+    top = request.args.get('top', 25, type=int)
+    depth = request.args.get('depth', 1, type=int)
+    if (not 0 < seconds <= Profiler.MAX_SECONDS or mode not in ('cpu', 'alloc')
+            or output not in ('collapsed', 'speedscope') or not 1 <= hz <= Profiler.MAX_HZ
+            or not 1 <= top <= 500 or not 1 <= depth <= 64):
+        return profile_error(400, "InvalidParameter", "分析参数无效",
+                             "seconds需在0-60之间，mode可选cpu/alloc，format可选collapsed/speedscope，hz需在1-1000之间")
+
+    with PROFILER.session() as acquired:
+        if not acquired:
+            return profile_error(409, "ProfilerBusy", "已有性能分析正在进行", "请等待当前分析结束后重试")
+        logger.info(f"开始性能分析: mode={mode} seconds={seconds}")
+        if mode == 'alloc':
+            return jsonify({
+                "code": 200,
+                "status": "success",
+                "data": {"seconds": seconds, "allocations": Profiler.allocations(seconds, top, depth)}
+            })
+        counts, duration = PROFILER.sample_stacks(seconds, hz, request.args.get('idle') == '1',
+                                                  request.args.get('thread'))
+
+    if output == 'speedscope':
+        response = make_response(json.dumps(Profiler.speedscope(counts, duration, hz), ensure_ascii=False))
+        response.mimetype = 'application/json'
+        response.headers['Content-Disposition'] = f'attachment; filename="profile-{os.getpid()}.speedscope.json"'
+        return response
+    response = make_response(Profiler.collapsed(counts))
+    response.mimetype = 'text/plain'
+    return response
 
 def cleanup_stats_file():
     """清理统计文件"""
     try:
         stats_file = os.path.join(tempfile.gettempdir(), 'flask_api_stats.json')
-        if os.path.exists(stats_file):
-            os.remove(stats_file)
+        for path in (stats_file, os.path.splitext(stats_file)[0] + '.journal'):
+            if os.path.exists(path):
+                os.remove(path)
     except Exception as e:
         logger.error(f"清理统计文件失败: {str(e)}")
 
-if __name__ == '__main__':
+# 应用工厂
+DEFAULT_APP_CONFIG = {
+    # 缓存配置
+    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_DEFAULT_TIMEOUT': 300,
+    # JSON和编码配置
+    'JSONIFY_PRETTYPRINT_REGULAR': True,  # 启用JSON自动格式化
+    'JSON_SORT_KEYS': False,  # 保持JSON键的原始顺序
+    'JSON_AS_ASCII': False,  # 允许JSON包含非ASCII字符
+    'JSONIFY_MIMETYPE': "application/json; charset=utf-8",  # 设置正确的MIME类型
+}
+
+def load_config_file(path):
+    """读取config.json格式的配置文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+ACCESS_LOG_ENABLED = True
+
+def configure_subsystems(config):
+    """把配置文件中的子系统配置应用到尚未初始化的子系统上"""
+    content = config.get('content', {})
+    if 'directory' in content:
+        CONTENT.content_dir = content['directory']
+
+    monitoring = config.get('monitoring', {})
+    monitor_kwargs = {}
+    if 'directory' in monitoring:
+        monitor_kwargs['monitoring_dir'] = monitoring['directory']
+    if 'retention' in monitoring:
+        monitor_kwargs['retention_days'] = monitoring['retention']
+    if 'history_size' in monitoring:
+        monitor_kwargs['history_size'] = monitoring['history_size']
+    if 'publish_interval' in monitoring:
+        monitor_kwargs['publish_interval'] = monitoring['publish_interval']
+    if monitor_kwargs:
+        SYSTEM_MONITOR.configure(**monitor_kwargs)
+
+    cache_settings = config.get('cache', {})
+    for key, name in (('snapshot_path', 'path'), ('snapshot_entries', 'max_entries'),
+                      ('snapshot_interval', 'interval')):
+        if key in cache_settings:
+            setattr(GREETING_CACHE_SNAPSHOT, name, cache_settings[key])
+
+    cluster = config.get('cluster', {})
+    if 'peers' in cluster:
+        CLUSTER.peers = [peer.rstrip('/') for peer in cluster['peers']]
+    for key in ('timeout', 'ttl', 'include_self'):
+        if key in cluster:
+            setattr(CLUSTER, key, cluster[key])
+
+    global ACCESS_LOG_ENABLED
+    access = config.get('logging', {}).get('access', {})
+    ACCESS_LOG_ENABLED = access.get('enabled', True)
+    access_kwargs = {}
+    for key, name in (('path', 'path'), ('sample_rate', 'sample_rate'), ('backup_count', 'backup_count'),
+                      ('flush_interval', 'flush_interval')):
+        if key in access:
+            access_kwargs[name] = access[key]
+    if 'max_size' in access:
+        access_kwargs['max_bytes'] = parse_size(access['max_size'])
+    if access_kwargs:
+        ACCESS_LOG.configure(**access_kwargs)
+
+def create_app(config=None):
+    """应用工厂
+    创建并配置Flask应用，注册请求钩子和路由。
+    统计、监控等子系统仍然在第一次使用时才初始化。
+
+    Args:
+        config: 与config.example.json结构相同的配置字典，可选
+    """
+    config = config or {}
+    with STARTUP.phase('初始化日志系统'):
+        init_logging()
+
+    with STARTUP.phase('创建Flask应用'):
+        app = Flask(__name__)
+        app.config.update(DEFAULT_APP_CONFIG)
+        app.logger.handlers.clear()
+
+        cache_settings = config.get('cache', {})
+        if not cache_settings.get('enabled', True):
+            app.config['CACHE_TYPE'] = 'NullCache'
+        if 'default_timeout' in cache_settings:
+            app.config['CACHE_DEFAULT_TIMEOUT'] = cache_settings['default_timeout']
+        if 'threshold' in cache_settings:
+            app.config['CACHE_THRESHOLD'] = cache_settings['threshold']
+        cache.init_app(app)
+        configure_subsystems(config)
+
+        # 探针在WSGI层应答，绕过所有请求钩子和进行中请求的统计
+        app.wsgi_app = ProbeMiddleware(SHUTDOWN.wrap(app.wsgi_app), READINESS)
+
+        app.before_request(before_request)
+        app.after_request(after_request)
+        app.teardown_request(teardown_request)
+
+        app.add_url_rule('/', view_func=index)
+        app.add_url_rule('/status', view_func=service_status)
+        app.add_url_rule('/status/errors', view_func=status_errors)
+        app.add_url_rule('/status/stream', view_func=status_stream)
+        app.add_url_rule('/status/cluster', view_func=cluster_status)
+        app.add_url_rule('/debug/profile', view_func=debug_profile)
+        app.add_url_rule('/api/greeting', view_func=greeting)
+
+    # 启动时预加载内容目录，第一个请求不承担加载开销
+    CONTENT.current
+    return app
+
+_default_app_lock = threading.Lock()
+
+def __getattr__(name):
+    """兼容 `from main import app`：首次访问时用默认配置创建应用"""
+    if name == 'app':
+        with _default_app_lock:
+            if 'app' not in globals():
+                globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def print_startup_report(config=None):
+    """打印启动耗时报告（--import-time）
+    依次创建应用、初始化各子系统并导入延迟加载的依赖，统计每一步的耗时
+    """
+    import importlib
+
+    create_app(config)
+    SERVICE_STATUS.get()
+    SYSTEM_MONITOR.get()
+    for module in ('psutil', 'pytz', 'click'):
+        with STARTUP.phase(f"导入 {module}"):
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+
+    import click
+    click.echo(f"\n{Fore.CYAN}启动耗时报告{Style.RESET_ALL}\n")
+    click.echo(STARTUP.report())
+    click.echo(f"\n{Fore.YELLOW}提示: 使用 python -X importtime main.py --import-time 可查看逐个模块的导入耗时{Style.RESET_ALL}")
+
+STARTUP.mark('模块主体')
+
+# HTTP/1.1长连接
+class _RequestBodyReader:
+    """把连接的读取流限制在当前请求的Content-Length之内
+
+    Werkzeug在每个响应之后会把套接字中剩余的数据读掉丢弃，
+    长连接上这会吞掉客户端紧接着发来的下一个请求；限制读取范围后，
+    丢弃逻辑只会读到本次请求体的末尾。
+    """
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.rfile.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.rfile.readline(size)
+        self.remaining -= len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.rfile, name)
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """支持HTTP/1.1长连接的请求处理器
+
+    - keep_alive_timeout: 连接空闲超过该秒数后关闭
+    - max_keepalive_requests: 单个连接最多处理的请求数，达到后在响应中声明关闭
+    - max_discard_body: 应用没有读取的请求体在发出响应头前读掉丢弃的上限，
+      超过上限（或客户端等待100-continue）时响应声明关闭连接
+    分块传输的请求体和HTTP/1.0客户端不使用长连接。
+    """
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，长连接上需要关闭Nagle算法避免与延迟确认叠加产生40ms停顿
+    disable_nagle_algorithm = True
+    keep_alive_timeout = 5
+    max_keepalive_requests = 100
+    max_discard_body = 64 * 1024
+
+    def setup(self):
+        # StreamRequestHandler 用 timeout 设置套接字超时，即空闲连接的保持时间
+        self.timeout = self.keep_alive_timeout
+        super().setup()
+        self.requests_handled = 0
+        self.keep_alive = False
+        self._body = None
+
+    def handle_one_request(self):
+        # 请求行解析失败时发出的错误响应总是关闭连接
+        self.keep_alive = False
+        super().handle_one_request()
+
+    def run_wsgi(self):
+        self.requests_handled += 1
+        self.keep_alive = (
+            self.max_keepalive_requests > 0
+            and not self.close_connection
+            and self.requests_handled < self.max_keepalive_requests
+            and 'chunked' not in self.headers.get('Transfer-Encoding', '').lower()
+        )
+        if not self.keep_alive:
+            return super().run_wsgi()
+
+        rfile = self.rfile
+        try:
+            length = max(0, int(self.headers.get('Content-Length') or 0))
+        except ValueError:
+            length = 0
+        self.rfile = self._body = body = _RequestBodyReader(rfile, length)
+        try:
+            super().run_wsgi()
+        finally:
+            self.rfile = rfile
+            self._body = None
+        if body.remaining > 0:
+            # 请求体没有读完，无法确定下一个请求从哪里开始
+            self.close_connection = True
+
+    def _discard_body(self):
+        """发出响应头前读掉应用没有读取的请求体，返回连接能否继续使用"""
+        body = self._body
+        if body is None or body.remaining <= 0:
+            return True
+        if (body.remaining > self.max_discard_body
+                or '100-continue' in self.headers.get('Expect', '').lower()):
+            return False
+        try:
+            while body.remaining > 0:
+                if not body.read(body.remaining):
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection' and self.keep_alive and SHUTDOWN.draining:
+            # 停止过程中处理完当前请求后关闭连接
+            self.keep_alive = False
+        if keyword.lower() == 'connection' and self.keep_alive and not self._discard_body():
+            # 请求体无法读完，无法确定下一个请求从哪里开始，在响应中声明关闭
+            self.keep_alive = False
+        if keyword.lower() == 'connection' and self.keep_alive:
+            value = 'keep-alive'
+            super().send_header('Keep-Alive', f"timeout={self.keep_alive_timeout}")
+        super().send_header(keyword, value)
+
+def make_request_handler(keep_alive_timeout=5, max_keepalive_requests=100):
+    """按配置生成请求处理器类，max_keepalive_requests为0时关闭长连接"""
+    return type('ConfiguredKeepAliveRequestHandler', (KeepAliveRequestHandler,), {
+        'keep_alive_timeout': keep_alive_timeout,
+        'max_keepalive_requests': max_keepalive_requests,
+    })
+
+# 预派生工作进程
+def preload(app):
+    """派生工作进程前构建只读数据，工作进程通过写时复制共享这些内存页
+
+    - 内容目录（别名表和驻留的文本）以及各语言的时区对象
+    - 首页响应的JSON和gzip字节
+    - 延迟导入的依赖
+    最后执行一次完整回收并 gc.freeze()，把现存对象移入永久代：工作进程中的垃圾回收
+    不再遍历这些对象，也就不会因为写入回收标记而复制它们所在的内存页。
+    统计、监控、访问日志等带后台线程和文件句柄的子系统仍然在工作进程中首次使用时创建。
+
+    Returns:
+        冻结的对象数
+    """
+    import importlib
+
+    with STARTUP.phase('预加载内容目录'):
+        catalog = CONTENT.current
+        for profile in catalog.profiles.values():
+            get_timezone(profile.timezone)
+    with STARTUP.phase('预编码首页响应'):
+        with app.app_context():
+            INDEX_PAGE.build()
+    with STARTUP.phase('预加载依赖'):
+        for module in ('pytz', 'psutil'):
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+    with STARTUP.phase('冻结对象'):
+        gc.collect()
+        gc.freeze()
+    return gc.get_freeze_count()
+
+class PreforkServer:
+    """主进程监听端口、预加载后派生多个工作进程，工作进程共享同一个监听套接字
+
+    主进程不处理请求，只负责：
+    - 工作进程异常退出时重新派生
+    - 收到SIGTERM/SIGINT时通知所有工作进程排空退出，超时后强制结束
+    - 把SIGHUP转发给工作进程，各自重新加载内容目录
+    - 报告每个工作进程的共享和独占内存
+    """
+    def __init__(self, app, host, port, workers, request_handler, use_preload=True, warm_cache=False,
+                 backlog=128):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.request_handler = request_handler
+        self.use_preload = use_preload
+        self.warm_cache = warm_cache
+        self.backlog = backlog
+        self.frozen = 0
+        self.socket = None
+        self.pids = {}
+        self.respawned = 0
+        self._stopping = threading.Event()
+
+    def start(self):
+        """监听端口、预加载并派生所有工作进程"""
+        import socket
+        # 预加载期间不运行垃圾回收，避免在冻结前把对象分散到各代
+        gc.disable()
+        self.socket = socket.create_server((self.host, self.port), backlog=self.backlog)
+        self.socket.set_inheritable(True)
+        if self.use_preload:
+            self.frozen = preload(self.app)
+        for index in range(self.workers):
+            self._spawn(index)
+        gc.enable()
+
+    def _spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker()
+        self.pids[pid] = index
+
+    def _run_worker(self):
+        """工作进程主体，不返回"""
+        code = 0
+        try:
+            # Ctrl+C会发给整个进程组，工作进程只响应主进程转发的SIGTERM
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, handle_exit)
+            if hasattr(signal, 'SIGHUP'):
+                signal.signal(signal.SIGHUP, lambda signum, frame: CONTENT.reload())
+            # 主进程显示横幅或重新派生前可能已创建这些子系统，子进程中没有它们的后台线程
+            for subsystem in (SERVICE_STATUS, SYSTEM_MONITOR, ACCESS_LOG):
+                subsystem.discard()
+            gc.enable()
+            if self.warm_cache:
+                # 缓存是每个进程私有的可变数据，各工作进程分别载入快照；保存时按进程号写临时文件再原子替换
+                GREETING_CACHE_SNAPSHOT.enable(self.app)
+            # 空闲的工作进程也定期发布指标，计入 /status 的 workers 汇总
+            ensure_metrics_publisher()
+            server = make_server(self.host, self.port, self.app, threaded=True,
+                                 request_handler=self.request_handler, fd=self.socket.fileno())
+            report = SHUTDOWN.serve(server)
+            logger.info(f"工作进程 {os.getpid()} 已停止: 排空 {report['drain_seconds']}秒, "
+                        f"丢弃请求 {report['dropped']}")
+        except BaseException as e:
+            logger.error(f"工作进程 {os.getpid()} 异常退出: {str(e)}")
+            code = 1
+        finally:
+            for handler in logger.handlers:
+                handler.flush()
+            os._exit(code)
+
+    def request_stop(self, signum=None, frame=None):
+        """信号处理函数：设置停止标志，停止流程在主循环中执行"""
+        if self._stopping.is_set():
+            logger.warning("再次收到退出信号，强制结束工作进程")
+            self._signal_workers(signal.SIGKILL)
+            os._exit(1)
+        self._stopping.set()
+
+    def _signal_workers(self, signum):
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self):
+        """回收已退出的工作进程，返回 [(序号, 退出码)]"""
+        exited = []
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            index = self.pids.pop(pid, None)
+            if index is not None:
+                exited.append((index, os.waitstatus_to_exitcode(status)))
+        return exited
+
+    def serve(self, report_after=1.0):
+        """监督工作进程直到收到停止信号，返回停止报告"""
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self._signal_workers(signal.SIGHUP))
+
+        started = time.monotonic()
+        reported = False
+        while not self._stopping.wait(0.2):
+            for index, code in self._reap():
+                logger.error(f"工作进程#{index} 退出（退出码 {code}），重新派生")
+                self.respawned += 1
+                self._spawn(index)
+            if not reported and time.monotonic() - started >= report_after:
+                reported = True
+                print_memory_report(self.memory_report())
+
+        memory = self.memory_report()
+        return {"memory": memory, "exit_codes": self.stop()}
+
+    def stop(self):
+        """通知工作进程排空退出，超过排空和刷新时限后强制结束，返回各工作进程的退出码"""
+        exit_codes = {}
+        self._signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + SHUTDOWN.drain_timeout + SHUTDOWN.flush_timeout + 1
+        while self.pids and time.monotonic() < deadline:
+            exit_codes.update(self._reap())
+            time.sleep(0.05)
+        if self.pids:
+            logger.warning(f"{len(self.pids)}个工作进程未按时退出，强制结束")
+            self._signal_workers(signal.SIGKILL)
+            while self.pids:
+                exit_codes.update(self._reap())
+                time.sleep(0.01)
+        self.socket.close()
+        return exit_codes
+
+    def memory_report(self):
+        """主进程和各工作进程的内存：常驻、共享、独占（USS）和按比例分摊（PSS），单位字节"""
+        try:
+            import psutil
+        except ImportError:
+            return []
+        rows = []
+        for label, pid in [('主进程', os.getpid())] + [(f'工作进程#{index}', pid)
+                                                      for pid, index in sorted(self.pids.items(),
+                                                                               key=lambda item: item[1])]:
+            try:
+                memory = psutil.Process(pid).memory_full_info()
+            except (psutil.Error, AttributeError):
+                continue
+            rows.append({"name": label, "pid": pid, "rss_bytes": memory.rss, "uss_bytes": memory.uss,
+                         "shared_bytes": memory.rss - memory.uss, "pss_bytes": getattr(memory, 'pss', None)})
+        return rows
+
+def print_memory_report(rows):
+    """打印预派生工作进程的内存报告"""
+    if not rows:
+        return
+    import click
+    fmt = MetricSample.format_mb
+    click.echo(f"\n{Fore.CYAN}工作进程内存（共享 / 独占 / PSS）{Style.RESET_ALL}")
+    for row in rows:
+        pss = fmt(row['pss_bytes']) if row['pss_bytes'] is not None else 'N/A'
+        click.echo(f"{Fore.BLUE}▸ {row['name']} ({row['pid']}): {fmt(row['shared_bytes'])} / "
+                   f"{fmt(row['uss_bytes'])} / {pss}{Style.RESET_ALL}")
+    workers = [row for row in rows if row['name'] != '主进程']
+    if workers and all(row['pss_bytes'] is not None for row in rows):
+        total_pss = sum(row['pss_bytes'] for row in rows)
+        total_rss = sum(row['rss_bytes'] for row in rows)
+        private = sum(row['uss_bytes'] for row in workers) / len(workers)
+        click.echo(f"{Fore.BLUE}▸ 实际占用(PSS合计): {fmt(total_pss)}，各进程RSS合计: {fmt(total_rss)}；"
+                   f"每增加一个工作进程约增加 {fmt(private)}{Style.RESET_ALL}\n")
+
+def main():
+    """命令行入口"""
     import argparse
     
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description='OASB GreetAPI 服务')
-    parser.add_argument('--host', default='0.0.0.0', help='服务监听地址 (默认: 0.0.0.0，允许所有设备访问)')
-    parser.add_argument('--port', type=int, default=5000, help='服务端口 (默认: 5000)')
-    parser.add_argument('--debug', action='store_true', help='启用调试模式')
+    parser.add_argument('--config', help='配置文件路径 (config.json格式，命令行参数优先)')
+    parser.add_argument('--host', default=None, help='服务监听地址 (默认: 0.0.0.0，允许所有设备访问)')
+    parser.add_argument('--port', type=int, default=None, help='服务端口 (默认: 5000)')
+    parser.add_argument('--debug', action='store_true', help='启用调试模式（同时启用自动重载）')
     parser.add_argument('--keep-stats', action='store_true', help='保留上次运行的统计信息')
+    parser.add_argument('--warm-cache', action='store_true', help='启动时载入上次保存的问候缓存快照，停止时保存')
+    parser.add_argument('--import-time', action='store_true', help='打印启动各阶段耗时后退出')
+    parser.add_argument('--keep-alive-timeout', type=float, default=None, help='长连接空闲超时秒数 (默认: 5)')
+    parser.add_argument('--max-keepalive-requests', type=int, default=None,
+                        help='单个长连接最多处理的请求数，0表示关闭长连接 (默认: 100)')
+    parser.add_argument('--drain-timeout', type=float, default=None,
+                        help='停止时等待进行中请求完成的最长秒数 (默认: 10)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='预派生的工作进程数，大于1时共享监听端口 (默认: 1，不支持fork的平台忽略)')
+    parser.add_argument('--no-preload', action='store_true', help='预派生时不预加载和冻结只读数据（用于对比内存占用）')
     
     # 解析命令行参数
     args = parser.parse_args()
+    config = load_config_file(args.config) if args.config else {}
+    server = config.get('server', {})
+    host = args.host or server.get('host', '0.0.0.0')
+    port = args.port or server.get('port', 5000)
+    debug = args.debug or server.get('debug', False)
+    keep_stats = args.keep_stats or server.get('keep_stats', False)
+    warm_cache = args.warm_cache or config.get('cache', {}).get('warm_start', False)
+    keep_alive_timeout = args.keep_alive_timeout
+    if keep_alive_timeout is None:
+        keep_alive_timeout = server.get('keep_alive_timeout', 5)
+    max_keepalive_requests = args.max_keepalive_requests
+    if max_keepalive_requests is None:
+        max_keepalive_requests = server.get('max_keepalive_requests', 100)
+    if args.drain_timeout is not None:
+        SHUTDOWN.drain_timeout = args.drain_timeout
+    elif 'drain_timeout' in server:
+        SHUTDOWN.drain_timeout = server['drain_timeout']
+    if 'flush_timeout' in server:
+        SHUTDOWN.flush_timeout = server['flush_timeout']
+    workers = args.workers or server.get('workers', 1)
+    use_preload = not args.no_preload and server.get('preload', True)
+    if workers > 1 and (debug or not hasattr(os, 'fork')):
+        logger.warning("调试模式或不支持fork的平台不使用预派生工作进程")
+        workers = 1
+
+    if args.import_time:
+        print_startup_report(config)
+        return
+
+    import click
+    init_terminal()
     
     # 注册信号处理器
     signal.signal(signal.SIGINT, handle_exit)
+    signal.signal(signal.SIGTERM, handle_exit)
+    if hasattr(signal, 'SIGHUP'):
+        # 收到SIGHUP时热替换内容目录
+        signal.signal(signal.SIGHUP, lambda signum, frame: CONTENT.reload())
     
     try:
         # 清理旧的统计文件（除非指定保留）
-        if not args.keep_stats and not os.environ.get('WERKZEUG_RUN_MAIN'):
+        if not keep_stats and not os.environ.get('WERKZEUG_RUN_MAIN'):
             cleanup_stats_file()
+
+        app = create_app(config)
+        request_handler = make_request_handler(keep_alive_timeout, max_keepalive_requests)
+        if workers > 1:
+            # 在任何子系统创建后台线程之前派生工作进程，横幅在派生之后显示
+            prefork = PreforkServer(app, host, port, workers, request_handler, use_preload, warm_cache)
+            prefork.start()
+            print_banner(host='localhost', port=port, is_debug=False)
+            click.echo(f"{Fore.GREEN}👥 {workers}个工作进程共享端口 {port}，"
+                       f"冻结对象 {prefork.frozen}个{Style.RESET_ALL}")
+            report = prefork.serve()
+            print_memory_report(report["memory"])
+            failed = {index: code for index, code in report["exit_codes"].items() if code != 0}
+            if failed:
+                click.echo(f"{Fore.RED}异常退出的工作进程: {failed}{Style.RESET_ALL}")
+            print_stop_banner(datetime.now())
+            return
+        # 在接受请求之前预热缓存；调试模式下只在实际服务请求的子进程中预热
+        if warm_cache and (not debug or os.environ.get('WERKZEUG_RUN_MAIN')):
+            GREETING_CACHE_SNAPSHOT.enable(app)
         
         # 获取本机IP地址
         import socket
@@ -986,24 +4807,36 @@ if __name__ == '__main__':
         # 只在主进程中显示横幅
         if not os.environ.get('WERKZEUG_RUN_MAIN'):
             # 显示本地访问地址
-            print_banner(host='localhost', port=args.port, is_debug=args.debug)
+            print_banner(host='localhost', port=port, is_debug=debug)
             # 开发环境显示网络访问地址
-            if args.debug and args.host == '0.0.0.0':
-                click.echo(f"\n{Fore.GREEN}📡 本地网络访问地址: {Fore.WHITE}http://{local_ip}:{args.port}{Style.RESET_ALL}")
+            if debug and host == '0.0.0.0':
+                click.echo(f"\n{Fore.GREEN}📡 本地网络访问地址: {Fore.WHITE}http://{local_ip}:{port}{Style.RESET_ALL}")
                 click.echo(f"{Fore.YELLOW}开发提示: 仅限内网测试使用{Style.RESET_ALL}\n")
             # 生产环境提示
-            elif args.host == '0.0.0.0':
+            elif host == '0.0.0.0':
                 click.echo(f"\n{Fore.GREEN}🌐 服务已启动，请通过配置的域名或公网IP访问{Style.RESET_ALL}")
                 click.echo(f"{Fore.YELLOW}生产提示: 请确保已配置防火墙和安全组规则{Style.RESET_ALL}\n")
         
-        # 启动应用
-        app.run(
-            host=args.host,
-            port=args.port,
-            debug=args.debug,
-            use_reloader=True
-        )
+        if debug:
+            # 调试模式使用自动重载，停止流程在信号处理函数中执行
+            app.run(
+                host=host,
+                port=port,
+                debug=debug,
+                use_reloader=True,
+                threaded=True,
+                request_handler=request_handler
+            )
+            return
+
+        # 由 ShutdownCoordinator 托管服务器，收到信号后排空请求、刷新数据再打印停止横幅
+        http_server = make_server(host, port, app, threaded=True, request_handler=request_handler)
+        report = SHUTDOWN.serve(http_server)
+        print_stop_banner(datetime.now(), report=report)
     except Exception as e:
         print_stop_banner(datetime.now(), is_error=True)
         logger.error(f"启动服务时发生错误: {str(e)}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+访问日志查看工具
+
+读取服务写入的结构化访问日志（JSONL，每行一个请求）：
+1. tail: 查看最近的请求，可持续跟踪新请求
+2. filter: 按状态码、方法、路径、延迟、时间、缓存命中筛选
+3. stats: 按路径、状态码或方法汇总请求数、延迟百分位、流量和缓存命中率
+
+筛选条件先在原始字节上做子串预判，不匹配的行不解析JSON。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from percentiles import percentile
+
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'access.log')
+
+def log_files(path: str, include_rotated: bool) -> List[str]:
+    """按时间从旧到新排列的日志文件，包含轮转文件 access.log.N … access.log.1"""
+    files = []
+    if include_rotated:
+        rotated = []
+        directory = os.path.dirname(path) or '.'
+        prefix = os.path.basename(path) + '.'
+        for name in os.listdir(directory):
+            suffix = name[len(prefix):]
+            if name.startswith(prefix) and suffix.isdigit():
+                rotated.append((int(suffix), os.path.join(directory, name)))
+        files.extend(file for _, file in sorted(rotated, reverse=True))
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+def read_lines(files: Iterable[str]) -> Iterator[bytes]:
+    for file in files:
+        with open(file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield line
+
+def build_filter(args) -> Callable[[bytes], Optional[Dict[str, Any]]]:
+    """根据命令行参数构造筛选函数，返回匹配的记录或None"""
+    raw_checks = []
+    checks = []
+
+    if args.status:
+        status = args.status
+        if status.endswith('xx'):
+            raw_checks.append(f'"status":{status[0]}'.encode())
+            checks.append(lambda r: str(r['status']).startswith(status[0]))
+        else:
+            raw_checks.append(f'"status":{int(status)}'.encode())
+            checks.append(lambda r: r['status'] == int(status))
+    if args.method:
+        method = args.method.upper()
+        raw_checks.append(f'"method":"{method}"'.encode())
+        checks.append(lambda r: r['method'] == method)
+    if args.path:
+        raw_checks.append(json.dumps(args.path, ensure_ascii=False)[:-1].encode('utf-8'))
+        checks.append(lambda r: r['path'].startswith(args.path))
+    if args.min_ms is not None:
+        checks.append(lambda r: r['ms'] >= args.min_ms)
+    if args.since:
+        since = args.since
+        checks.append(lambda r: r['ts'] >= since)
+    if args.cache:
+        expected = args.cache == 'hit'
+        checks.append(lambda r: bool(r.get('cache')) == expected)
+
+    def match(line: bytes) -> Optional[Dict[str, Any]]:
+        for needle in raw_checks:
+            if needle not in line:
+                return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        for check in checks:
+            if not check(record):
+                return None
+        return record
+
+    return match
+
+def parse_since(value: str) -> float:
+    """解析 --since：数字加单位（30s、15m、2h、1d）或ISO时间"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if value[-1:] in units and value[:-1].replace('.', '', 1).isdigit():
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的时间: {value}，应为 30s、15m、2h、1d 或ISO时间")
+
+def parse_status(value: str) -> str:
+    """解析 --status：三位状态码（如 404）或状态类（如 5xx）"""
+    status = value.strip().lower()
+    if len(status) == 3 and status[0] in '12345' and (status[1:] == 'xx' or
+                                                       all(c in '0123456789' for c in status[1:])):
+        return status
+    raise argparse.ArgumentTypeError(f"无效的状态码: {value}，应为如 404 或 5xx")
+
+def format_record(record: Dict[str, Any]) -> str:
+    """单行可读格式"""
+    cache = {True: 'HIT', False: 'MISS'}.get(record.get('cache'), '-')
+    timestamp = datetime.fromtimestamp(record['ts']).strftime('%Y-%m-%d %H:%M:%S')
+    return (f"{timestamp} {record['method']:<6} {record['status']} {record['ms']:>8.2f}ms "
+            f"{record['bytes']:>7}B {cache:<4} {record['path']}")
+
+def emit(record: Dict[str, Any], as_json: bool):
+    print(json.dumps(record, ensure_ascii=False) if as_json else format_record(record))
+
+def command_tail(args):
+    match = build_filter(args)
+    recent = deque(maxlen=args.lines)
+    for line in read_lines(log_files(args.file, args.all)):
+        record = match(line)
+        if record is not None:
+            recent.append(record)
+    for record in recent:
+        emit(record, args.json)
+    if not args.follow:
+        return
+
+    # 持续跟踪：从文件末尾读取新行，轮转后重新打开
+    handle = open(args.file, 'rb')
+    handle.seek(0, os.SEEK_END)
+    inode = os.fstat(handle.fileno()).st_ino
+    try:
+        while True:
+            line = handle.readline()
+            if line:
+                record = match(line) if line.endswith(b'\n') else None
+                if record is not None:
+                    emit(record, args.json)
+                    sys.stdout.flush()
+                continue
+            time.sleep(0.2)
+            try:
+                if os.stat(args.file).st_ino != inode:
+                    handle.close()
+                    handle = open(args.file, 'rb')
+                    inode = os.fstat(handle.fileno()).st_ino
+            except FileNotFoundError:
+                pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        handle.close()
+
+def command_filter(args):
+    match = build_filter(args)
+    count = 0
+    for line in read_lines(log_files(args.file, args.all)):
+        record = match(line)
+        if record is not None:
+            emit(record, args.json)
+            count += 1
+            if args.limit and count >= args.limit:
+                break
+
+def command_stats(args):
+    match = build_filter(args)
+    groups: Dict[str, Dict[str, Any]] = {}
+    for line in read_lines(log_files(args.file, args.all)):
+        record = match(line)
+        if record is None:
+            continue
+        key = str(record[args.by])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'count': 0, 'bytes': 0, 'errors': 0, 'cache_hits': 0,
+                                   'cacheable': 0, 'latencies': []}
+        group['count'] += 1
+        group['bytes'] += record['bytes']
+        group['latencies'].append(record['ms'])
+        if record['status'] >= 500:
+            group['errors'] += 1
+        if record.get('cache') is not None:
+            group['cacheable'] += 1
+            group['cache_hits'] += bool(record['cache'])
+
+    rows = []
+    for key, group in groups.items():
+        latencies = sorted(group['latencies'])
+        rows.append({
+            args.by: key,
+            'count': group['count'],
+            'errors': group['errors'],
+            'bytes': group['bytes'],
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1],
+            'cache_hit_rate': round(group['cache_hits'] / group['cacheable'], 4) if group['cacheable'] else None
+        })
+    rows.sort(key=lambda row: row['count'], reverse=True)
+    rows = rows[:args.top]
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+    print(f"{args.by:<32} {'请求':>8} {'5xx':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'流量':>10} {'缓存命中':>8}")
+    for row in rows:
+        hit_rate = '-' if row['cache_hit_rate'] is None else f"{row['cache_hit_rate']:.1%}"
+        print(f"{row[args.by][:32]:<32} {row['count']:>8} {row['errors']:>6} {row['p50_ms']:>7.2f}ms "
+              f"{row['p95_ms']:>7.2f}ms {row['p99_ms']:>7.2f}ms {row['bytes'] / 1024:>8.1f}KB {hit_rate:>8}")
+
+def main():
+    # 公共参数放在每个子命令中，可以写在子命令之后
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--file', '-f', default=DEFAULT_LOG, help="访问日志路径")
+    common.add_argument('--all', '-a', action='store_true', help="同时读取轮转后的旧日志")
+    common.add_argument('--json', action='store_true', help="以JSON输出")
+    common.add_argument('--status', type=parse_status, help="状态码，如 404 或 5xx")
+    common.add_argument('--method', help="请求方法")
+    common.add_argument('--path', help="路径前缀")
+    common.add_argument('--min-ms', type=float, help="最小延迟（毫秒）")
+    common.add_argument('--since', type=parse_since, help="起始时间：30s、15m、2h、1d 或ISO时间")
+    common.add_argument('--cache', choices=['hit', 'miss'], help="缓存命中情况")
+
+    parser = argparse.ArgumentParser(description="访问日志查看工具")
+    subparsers = parser.add_subparsers(dest='command')
+
+    tail = subparsers.add_parser('tail', parents=[common], help="查看最近的请求")
+    tail.add_argument('-n', '--lines', type=int, default=20, help="显示的条数")
+    tail.add_argument('--follow', action='store_true', help="持续跟踪新请求")
+    tail.set_defaults(handler=command_tail)
+
+    filter_parser = subparsers.add_parser('filter', parents=[common], help="筛选请求")
+    filter_parser.add_argument('--limit', type=int, help="最多输出的条数")
+    filter_parser.set_defaults(handler=command_filter)
+
+    stats = subparsers.add_parser('stats', parents=[common], help="汇总统计")
+    stats.add_argument('--by', choices=['path', 'status', 'method'], default='path', help="分组字段")
+    stats.add_argument('--top', type=int, default=20, help="显示的分组数")
+    stats.set_defaults(handler=command_stats)
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return
+    args.handler(args)
+
+if __name__ == '__main__':
+    main()
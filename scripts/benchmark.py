@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+连接效率基准测试
+
+在本进程内启动服务（统计、日志和监控数据写入临时工作目录），分别用以下两种方式发送大量短请求，对比吞吐量和延迟：
+1. keep-alive: 每个客户端线程复用一个HTTP/1.1长连接
+2. close: 每个请求新建一个TCP连接（服务端关闭长连接）
+
+也可以用 --url 对已经运行的服务测试，只比较客户端侧的两种连接方式。
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+from typing import List, Tuple
+
+from harness import ROOT, load_app
+from percentiles import percentile
+
+def run_client(host: str, port: int, path: str, count: int, reuse: bool,
+               latencies: List[float], failures: List[int]):
+    """单个客户端线程：发送count个请求"""
+    conn = None
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(host, port, timeout=10)
+            conn.request('GET', path, headers={} if reuse else {'Connection': 'close'})
+            response = conn.getresponse()
+            response.read()
+            if not reuse or response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            failures.append(1)
+            if conn is not None:
+                conn.close()
+            conn = None
+            continue
+        latencies.append(time.perf_counter() - started)
+    if conn is not None:
+        conn.close()
+
+def run_load(host: str, port: int, path: str, total: int, concurrency: int, reuse: bool) -> Tuple[float, List[float], int]:
+    """并发发送total个请求，返回 (耗时, 延迟列表, 失败数)"""
+    latencies: List[float] = []
+    failures: List[int] = []
+    per_thread = max(1, total // concurrency)
+    threads = [
+        threading.Thread(target=run_client, args=(host, port, path, per_thread, reuse, latencies, failures))
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, len(failures)
+
+def start_local_server(service, app, keep_alive: bool):
+    """在后台线程启动服务，返回 (server, 端口)"""
+    from werkzeug.serving import make_server
+
+    handler = service.make_request_handler(max_keepalive_requests=1000 if keep_alive else 0)
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_port
+
+def print_result(mode: str, elapsed: float, latencies: List[float], failures: int):
+    """打印一行测试结果"""
+    rps = len(latencies) / elapsed if elapsed else 0.0
+    print(f"{mode:<12}{len(latencies):>10}{failures:>8}{rps:>12.1f}"
+          f"{percentile(latencies, 50) * 1000:>12.2f}{percentile(latencies, 99) * 1000:>12.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="连接效率基准测试")
+    parser.add_argument('--requests', '-n', type=int, default=2000, help="每种模式的请求总数")
+    parser.add_argument('--concurrency', '-c', type=int, default=4, help="并发客户端数")
+    parser.add_argument('--path', default='/api/greeting?name=bench', help="请求路径")
+    parser.add_argument('--url', help="对已运行的服务测试，例如 http://127.0.0.1:5000")
+    args = parser.parse_args()
+
+    workdir = None
+    if not args.url:
+        # 与压力测试和容量规划相同，服务的统计、日志和监控数据写入临时目录
+        workdir = tempfile.mkdtemp(prefix='benchmark-')
+        service, app = load_app(workdir)
+
+    print(f"{'模式':<10}{'成功':>8}{'失败':>6}{'请求/秒':>9}{'p50(ms)':>12}{'p99(ms)':>12}")
+    try:
+        for mode, keep_alive in (('keep-alive', True), ('close', False)):
+            server = None
+            if args.url:
+                parts = urlsplit(args.url)
+                host, port = parts.hostname, parts.port or 80
+            else:
+                server, port = start_local_server(service, app, keep_alive)
+                host = '127.0.0.1'
+            try:
+                # 预热，避免首次请求的初始化开销计入结果
+                run_load(host, port, args.path, args.concurrency, args.concurrency, keep_alive)
+                elapsed, latencies, failures = run_load(
+                    host, port, args.path, args.requests, args.concurrency, keep_alive)
+                print_result(mode, elapsed, latencies, failures)
+            finally:
+                if server is not None:
+                    server.shutdown()
+                    server.server_close()
+    finally:
+        if workdir is not None:
+            service.SHUTDOWN.flush()
+            os.chdir(ROOT)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
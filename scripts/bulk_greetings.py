@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+离线批量问候生成工具
+
+不启动服务，直接调用 main.generate_greetings 批量生成问候，输出JSONL（每行一条）。
+每一行与 /api/greeting 的响应体逐字节相同（相同的键顺序、转义和紧凑格式），
+可直接用于导出任务、数据集和下游系统的联调。
+
+1. 按批生成：每个字段的内容按列整批抽取，再逐条组装和编码
+2. 多进程：批次分发到进程池，按批次顺序写出，输出与进程数无关
+3. 可复现：第k批使用由 (种子, k) 派生的随机数生成器，配合 --timestamp 输出完全确定
+4. 流式写出：最多同时有 2×进程数 个批次在途，编码后的批次经过缓冲写入文件，内存占用与总条数无关
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 工作进程内的状态，由 init_worker 设置
+_service = None
+_encode = None
+_options = None
+
+def init_worker(options: dict):
+    """导入服务模块并准备与在线接口相同的JSON编码器"""
+    global _service, _encode, _options
+    sys.path.insert(0, ROOT)
+    import main
+    from flask import Flask
+
+    if options['config']:
+        main.configure_subsystems(main.load_config_file(options['config']))
+    # 只用于获取应用的JSON编码设置，不注册路由也不初始化日志
+    app = Flask(main.__name__)
+    app.config.update(main.DEFAULT_APP_CONFIG)
+    provider = app.json
+    # 与 jsonify 在非调试模式下的输出一致：紧凑分隔符并以换行结尾
+    _encode = lambda data: (provider.dumps(data, separators=(',', ':')) + '\n').encode('utf-8')
+    _service = main
+    _options = options
+
+def generate_batch(task: Tuple[int, int, int]) -> Tuple[int, bytes, int]:
+    """生成一批问候
+    Args:
+        task: (批次序号, 起始行号, 条数)
+    Returns:
+        (条数, 编码后的JSONL, 状态码为400的条数)
+    """
+    index, start, count = task
+    options = _options
+    rng = random.Random(f"{options['seed']}:{index}")
+    names = options['names']
+    # 名字列表按全局行号轮转，与批次划分无关
+    offset = start % len(names)
+    names = names[offset:] + names[:offset]
+
+    catalog = _service.CONTENT.current
+    # 与 lang 参数相同的语言协商：完整标签、别名、主语言子标签
+    locale = catalog.negotiate([options['locale']]) if options['locale'] else catalog.default_locale
+    profile = catalog.profile(locale)
+    if options['timestamp']:
+        now = datetime.fromisoformat(options['timestamp'])
+    else:
+        now = datetime.now(_service.get_timezone(profile.timezone))
+
+    results = _service.generate_greetings(count, names, options['favorite'], locale, now, rng)
+    encode = _encode
+    body = b''.join([encode(data) for data, _ in results])
+    return count, body, sum(1 for _, status in results if status != 200)
+
+def run_batches(executor: ProcessPoolExecutor, tasks: Iterable[Tuple[int, int, int]],
+                window: int) -> Iterator[Tuple[int, bytes, int]]:
+    """按提交顺序返回各批结果，在途批次不超过window个"""
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(generate_batch, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def load_names(args) -> List[Optional[str]]:
+    """名字列表：--names 文件每行一个名字，--name 单个名字，都未指定时不带name参数"""
+    if args.names:
+        with open(args.names, 'r', encoding='utf-8') as f:
+            names = [line.rstrip('\r\n') for line in f]
+        names = [name for name in names if name.strip()]
+        if names:
+            return names
+    if args.name is not None:
+        return [args.name]
+    return [None]
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量生成问候（JSONL，与 /api/greeting 响应体相同）")
+    parser.add_argument('count', type=int, help="生成条数")
+    parser.add_argument('--output', '-o', default='-', help="输出文件，默认标准输出")
+    parser.add_argument('--processes', '-p', type=int, default=1, help="工作进程数，0 表示CPU核数")
+    parser.add_argument('--batch', '-b', type=int, default=10000, help="每批条数")
+    parser.add_argument('--seed', '-s', help="随机种子，默认随机生成并输出到标准错误")
+    parser.add_argument('--name', help="名字（相当于 name 参数）")
+    parser.add_argument('--names', help="名字文件，每行一个，按顺序轮转使用")
+    parser.add_argument('--favorite', default='', help="喜好（相当于 favorite 参数）")
+    parser.add_argument('--locale', help="语言（相当于 lang 参数），如 zh-CN、en，默认使用中文")
+    parser.add_argument('--timestamp', help="固定生成时间（ISO格式，该语言时区），用于完全可复现的输出")
+    parser.add_argument('--config', '-c', help="服务配置文件，使用其中的内容目录")
+    parser.add_argument('--buffer', type=int, default=1 << 20, help="写缓冲区大小（字节）")
+    args = parser.parse_args()
+
+    if args.count <= 0 or args.batch <= 0:
+        parser.error("count 和 --batch 必须为正数")
+    seed = args.seed if args.seed is not None else '%016x' % random.SystemRandom().getrandbits(64)
+    options = {
+        'seed': seed,
+        'names': load_names(args),
+        'favorite': args.favorite,
+        'locale': args.locale,
+        'timestamp': args.timestamp,
+        'config': args.config,
+    }
+    tasks = [(index, start, min(args.batch, args.count - start))
+             for index, start in enumerate(range(0, args.count, args.batch))]
+    processes = args.processes or os.cpu_count() or 1
+
+    print(f"种子: {seed}", file=sys.stderr)
+    started = time.perf_counter()
+    written = errors = 0
+    output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb', buffering=args.buffer)
+    try:
+        if processes == 1 or len(tasks) == 1:
+            init_worker(options)
+            batches = map(generate_batch, tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=min(processes, len(tasks)),
+                                           initializer=init_worker, initargs=(options,))
+            batches = run_batches(executor, tasks, 2 * processes)
+        try:
+            # 按批次顺序写出，输出与单进程相同
+            for count, body, invalid in batches:
+                output.write(body)
+                written += count
+                errors += invalid
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+    finally:
+        if output is sys.stdout.buffer:
+            output.flush()
+        else:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    rate = written / elapsed if elapsed else 0.0
+    print(json.dumps({'seed': seed, 'count': written, 'invalid_name': errors,
+                      'seconds': round(elapsed, 3), 'per_second': round(rate, 1)},
+                     ensure_ascii=False), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
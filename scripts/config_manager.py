@@ -7,23 +7,87 @@
 2. 检查配置值的合理性
 3. 提供配置文件生成向导
 4. 输出配置检查报告
+5. 批量并行验证目录或通配符匹配的配置文件，输出JSON/JUnit报告
+6. 容量规划：在独立进程中按配置启动服务并施加合成负载，报告吞吐量、延迟和每请求磁盘写入
 """
 
 import json
 import os
 import sys
+import copy
+import glob
+import shutil
+import logging
+import tempfile
+import hashlib
 import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from xml.etree import ElementTree
 from typing import Dict, Any, List, Tuple
 
+# 验证规则版本，规则变化时递增，使批量验证缓存失效
+RULES_VERSION = 3
+
 class ConfigValidator:
     """配置文件验证器"""
     
+    SECTIONS = ('server', 'logging', 'monitoring', 'security', 'cache', 'content', 'cluster')
+    
     def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        """清空验证结果，同一个验证器可以用于多个配置"""
         self.errors: List[str] = []
         self.warnings: List[str] = []
+        self.section_errors: Dict[str, int] = {}
+    
+    def check_number(self, label: str, value: Any, minimum: float = None, maximum: float = None,
+                     above: float = None, integer: bool = False) -> bool:
+        """检查数值的类型和范围
+        Args:
+            label: 错误消息中的字段名，如 server.workers
+            minimum/maximum: 允许的最小值和最大值（含）
+            above: 必须大于该值（不含）
+            integer: 是否必须为整数
+        """
+        # bool 是 int 的子类，true/false 不算数字
+        if isinstance(value, bool) or not isinstance(value, int if integer else (int, float)):
+            self.errors.append(f"{label} 必须是{'整数' if integer else '数字'}: {value!r}")
+            return False
+        if above is not None and value <= above:
+            self.errors.append(f"{label} 必须大于{above}: {value}")
+        elif minimum is not None and maximum is not None and not minimum <= value <= maximum:
+            self.errors.append(f"{label} 必须在{minimum}-{maximum}之间: {value}")
+        elif minimum is not None and value < minimum:
+            self.errors.append(f"{label} 不能小于{minimum}: {value}")
+        elif maximum is not None and value > maximum:
+            self.errors.append(f"{label} 不能大于{maximum}: {value}")
+        else:
+            return True
+        return False
+
+    def check_type(self, label: str, value: Any, expected: type, name: str) -> bool:
+        """检查字段类型，name 为错误消息中的类型名"""
+        if isinstance(value, expected):
+            return True
+        self.errors.append(f"{label} 必须是{name}: {value!r}")
+        return False
+
+    def validate(self, config: Dict[str, Any]) -> bool:
+        """验证所有部分，每个部分的错误数记录在 section_errors 中"""
+        self.reset()
+        for section in self.SECTIONS:
+            before = len(self.errors)
+            getattr(self, f'validate_{section}')(config)
+            self.section_errors[section] = len(self.errors) - before
+        return len(self.errors) == 0
     
     def validate_server(self, config: Dict[str, Any]) -> bool:
         """验证服务器配置"""
+        before = len(self.errors)
         server = config.get('server', {})
         
         # 检查必需字段
@@ -41,11 +105,28 @@ class ConfigValidator:
         # 检查debug模式
         if server.get('debug', False):
             self.warnings.append("警告: debug模式已启用，不建议在生产环境中使用")
+
+        # 长连接、优雅停止和预派生
+        if 'keep_alive_timeout' in server:
+            self.check_number('server.keep_alive_timeout', server['keep_alive_timeout'], above=0)
+        if 'max_keepalive_requests' in server:
+            self.check_number('server.max_keepalive_requests', server['max_keepalive_requests'],
+                              minimum=0, integer=True)
+        for key in ('drain_timeout', 'flush_timeout'):
+            if key in server:
+                self.check_number(f'server.{key}', server[key], minimum=0)
+        if 'workers' in server and self.check_number('server.workers', server['workers'], minimum=1, integer=True):
+            cpus = os.cpu_count() or 1
+            if server['workers'] > cpus * 4:
+                self.warnings.append(f"工作进程数({server['workers']})远多于CPU核数({cpus})")
+        if 'preload' in server:
+            self.check_type('server.preload', server['preload'], bool, '布尔值')
             
-        return len(self.errors) == 0
+        return len(self.errors) == before
     
     def validate_logging(self, config: Dict[str, Any]) -> bool:
         """验证日志配置"""
+        before = len(self.errors)
         logging = config.get('logging', {})
         
         # 验证日志级别
@@ -63,13 +144,30 @@ class ConfigValidator:
             
             # 检查大小格式
             size = file_config.get('max_size', '')
-            if not size.endswith(('KB', 'MB', 'GB')):
+            if not str(size).endswith(('KB', 'MB', 'GB')):
                 self.errors.append(f"无效的日志文件大小格式: {size}")
+
+        # 验证访问日志配置
+        access = logging.get('access', {})
+        if self.check_type('logging.access', access, dict, '对象'):
+            if 'enabled' in access:
+                self.check_type('logging.access.enabled', access['enabled'], bool, '布尔值')
+            if access.get('enabled', True) and 'path' in access and not access['path']:
+                self.errors.append("访问日志路径不能为空")
+            if 'sample_rate' in access:
+                self.check_number('logging.access.sample_rate', access['sample_rate'], minimum=0, maximum=1)
+            if 'max_size' in access and not str(access['max_size']).endswith(('KB', 'MB', 'GB')):
+                self.errors.append(f"无效的访问日志文件大小格式: {access['max_size']}")
+            if 'backup_count' in access:
+                self.check_number('logging.access.backup_count', access['backup_count'], minimum=0, integer=True)
+            if 'flush_interval' in access:
+                self.check_number('logging.access.flush_interval', access['flush_interval'], above=0)
                 
-        return len(self.errors) == 0
+        return len(self.errors) == before
     
     def validate_monitoring(self, config: Dict[str, Any]) -> bool:
         """验证监控配置"""
+        before = len(self.errors)
         monitoring = config.get('monitoring', {})
         
         # 验证时间间隔
@@ -88,11 +186,20 @@ class ConfigValidator:
         thresholds = monitoring.get('thresholds', {})
         if thresholds.get('cpu', 0) > 90:
             self.warnings.append("CPU使用率阈值过高，可能导致系统响应迟缓")
+
+        if 'history_size' in monitoring:
+            self.check_number('monitoring.history_size', monitoring['history_size'], minimum=1, integer=True)
+        if 'publish_interval' in monitoring:
+            self.check_number('monitoring.publish_interval', monitoring['publish_interval'], minimum=0)
+        if 'directory' in monitoring and self.check_type('monitoring.directory', monitoring['directory'], str, '字符串'):
+            if not monitoring['directory']:
+                self.errors.append("监控数据目录不能为空")
         
-        return len(self.errors) == 0
+        return len(self.errors) == before
     
     def validate_security(self, config: Dict[str, Any]) -> bool:
         """验证安全配置"""
+        before = len(self.errors)
         security = config.get('security', {})
         
         # 验证速率限制
@@ -111,7 +218,68 @@ class ConfigValidator:
         if not headers.get('content_type_options'):
             self.warnings.append("建议启用content-type-options")
             
-        return len(self.errors) == 0
+        return len(self.errors) == before
+
+    def validate_cache(self, config: Dict[str, Any]) -> bool:
+        """验证缓存配置"""
+        before = len(self.errors)
+        cache = config.get('cache', {})
+        if not self.check_type('cache', cache, dict, '对象'):
+            return False
+
+        for key in ('enabled', 'warm_start'):
+            if key in cache:
+                self.check_type(f'cache.{key}', cache[key], bool, '布尔值')
+        if 'type' in cache and cache['type'] != 'simple':
+            self.errors.append(f"不支持的缓存类型: {cache['type']}，目前只支持 simple")
+        if 'default_timeout' in cache:
+            self.check_number('cache.default_timeout', cache['default_timeout'], minimum=0)
+        if 'threshold' in cache:
+            self.check_number('cache.threshold', cache['threshold'], minimum=1, integer=True)
+        if 'snapshot_entries' in cache:
+            self.check_number('cache.snapshot_entries', cache['snapshot_entries'], minimum=0, integer=True)
+        if 'snapshot_interval' in cache:
+            self.check_number('cache.snapshot_interval', cache['snapshot_interval'], minimum=0)
+        if 'snapshot_path' in cache:
+            self.check_type('cache.snapshot_path', cache['snapshot_path'], str, '字符串')
+        if cache.get('warm_start') is True and cache.get('enabled', True) is False:
+            self.warnings.append("缓存已关闭，warm_start 不会生效")
+
+        return len(self.errors) == before
+
+    def validate_content(self, config: Dict[str, Any]) -> bool:
+        """验证内容配置"""
+        before = len(self.errors)
+        content = config.get('content', {})
+        if not self.check_type('content', content, dict, '对象'):
+            return False
+
+        if 'directory' in content and self.check_type('content.directory', content['directory'], str, '字符串'):
+            if not content['directory']:
+                self.errors.append("内容目录不能为空")
+
+        return len(self.errors) == before
+
+    def validate_cluster(self, config: Dict[str, Any]) -> bool:
+        """验证集群配置"""
+        before = len(self.errors)
+        cluster = config.get('cluster', {})
+        if not self.check_type('cluster', cluster, dict, '对象'):
+            return False
+
+        peers = cluster.get('peers', [])
+        if self.check_type('cluster.peers', peers, list, '数组'):
+            for peer in peers:
+                if not isinstance(peer, str) or not peer.startswith(('http://', 'https://')):
+                    self.errors.append(f"无效的节点地址: {peer!r}，应为 http:// 或 https:// 开头的URL")
+        if 'timeout' in cluster:
+            self.check_number('cluster.timeout', cluster['timeout'], above=0)
+        if 'ttl' in cluster:
+            self.check_number('cluster.ttl', cluster['ttl'], minimum=0)
+        if 'include_self' in cluster:
+            self.check_type('cluster.include_self', cluster['include_self'], bool, '布尔值')
+
+        return len(self.errors) == before
 
 def validate_config(config_path: str) -> Tuple[bool, List[str], List[str]]:
     """验证配置文件"""
@@ -124,15 +292,388 @@ def validate_config(config_path: str) -> Tuple[bool, List[str], List[str]]:
         return False, [f"读取配置文件失败: {str(e)}"], []
     
     validator = ConfigValidator()
-    
-    # 验证各个部分
-    validator.validate_server(config)
-    validator.validate_logging(config)
-    validator.validate_monitoring(config)
-    validator.validate_security(config)
+    validator.validate(config)
     
     return len(validator.errors) == 0, validator.errors, validator.warnings
 
+def validate_content(item: Tuple[str, bytes]) -> Dict[str, Any]:
+    """验证一个配置文件的内容，在工作进程中执行
+    Args:
+        item: (文件路径, 文件内容)
+    """
+    path, content = item
+    result = {'path': path, 'valid': False, 'errors': [], 'warnings': [], 'section_errors': {}}
+    try:
+        config = json.loads(content.decode('utf-8-sig'))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        result['errors'] = [f"配置文件JSON格式错误: {str(e)}"]
+        return result
+    if not isinstance(config, dict):
+        result['errors'] = ["配置文件顶层必须是JSON对象"]
+        return result
+    
+    validator = ConfigValidator()
+    try:
+        result['valid'] = validator.validate(config)
+    except Exception as e:
+        validator.errors.append(f"验证过程出错: {type(e).__name__}: {str(e)}")
+    result['errors'] = validator.errors
+    result['warnings'] = validator.warnings
+    result['section_errors'] = validator.section_errors
+    return result
+
+def expand_paths(patterns: List[str]) -> List[str]:
+    """把目录和通配符展开为配置文件列表，目录下取所有 *.json 文件"""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, '*.json')))
+        else:
+            paths.update(glob.glob(pattern, recursive=True))
+    return sorted(path for path in paths if os.path.isfile(path))
+
+def load_cache(cache_path: str) -> Dict[str, Any]:
+    """读取验证结果缓存，规则版本不一致时丢弃"""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('rules_version') == RULES_VERSION:
+            return cache.get('results', {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+def save_cache(cache_path: str, results: Dict[str, Any]):
+    """写入验证结果缓存"""
+    temp_file = f"{cache_path}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({'rules_version': RULES_VERSION, 'results': results}, f, ensure_ascii=False)
+    os.replace(temp_file, cache_path)
+
+def validate_batch(paths: List[str], jobs: int = None, cache_path: str = None) -> List[Dict[str, Any]]:
+    """并行验证多个配置文件
+    内容的sha256与缓存一致的文件直接使用缓存结果，其余文件分发到进程池
+    """
+    cache = load_cache(cache_path) if cache_path else {}
+    results = {}
+    pending = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            results[path] = {'path': path, 'valid': False, 'errors': [f"读取配置文件失败: {str(e)}"],
+                             'warnings': [], 'section_errors': {}, 'sha256': None, 'cached': False}
+            continue
+        digest = hashlib.sha256(content).hexdigest()
+        cached = cache.get(digest)
+        if cached is not None:
+            results[path] = dict(cached, path=path, sha256=digest, cached=True)
+        else:
+            pending.append((path, content, digest))
+    
+    jobs = jobs or os.cpu_count() or 1
+    items = [(path, content) for path, content, _ in pending]
+    if jobs > 1 and len(items) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(items))) as executor:
+            validated = list(executor.map(validate_content, items, chunksize=max(1, len(items) // (jobs * 4))))
+    else:
+        validated = [validate_content(item) for item in items]
+    
+    for (path, _, digest), result in zip(pending, validated):
+        result.update(sha256=digest, cached=False)
+        results[path] = result
+        cache[digest] = {key: result[key] for key in ('valid', 'errors', 'warnings', 'section_errors')}
+    
+    if cache_path and pending:
+        # 只保留本次仍存在的文件内容对应的结果，避免缓存无限增长
+        digests = {result['sha256'] for result in results.values()}
+        save_cache(cache_path, {digest: value for digest, value in cache.items() if digest in digests})
+    return [results[path] for path in paths]
+
+def build_report(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """汇总批量验证结果"""
+    section_errors = {}
+    for result in results:
+        for section, count in result['section_errors'].items():
+            section_errors[section] = section_errors.get(section, 0) + count
+    return {
+        'summary': {
+            'total': len(results),
+            'valid': sum(1 for result in results if result['valid']),
+            'invalid': sum(1 for result in results if not result['valid']),
+            'cached': sum(1 for result in results if result['cached']),
+            'warnings': sum(len(result['warnings']) for result in results),
+            'section_errors': section_errors,
+            'elapsed_seconds': round(elapsed, 3),
+            'generated_at': datetime.now().isoformat()
+        },
+        'results': results
+    }
+
+def write_junit(report: Dict[str, Any], path: str):
+    """以JUnit XML格式写入报告，每个配置文件为一个测试用例"""
+    summary = report['summary']
+    suite = ElementTree.Element('testsuite', {
+        'name': 'config-validation',
+        'tests': str(summary['total']),
+        'failures': str(summary['invalid']),
+        'errors': '0',
+        'time': str(summary['elapsed_seconds']),
+        'timestamp': summary['generated_at']
+    })
+    for result in report['results']:
+        case = ElementTree.SubElement(suite, 'testcase', {'classname': 'config', 'name': result['path']})
+        if not result['valid']:
+            failure = ElementTree.SubElement(case, 'failure', {'message': result['errors'][0] if result['errors'] else ''})
+            failure.text = '\n'.join(result['errors'])
+        if result['warnings']:
+            ElementTree.SubElement(case, 'system-out').text = '\n'.join(result['warnings'])
+    ElementTree.ElementTree(suite).write(path, encoding='utf-8', xml_declaration=True)
+
+def run_batch(args) -> int:
+    """批量验证入口，返回退出码"""
+    paths = expand_paths(args.batch)
+    if not paths:
+        print("\n❌ 没有找到匹配的配置文件")
+        return 1
+    
+    print(f"\n正在验证 {len(paths)} 个配置文件...")
+    started = datetime.now()
+    results = validate_batch(paths, args.jobs, None if args.no_cache else args.cache)
+    report = build_report(results, (datetime.now() - started).total_seconds())
+    
+    for result in results:
+        if not result['valid']:
+            print(f"\n❌ {result['path']}")
+            for error in result['errors']:
+                print(f"  • {error}")
+    
+    summary = report['summary']
+    print(f"\n通过: {summary['valid']}  失败: {summary['invalid']}  "
+          f"缓存命中: {summary['cached']}  耗时: {summary['elapsed_seconds']}秒")
+    
+    if args.report:
+        report_format = args.format or ('junit' if args.report.endswith('.xml') else 'json')
+        if report_format == 'junit':
+            write_junit(report, args.report)
+        else:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"报告已写入: {args.report}")
+    
+    return 0 if summary['invalid'] == 0 else 1
+
+# 容量规划
+PLAN_FLAG_RATIO = 1.2  # 调整某项配置后吞吐量提升超过该比例时，标记该配置为瓶颈
+# 影响统计写入的环境变量，规划时取自当前环境
+PLAN_ENV_KEYS = ('STATS_JOURNAL', 'STATS_JOURNAL_FSYNC', 'STATS_JOURNAL_INTERVAL_MS', 'STATS_CHECKPOINT_INTERVAL')
+
+def io_snapshot() -> Tuple[int, int]:
+    """本进程累计的写调用次数和写入字节数，平台不支持时返回None"""
+    try:
+        import psutil
+        counters = psutil.Process().io_counters()
+    except (ImportError, AttributeError, NotImplementedError):
+        return None
+    # Linux上write_chars统计所有write调用的字节数，不受页缓存延迟刷盘影响
+    return counters.write_count, getattr(counters, 'write_chars', counters.write_bytes)
+
+def run_load(app, duration: float, concurrency: int, names: int, status_ratio: float) -> Dict[str, Any]:
+    """多个线程各用一个测试客户端持续请求问候和 /status，直到duration秒后停止"""
+    # 负载工具只在规划模式中导入，验证和批量验证不依赖它们
+    from harness import LoadRunner
+    from percentiles import histogram_percentile
+
+    def pick(rng):
+        if rng.random() < status_ratio:
+            return 'status', 'GET', '/status'
+        return 'greeting', 'GET', f"/api/greeting?name=user{rng.randrange(names)}"
+
+    before = io_snapshot()
+    run = LoadRunner(app, pick, concurrency).run(duration)
+    after = io_snapshot()
+
+    latencies = run['latencies']
+    combined = sum(latencies.values(), Counter())
+    total = sum(run['tally'].values())
+    elapsed = run['elapsed']
+    result = {
+        'requests': total,
+        'failures': sum(count for (_, status), count in run['tally'].items() if status == 0 or status >= 500),
+        'rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': histogram_percentile(combined, 50, scale=10),
+        'p99_ms': histogram_percentile(combined, 99, scale=10),
+        'greeting_p99_ms': histogram_percentile(latencies.get('greeting', {}), 99, scale=10),
+        'status_p99_ms': histogram_percentile(latencies.get('status', {}), 99, scale=10),
+    }
+    if before and after and total:
+        result['writes_per_request'] = round((after[0] - before[0]) / total, 2)
+        result['bytes_written_per_request'] = round((after[1] - before[1]) / total, 1)
+    return result
+
+def measure_writes(app, path: str, count: int) -> Dict[str, float]:
+    """顺序发送count个请求，返回该端点每个请求引起的写调用次数和字节数"""
+    test_client = app.test_client()
+    before = io_snapshot()
+    for i in range(count):
+        test_client.get(path.format(i=i))
+    after = io_snapshot()
+    if not before or not after:
+        return {}
+    return {
+        'writes_per_request': round((after[0] - before[0]) / count, 2),
+        'bytes_written_per_request': round((after[1] - before[1]) / count, 1)
+    }
+
+def measure_config(task: Tuple[Dict[str, Any], Dict[str, str], str, Dict[str, Any], bool]) -> Dict[str, Any]:
+    """在独立进程中按配置创建服务并施加负载
+    每个配置都从全新的进程状态开始，缓存、统计、监控和内容目录不会被上一轮预热
+    """
+    from harness import load_app
+
+    config, env, workdir, load, probe = task
+    os.environ.update(env)
+    os.makedirs(workdir, exist_ok=True)
+    _, app = load_app(workdir, config)
+    result = run_load(app, load['duration'], load['concurrency'], load['names'], load['status_ratio'])
+    if probe:
+        result['endpoint_writes'] = {
+            '/api/greeting': measure_writes(app, '/api/greeting?name=probe{i}', 200),
+            '/status': measure_writes(app, '/status', 20)
+        }
+    return result
+
+def run_isolated(task) -> Dict[str, Any]:
+    """在一个新的子进程中执行一次测量，测量之间不重叠"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(measure_config, task).result()
+
+def plan_variants(config: Dict[str, Any], env: Dict[str, str],
+                  names: int) -> List[Tuple[str, str, Dict[str, Any], Dict[str, str]]]:
+    """候选配置中可能限制吞吐量的设置，以及放宽该设置后的对照配置
+    Args:
+        env: 当前环境中影响统计写入的环境变量
+    Returns:
+        (配置项, 建议, 对照配置, 对照环境变量) 列表
+    """
+    variants = []
+
+    def variant(setting, advice, changes=None, env_changes=None):
+        changed = copy.deepcopy(config)
+        for path, value in (changes or {}).items():
+            section = changed
+            *parents, key = path.split('.')
+            for parent in parents:
+                section = section.setdefault(parent, {})
+            section[key] = value
+        variants.append((setting, advice, changed, dict(env, **(env_changes or {}))))
+
+    cache = config.get('cache', {})
+    if not cache.get('enabled', True):
+        variant('cache.enabled', "启用响应缓存", {'cache.enabled': True})
+    elif 'threshold' in cache and cache['threshold'] < names:
+        variant('cache.threshold',
+                f"缓存条目上限({cache['threshold']})小于活跃名字数({names})，建议提高到至少{names * 2}",
+                {'cache.threshold': names * 2})
+
+    # 统计：逐请求重写统计文件、每次提交fsync、过于频繁的合并快照
+    if env.get('STATS_JOURNAL', '1') == '0':
+        variant('STATS_JOURNAL', "统计逐请求重写文件，建议启用预写日志（去掉 STATS_JOURNAL=0）",
+                env_changes={'STATS_JOURNAL': '1'})
+    else:
+        if env.get('STATS_JOURNAL_FSYNC') == '1':
+            variant('STATS_JOURNAL_FSYNC', "每次提交统计日志都fsync，建议关闭", env_changes={'STATS_JOURNAL_FSYNC': '0'})
+        if float(env.get('STATS_CHECKPOINT_INTERVAL', 30)) < 5:
+            variant('STATS_CHECKPOINT_INTERVAL', "合并统计快照过于频繁，建议使用默认的30秒",
+                    env_changes={'STATS_CHECKPOINT_INTERVAL': '30'})
+
+    # 监控和日志：每个请求一条访问日志、频繁发布工作进程指标
+    access = config.get('logging', {}).get('access', {})
+    if access.get('enabled', True) and access.get('sample_rate', 1.0) > 0.1:
+        variant('logging.access.sample_rate', "每个请求都写访问日志，高负载时建议按0.1抽样",
+                {'logging.access.sample_rate': 0.1})
+    publish_interval = config.get('monitoring', {}).get('publish_interval', 10)
+    if 0 < publish_interval < 1:
+        variant('monitoring.publish_interval', "工作进程指标发布过于频繁，建议使用默认的10秒",
+                {'monitoring.publish_interval': 10})
+    return variants
+
+def run_plan(args) -> int:
+    """容量规划入口，返回退出码"""
+    print(f"\n正在规划配置: {args.plan}")
+    success, errors, warnings = validate_config(args.plan)
+    if errors:
+        print("\n❌ 配置存在错误，规划结果仅供参考:")
+        for error in errors:
+            print(f"  • {error}")
+    with open(args.plan, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    env = {key: os.environ[key] for key in PLAN_ENV_KEYS if key in os.environ}
+    load = {'duration': args.duration, 'concurrency': args.concurrency, 'names': args.names,
+            'status_ratio': args.status_ratio}
+    variants = plan_variants(config, env, args.names)
+    print(f"负载: {args.duration}秒, {args.concurrency}个并发客户端, {args.names}个不同名字, "
+          f"/status占比{args.status_ratio:.0%}；对照配置 {len(variants)} 个")
+
+    # 每个配置在单独的子进程和工作目录中测量，结束后删除工作目录
+    workdir = tempfile.mkdtemp(prefix='config-plan-')
+    findings = []
+    try:
+        result = run_isolated((config, env, os.path.join(workdir, 'baseline'), load, True))
+        for index, (setting, advice, variant, variant_env) in enumerate(variants):
+            variant_result = run_isolated((variant, variant_env, os.path.join(workdir, f'variant-{index}'),
+                                           load, False))
+            ratio = variant_result['rps'] / result['rps'] if result['rps'] else 0.0
+            print(f"  对照 {setting}: {variant_result['rps']} 请求/秒 (x{ratio:.2f})")
+            if ratio >= PLAN_FLAG_RATIO:
+                findings.append({'setting': setting, 'advice': advice, 'rps_after': variant_result['rps'],
+                                 'speedup': round(ratio, 2)})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    status_writes = result['endpoint_writes']['/status'].get('bytes_written_per_request', 0)
+    if status_writes > 64 * 1024:
+        findings.append({'setting': 'monitoring.directory',
+                         'advice': f"每次 /status 重写当日监控文件({status_writes / 1024:.0f}KB)，"
+                                   "看板请改用 /status/stream 或降低轮询频率"})
+    greeting_writes = result['endpoint_writes']['/api/greeting'].get('writes_per_request', 0)
+    if greeting_writes >= 3:
+        findings.append({'setting': 'STATS_JOURNAL',
+                         'advice': f"每个问候请求产生{greeting_writes}次写调用，统计可能在逐请求重写文件，"
+                                   "请确认未设置 STATS_JOURNAL=0"})
+    if args.target_rps and result['rps'] < args.target_rps:
+        findings.append({'setting': 'server', 'advice': f"吞吐量{result['rps']}低于目标{args.target_rps}"})
+    if result['p99_ms'] > args.p99_target:
+        findings.append({'setting': 'server', 'advice': f"p99延迟{result['p99_ms']}ms超过目标{args.p99_target}ms"})
+    rate_limit = config.get('security', {}).get('rate_limit', {})
+    if rate_limit.get('enabled') and rate_limit.get('requests_per_minute', 0) < result['rps'] * 60 / args.concurrency:
+        findings.append({'setting': 'security.rate_limit.requests_per_minute',
+                         'advice': f"每分钟{rate_limit['requests_per_minute']}次的限制低于单个客户端的实测速率"})
+
+    print(f"\n吞吐量: {result['rps']} 请求/秒  (共{result['requests']}个请求, {result['failures']}个失败)")
+    print(f"延迟: p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms "
+          f"(问候 {result['greeting_p99_ms']}ms, 状态 {result['status_p99_ms']}ms)")
+    for path, writes in result['endpoint_writes'].items():
+        if writes:
+            print(f"磁盘写入 {path}: 每请求 {writes['writes_per_request']} 次, "
+                  f"{writes['bytes_written_per_request']} 字节")
+    if findings:
+        print("\n⚠️ 瓶颈配置:")
+        for finding in findings:
+            speedup = f" (调整后 {finding['rps_after']} 请求/秒, x{finding['speedup']})" if 'speedup' in finding else ''
+            print(f"  • {finding['setting']}: {finding['advice']}{speedup}")
+    else:
+        print("\n✅ 未发现限制吞吐量的配置")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'config': args.plan, 'result': result, 'findings': findings},
+                      f, indent=2, ensure_ascii=False)
+        print(f"报告已写入: {args.report}")
+    return 0 if success else 1
+
 def create_config_wizard() -> Dict[str, Any]:
     """配置文件生成向导"""
     config = {}
@@ -190,9 +731,28 @@ def main():
     parser = argparse.ArgumentParser(description="配置文件管理工具")
     parser.add_argument('--validate', '-v', help="验证指定的配置文件")
     parser.add_argument('--create', '-c', help="创建新的配置文件")
+    parser.add_argument('--batch', '-b', nargs='+', metavar='PATH', help="批量验证目录或通配符匹配的配置文件")
+    parser.add_argument('--jobs', '-j', type=int, help="批量验证的进程数，默认为CPU核数")
+    parser.add_argument('--report', '-r', help="批量验证报告输出路径")
+    parser.add_argument('--format', choices=['json', 'junit'], help="报告格式，默认按扩展名判断（.xml为junit）")
+    parser.add_argument('--cache', default='.config_validation_cache.json', help="批量验证结果缓存文件")
+    parser.add_argument('--no-cache', action='store_true', help="不使用批量验证缓存")
+    parser.add_argument('--plan', '-p', help="按配置在独立进程中施加负载，报告容量和瓶颈配置")
+    parser.add_argument('--duration', type=float, default=5.0, help="容量规划每轮负载时长（秒）")
+    parser.add_argument('--concurrency', type=int, default=4, help="容量规划的并发客户端数")
+    parser.add_argument('--names', type=int, default=1000, help="容量规划使用的不同名字数量")
+    parser.add_argument('--status-ratio', type=float, default=0.05, help="容量规划中 /status 请求的占比")
+    parser.add_argument('--target-rps', type=float, help="容量规划的目标吞吐量")
+    parser.add_argument('--p99-target', type=float, default=500.0, help="容量规划的p99延迟目标（毫秒）")
     args = parser.parse_args()
     
-    if args.validate:
+    if args.plan:
+        sys.exit(run_plan(args))
+    
+    elif args.batch:
+        sys.exit(run_batch(args))
+    
+    elif args.validate:
         print(f"\n正在验证配置文件: {args.validate}")
         success, errors, warnings = validate_config(args.validate)
         
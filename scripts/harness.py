@@ -0,0 +1,119 @@
+"""
+进程内负载工具
+
+容量规划（config_manager.py --plan）和并发压力测试（soak_test.py）共用：
+1. load_app：在独立的工作目录中按配置创建服务应用，统计、日志和监控数据都不写入仓库目录
+2. LoadRunner：多个线程各用一个测试客户端持续发送请求，按请求类型记录状态码和延迟
+"""
+
+import os
+import sys
+import copy
+import time
+import random
+import logging
+import tempfile
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_app(workdir: str, config: Optional[Dict[str, Any]] = None):
+    """在工作目录中按配置创建服务应用，不输出控制台日志
+    Returns:
+        (服务模块, 应用)
+    """
+    config = copy.deepcopy(config or {})
+    content = config.get('content', {})
+    if 'directory' in content:
+        content['directory'] = os.path.abspath(content['directory'])
+    config.setdefault('monitoring', {})['directory'] = os.path.join(workdir, 'monitoring')
+    os.chdir(workdir)
+    tempfile.tempdir = workdir
+    sys.path.insert(0, ROOT)
+    import main
+    app = main.create_app(config)
+    for name in ('app', 'werkzeug'):
+        logger = logging.getLogger(name)
+        for handler in list(logger.handlers):
+            if type(handler) is logging.StreamHandler:
+                logger.removeHandler(handler)
+    return main, app
+
+# 负载执行器
+class LoadRunner:
+    """多个线程各用一个测试客户端持续发送请求，直到指定时间后停止
+
+    pick(rng) 返回下一个请求的 (类型, 方法, 路径)。延迟按0.1毫秒分桶计数，
+    长时间运行时内存占用不随请求数增长。in_flight 是客户端侧进行中的请求数，可在运行中采样。
+    """
+
+    def __init__(self, app, pick: Callable[[random.Random], Tuple[str, str, str]],
+                 threads: int, seed: int = 0):
+        self.app = app
+        self.pick = pick
+        self.threads = threads
+        self.seed = seed
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def run(self, duration: float) -> Dict[str, Any]:
+        """运行duration秒
+        Returns:
+            tally: {(类型, 状态码): 请求数}，客户端异常的状态码为0
+            latencies: {类型: {延迟(0.1毫秒): 请求数}}
+            per_second: {Unix秒: 请求数}
+            failures: 前20个客户端异常
+            elapsed: 实际运行秒数
+        """
+        tally: Counter = Counter()
+        latencies: Dict[str, Counter] = {}
+        per_second: Counter = Counter()
+        failures: List[str] = []
+        deadline = time.perf_counter() + duration
+
+        def client(seed: int):
+            rng = random.Random(seed)
+            test_client = self.app.test_client()
+            local_tally: Counter = Counter()
+            local_latencies: Dict[str, Counter] = {}
+            local_seconds: Counter = Counter()
+            while time.perf_counter() < deadline:
+                kind, method, path = self.pick(rng)
+                with self._lock:
+                    self.in_flight += 1
+                started = time.perf_counter()
+                try:
+                    response = test_client.open(path, method=method)
+                    response.close()
+                    status = response.status_code
+                except Exception as e:
+                    status = 0
+                    if len(failures) < 20:
+                        failures.append(f"{method} {path}: {type(e).__name__}: {str(e)}")
+                finally:
+                    with self._lock:
+                        self.in_flight -= 1
+                local_latencies.setdefault(kind, Counter())[int((time.perf_counter() - started) * 10000)] += 1
+                local_seconds[int(time.time())] += 1
+                local_tally[(kind, status)] += 1
+            with self._lock:
+                tally.update(local_tally)
+                for kind, histogram in local_latencies.items():
+                    latencies.setdefault(kind, Counter()).update(histogram)
+                per_second.update(local_seconds)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=client, args=(self.seed + i,)) for i in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return {
+            'tally': tally,
+            'latencies': latencies,
+            'per_second': per_second,
+            'failures': failures,
+            'elapsed': time.perf_counter() - started
+        }
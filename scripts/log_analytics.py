@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+日志与监控数据离线分析工具
+
+增量读取服务写入的数据文件并汇总：
+1. 每小时的请求数、5xx数和错误率（logs/access.log*），各级别日志条数（logs/app.log）
+2. 出现次数最多的错误消息，按消息模板合并（logs/error.log）
+3. 每小时的CPU和内存使用百分位数（monitoring/monitoring-YYYY-MM-DD.json）
+
+- 日志逐行读取；监控文件逐条解码 records 数组中的对象，不整体载入
+- 每个文件是一个任务，多天的监控数据和轮转的日志在进程池中并行处理
+- 每个文件的读取偏移和部分汇总保存在状态文件中，再次运行时只处理新增的数据；
+  偏移之前的内容发生变化（文件被截断或重写）时该文件从头处理
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import codecs
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from percentiles import histogram_percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 状态文件格式版本，汇总结构变化时递增，使旧状态失效
+STATE_VERSION = 1
+
+# 偏移校验：偏移之前的若干字节的摘要
+CHECK_BYTES = 64
+
+# 与服务端 ErrorAggregator 相同的消息模板规则
+TEMPLATE_PATTERNS = [
+    (re.compile(r"'[^']*'|\"[^\"]*\""), '<str>'),
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<uuid>'),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<hex>'),
+    (re.compile(r'\d+(?:\.\d+)?'), '<num>'),
+]
+
+# [2024-01-15 14:30:22] [ERROR] [1234] 消息
+LOG_LINE = re.compile(r'^\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] \[([A-Z]+)\] (?:\[\d+\] )?(.*)$')
+
+# 监控文件中对象之间的空白和逗号
+SEPARATOR = re.compile(r'[\s,]*')
+
+def template(message: str) -> str:
+    for pattern, placeholder in TEMPLATE_PATTERNS:
+        message = pattern.sub(placeholder, message)
+    return message[:200]
+
+def discover(logs_dir: str, monitoring_dir: str) -> List[Tuple[str, str]]:
+    """要处理的 (路径, 类型) 列表"""
+    files = []
+    for kind, name in (('app', 'app.log'), ('error', 'error.log')):
+        path = os.path.join(logs_dir, name)
+        if os.path.exists(path):
+            files.append((path, kind))
+    for path in glob.glob(os.path.join(logs_dir, 'access.log*')):
+        suffix = path[len(os.path.join(logs_dir, 'access.log')):]
+        if suffix == '' or suffix[1:].isdigit():
+            files.append((path, 'access'))
+    for path in sorted(glob.glob(os.path.join(monitoring_dir, 'monitoring-*.json'))):
+        files.append((path, 'monitoring'))
+    return files
+
+def file_key(path: str, kind: str) -> str:
+    """状态中的文件标识
+    日志按设备号和inode标识，轮转改名（access.log -> access.log.1）后继续沿用偏移；
+    监控文件每次保存都整体替换，按路径标识
+    """
+    if kind == 'monitoring':
+        return os.path.abspath(path)
+    stat = os.stat(path)
+    return f"{stat.st_dev}:{stat.st_ino}"
+
+def read_check(f, offset: int) -> str:
+    if offset <= 0:
+        return ''
+    start = max(0, offset - CHECK_BYTES)
+    f.seek(start)
+    return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+# 部分汇总
+def new_partial() -> Dict[str, Any]:
+    return {'hours': {}, 'errors': {}}
+
+def hour_bucket(partial: Dict[str, Any], hour: str) -> Dict[str, Any]:
+    bucket = partial['hours'].get(hour)
+    if bucket is None:
+        bucket = partial['hours'][hour] = {'requests': 0, 'errors_5xx': 0, 'levels': {}, 'cpu': {}, 'memory': {}}
+    return bucket
+
+def add_counts(target: Dict[str, int], counts: Dict[str, int]):
+    for key, value in counts.items():
+        target[key] = target.get(key, 0) + value
+
+def merge_partial(target: Dict[str, Any], partial: Dict[str, Any]):
+    """把 partial 合并进 target"""
+    for hour, source in partial['hours'].items():
+        bucket = hour_bucket(target, hour)
+        bucket['requests'] += source['requests']
+        bucket['errors_5xx'] += source['errors_5xx']
+        for field in ('levels', 'cpu', 'memory'):
+            add_counts(bucket[field], source[field])
+    for key, source in partial['errors'].items():
+        error = target['errors'].get(key)
+        if error is None:
+            target['errors'][key] = dict(source)
+            continue
+        error['count'] += source['count']
+        error['first_seen'] = min(error['first_seen'], source['first_seen'])
+        if source['last_seen'] >= error['last_seen']:
+            error['last_seen'] = source['last_seen']
+            error['sample'] = source['sample']
+
+def parse_number(value: Any) -> Optional[float]:
+    """解析 "23.5%"、"496.5MB" 等格式化的指标，不可用时返回None"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).rstrip('%MBs/'))
+    except ValueError:
+        return None
+
+# 逐文件扫描，在工作进程中执行
+def iter_lines(f, offset: int) -> Iterator[Tuple[bytes, int]]:
+    """从offset开始逐行读取，产出 (行, 行结束处的偏移)；不完整的最后一行留到下次"""
+    f.seek(offset)
+    for line in f:
+        if not line.endswith(b'\n'):
+            return
+        offset += len(line)
+        yield line, offset
+
+def iter_records(f, offset: int, chunk_size: int = 1 << 20) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """逐条解码监控文件 records 数组中的对象，产出 (记录, 记录结束处的偏移)
+    offset为0时从数组开头读起；数组未写完时停在最后一个完整的对象之后
+    """
+    if offset == 0:
+        head = f.read(4096)
+        start = head.find(b'[')
+        if start < 0:
+            return
+        offset = start + 1
+    f.seek(offset)
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    index = 0
+    while True:
+        # offset 始终对应 buffer[index] 的字节位置；分隔符都是ASCII字符
+        skipped = SEPARATOR.match(buffer, index).end()
+        offset += skipped - index
+        index = skipped
+        if buffer.startswith(']', index):
+            return
+        if index < len(buffer):
+            try:
+                record, end = decoder.raw_decode(buffer, index)
+            except ValueError:
+                record = None
+            if record is not None:
+                offset += len(buffer[index:end].encode('utf-8'))
+                index = end
+                yield record, offset
+                continue
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        # 保留未解码完的部分
+        buffer = buffer[index:] + utf8.decode(chunk)
+        index = 0
+
+def scan_access(f, offset: int, partial: Dict[str, Any]) -> int:
+    for line, offset_after in iter_lines(f, offset):
+        offset = offset_after
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        bucket = hour_bucket(partial, time.strftime('%Y-%m-%d %H', time.localtime(record['ts'])))
+        bucket['requests'] += 1
+        if record['status'] >= 500:
+            bucket['errors_5xx'] += 1
+    return offset
+
+def scan_app(f, offset: int, partial: Dict[str, Any]) -> int:
+    for line, offset_after in iter_lines(f, offset):
+        offset = offset_after
+        match = LOG_LINE.match(line.decode('utf-8', 'replace').rstrip('\r\n'))
+        if match:
+            levels = hour_bucket(partial, match.group(1)[:13])['levels']
+            levels[match.group(2)] = levels.get(match.group(2), 0) + 1
+    return offset
+
+def scan_error(f, offset: int, partial: Dict[str, Any]) -> int:
+    for line, offset_after in iter_lines(f, offset):
+        offset = offset_after
+        match = LOG_LINE.match(line.decode('utf-8', 'replace').rstrip('\r\n'))
+        if not match:
+            continue
+        message = match.group(3)
+        seen = match.group(1)
+        key = template(message)
+        error = partial['errors'].get(key)
+        if error is None:
+            partial['errors'][key] = {'count': 1, 'first_seen': seen, 'last_seen': seen, 'sample': message[:500]}
+        else:
+            error['count'] += 1
+            error['last_seen'] = seen
+            error['sample'] = message[:500]
+    return offset
+
+def scan_monitoring(f, offset: int, partial: Dict[str, Any]) -> int:
+    for record, offset_after in iter_records(f, offset):
+        offset = offset_after
+        timestamp = record.get('timestamp', '')
+        if len(timestamp) < 13:
+            continue
+        bucket = hour_bucket(partial, timestamp[:13].replace('T', ' '))
+        metrics = record.get('metrics', {})
+        cpu = parse_number(metrics.get('cpu_usage'))
+        memory = parse_number(metrics.get('memory_usage'))
+        # CPU按0.1%、内存按1MB分桶计数，百分位数的误差不超过一个桶
+        if cpu is not None:
+            key = f"{cpu:.1f}"
+            bucket['cpu'][key] = bucket['cpu'].get(key, 0) + 1
+        if memory is not None:
+            key = str(int(round(memory)))
+            bucket['memory'][key] = bucket['memory'].get(key, 0) + 1
+    return offset
+
+SCANNERS = {
+    'access': scan_access,
+    'app': scan_app,
+    'error': scan_error,
+    'monitoring': scan_monitoring,
+}
+
+def scan(task: Tuple[str, str, int, str]) -> Dict[str, Any]:
+    """处理一个文件中偏移之后的新数据
+    偏移超出文件大小或偏移之前的内容与上次不同时从头处理，返回的 restart 为True
+    """
+    path, kind, offset, check = task
+    partial = new_partial()
+    restart = False
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if offset and (offset > size or read_check(f, offset) != check):
+            offset, restart = 0, True
+        start = offset
+        offset = SCANNERS[kind](f, offset, partial)
+        return {
+            'offset': offset,
+            'check': read_check(f, offset),
+            'bytes': offset - start,
+            'restart': restart,
+            'partial': partial
+        }
+
+# 状态
+def load_state(path: Optional[str]) -> Dict[str, Any]:
+    if path:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') == STATE_VERSION:
+                return state
+        except (OSError, ValueError):
+            pass
+    return {'version': STATE_VERSION, 'files': {}}
+
+def save_state(path: str, state: Dict[str, Any]):
+    temp_file = f"{path}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_file, path)
+
+def update(state: Dict[str, Any], files: List[Tuple[str, str]], jobs: int) -> Dict[str, int]:
+    """扫描所有文件的新数据并更新状态，返回处理统计
+    已不存在的文件（被删除、轮转超出保留数或过期清理）从状态中移除，汇总只反映磁盘上现有的数据
+    """
+    keys = []
+    tasks = []
+    for path, kind in files:
+        try:
+            key = file_key(path, kind)
+        except OSError:
+            continue
+        entry = state['files'].get(key) or {}
+        keys.append(key)
+        tasks.append((path, kind, entry.get('offset', 0), entry.get('check', '')))
+
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+            results = list(executor.map(scan, tasks))
+    else:
+        results = [scan(task) for task in tasks]
+
+    current = set(keys)
+    removed = [key for key in state['files'] if key not in current]
+    for key in removed:
+        del state['files'][key]
+
+    processed = {'files': len(tasks), 'restarted': 0, 'removed': len(removed), 'bytes': 0}
+    for key, (path, kind, _, _), result in zip(keys, tasks, results):
+        entry = state['files'].get(key)
+        if entry is None or result['restart']:
+            processed['restarted'] += entry is not None
+            entry = state['files'][key] = {'partial': new_partial()}
+        entry.update(path=path, kind=kind, offset=result['offset'], check=result['check'])
+        merge_partial(entry['partial'], result['partial'])
+        processed['bytes'] += result['bytes']
+    return processed
+
+# 汇总
+def summarize(state: Dict[str, Any], hours: int, top: int) -> Dict[str, Any]:
+    combined = new_partial()
+    for entry in state['files'].values():
+        merge_partial(combined, entry['partial'])
+
+    rows = []
+    for hour in sorted(combined['hours'])[-hours:] if hours else sorted(combined['hours']):
+        bucket = combined['hours'][hour]
+        levels = bucket['levels']
+        rows.append({
+            'hour': hour,
+            'requests': bucket['requests'],
+            'errors_5xx': bucket['errors_5xx'],
+            'error_rate': round(bucket['errors_5xx'] / bucket['requests'], 4) if bucket['requests'] else None,
+            'log_errors': levels.get('ERROR', 0) + levels.get('CRITICAL', 0),
+            'log_warnings': levels.get('WARNING', 0),
+            'cpu_p50': histogram_percentile(bucket['cpu'], 50, default=None),
+            'cpu_p95': histogram_percentile(bucket['cpu'], 95, default=None),
+            'cpu_max': histogram_percentile(bucket['cpu'], 100, default=None),
+            'memory_p50_mb': histogram_percentile(bucket['memory'], 50, default=None),
+            'memory_p95_mb': histogram_percentile(bucket['memory'], 95, default=None),
+            'memory_max_mb': histogram_percentile(bucket['memory'], 100, default=None),
+            'samples': sum(bucket['cpu'].values())
+        })
+
+    errors = sorted(combined['errors'].items(), key=lambda item: item[1]['count'], reverse=True)[:top]
+    return {
+        'hours': rows,
+        'top_errors': [dict(error, template=key) for key, error in errors]
+    }
+
+def format_value(value: Optional[float], suffix: str = '') -> str:
+    return '-' if value is None else f"{value:g}{suffix}"
+
+def print_summary(summary: Dict[str, Any]):
+    print("每小时概况")
+    print(f"{'小时':<14} {'请求':>8} {'5xx':>6} {'错误率':>7} {'ERROR':>6} {'WARN':>6} "
+          f"{'CPU p50':>8} {'CPU p95':>8} {'CPU max':>8} {'内存p50':>9} {'内存p95':>9} {'内存max':>9}")
+    for row in summary['hours']:
+        rate = '-' if row['error_rate'] is None else f"{row['error_rate']:.2%}"
+        print(f"{row['hour']:<14} {row['requests']:>8} {row['errors_5xx']:>6} {rate:>7} "
+              f"{row['log_errors']:>6} {row['log_warnings']:>6} "
+              f"{format_value(row['cpu_p50'], '%'):>8} {format_value(row['cpu_p95'], '%'):>8} "
+              f"{format_value(row['cpu_max'], '%'):>8} {format_value(row['memory_p50_mb'], 'MB'):>9} "
+              f"{format_value(row['memory_p95_mb'], 'MB'):>9} {format_value(row['memory_max_mb'], 'MB'):>9}")
+    if not summary['hours']:
+        print("  暂无数据")
+
+    print("\n最常见的错误")
+    for error in summary['top_errors']:
+        print(f"{error['count']:>8}  {error['last_seen']}  {error['template']}")
+    if not summary['top_errors']:
+        print("  暂无错误")
+
+def main():
+    parser = argparse.ArgumentParser(description="日志与监控数据离线分析工具")
+    parser.add_argument('--logs', default=os.path.join(ROOT, 'logs'), help="日志目录")
+    parser.add_argument('--monitoring', default=os.path.join(ROOT, 'monitoring'), help="监控数据目录")
+    parser.add_argument('--state', default=os.path.join(ROOT, '.log_analytics_state.json'),
+                        help="保存读取偏移和部分汇总的状态文件，默认在项目目录下")
+    parser.add_argument('--no-state', action='store_true', help="不读取也不保存状态，从头处理所有文件")
+    parser.add_argument('--reset', action='store_true', help="丢弃已有状态后从头处理")
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1, help="并行处理文件的进程数")
+    parser.add_argument('--hours', type=int, default=24, help="显示最近多少个小时，0表示全部")
+    parser.add_argument('--top', type=int, default=10, help="显示的错误数")
+    parser.add_argument('--json', action='store_true', help="以JSON输出")
+    args = parser.parse_args()
+
+    state_path = None if args.no_state else args.state
+    state = load_state(None if args.reset else state_path)
+    started = time.perf_counter()
+    processed = update(state, discover(args.logs, args.monitoring), args.jobs)
+    if state_path:
+        save_state(state_path, state)
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(state, args.hours, args.top)
+    if args.json:
+        summary['processed'] = dict(processed, seconds=round(elapsed, 3))
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+    print_summary(summary)
+    print(f"\n处理 {processed['files']} 个文件，新增 {processed['bytes'] / 1024:.1f}KB，"
+          f"从头处理 {processed['restarted']} 个，移除已删除的 {processed['removed']} 个，耗时 {elapsed:.2f}秒", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
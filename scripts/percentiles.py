@@ -0,0 +1,36 @@
+"""
+百分位数计算
+
+各工具脚本共用的最近秩法百分位数：
+1. percentile：原始数值列表
+2. histogram_percentile：按值分桶的计数（键可以是数字或JSON中的数字字符串）
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """计算百分位数（最近秩法），没有数据时返回0.0"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def histogram_percentile(histogram: Dict[Any, int], pct: float, scale: float = 1,
+                         default: Optional[float] = 0.0) -> Optional[float]:
+    """分桶计数的百分位数（最近秩法）
+    Args:
+        histogram: {桶的值: 计数}
+        scale: 桶的值除以scale得到结果，如按0.1毫秒分桶时为10
+        default: 没有数据时的返回值
+    """
+    total = sum(histogram.values())
+    if not total:
+        return default
+    rank = max(1, int(round(pct / 100.0 * total)))
+    seen = 0
+    for value, count in sorted((float(key), count) for key, count in histogram.items()):
+        seen += count
+        if seen >= rank:
+            return value / scale
+    return default
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+并发压力（soak）测试
+
+多个进程、每个进程多个线程在本进程内长时间驱动服务。所有进程共享同一个临时目录下的
+统计文件、预写日志和监控目录，与多工作进程部署时相同。结束后核对：
+1. 计数准确性：/status 报告的总请求数、方法、状态码和端点计数与客户端记录的真实值比较，报告丢失的更新
+2. 活跃连接数：运行中定期采样并与客户端侧进行中的请求数比较，结束后应回到0
+3. 文件锁：各进程获取文件锁的次数、失败次数和失败率
+4. 监控记录：每次 /status 应写入一条监控记录，报告丢失的记录
+5. 吞吐量：按时间窗口的每秒请求数和p50/p99延迟
+
+计数不准确、活跃连接数没有回到0或丢失监控记录时退出码为1，
+可作为修改统计、缓存或监控后端时的验收检查。
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from harness import ROOT, LoadRunner, load_app
+from percentiles import histogram_percentile
+
+# 请求组合：(类型, 方法, 路径模板, 预期端点, 权重)
+REQUEST_MIX = [
+    ('greeting', 'GET', '/api/greeting?name=user{n}', 'greeting', 80),
+    ('status', 'GET', '/status', 'service_status', 5),
+    ('index', 'GET', '/', 'index', 5),
+    ('not_found', 'GET', '/missing/{n}', 'unknown', 5),
+    ('not_allowed', 'POST', '/api/greeting', 'unknown', 5),
+]
+
+def run_worker(task: Tuple[int, str, int, float, int, float]) -> Dict[str, Any]:
+    """一个工作进程：threads个线程持续发送请求直到duration秒后停止"""
+    index, workdir, threads, duration, names, sample_interval = task
+    main, app = load_app(workdir)
+    mix = {entry[0]: entry[1:4] for entry in REQUEST_MIX}
+    kinds = list(mix)
+    weights = [entry[4] for entry in REQUEST_MIX]
+
+    def pick(rng: random.Random) -> Tuple[str, str, str]:
+        kind = rng.choices(kinds, weights)[0]
+        method, template, _ = mix[kind]
+        return kind, method, template.format(n=rng.randrange(names))
+
+    runner = LoadRunner(app, pick, threads, seed=index * 1000)
+    samples: List[Tuple[int, int]] = []
+    stop = threading.Event()
+
+    def sampler():
+        # 请求线程之外采样活跃连接数，与客户端侧进行中的请求数比较
+        while not stop.wait(sample_interval):
+            samples.append((main.SERVICE_STATUS.active_connections, runner.in_flight))
+
+    sampler_thread = threading.Thread(target=sampler, daemon=True)
+    sampler_thread.start()
+    run = runner.run(duration)
+    stop.set()
+    sampler_thread.join()
+
+    tally: Counter = Counter()
+    for (kind, status), count in run['tally'].items():
+        method, _, endpoint = mix[kind]
+        tally[f"{kind}|{method}|{endpoint}|{status}"] += count
+    latencies: Counter = sum(run['latencies'].values(), Counter())
+
+    final_active = main.SERVICE_STATUS.active_connections
+    # 与优雅停止相同，刷新所有登记的子系统：计数写入统计文件或预写日志，待写的监控记录写入监控文件，再由父进程核对
+    main.SHUTDOWN.flush()
+    return {
+        'index': index,
+        'pid': os.getpid(),
+        'tally': dict(tally),
+        'latencies': dict(latencies),
+        'per_second': dict(run['per_second']),
+        'samples': samples,
+        'final_active': final_active,
+        'file_locks': main.FileLock.stats(),
+        'failures': run['failures']
+    }
+
+def expected_counters(tally: Counter) -> Dict[str, Any]:
+    """由客户端记录的请求推算 /status 应报告的计数"""
+    expected = {'total_requests': 0, 'request_methods': Counter(), 'status_codes': Counter(),
+                'popular_endpoints': Counter(), 'status_calls': 0}
+    for key, count in tally.items():
+        kind, method, endpoint, status = key.split('|')
+        expected['total_requests'] += count
+        expected['request_methods'][method] += count
+        if status != '0':
+            expected['status_codes'][status] += count
+        expected['popular_endpoints'][endpoint] += count
+        if kind == 'status':
+            expected['status_calls'] += count
+    return expected
+
+def compare(expected: Dict[str, int], reported: Dict[str, int]) -> Dict[str, Dict[str, int]]:
+    """逐项比较，lost 为正表示丢失的更新，为负表示多计"""
+    rows = {}
+    for key in sorted(set(expected) | set(reported), key=str):
+        want = expected.get(key, 0)
+        got = reported.get(key, 0)
+        rows[str(key)] = {'expected': want, 'reported': got, 'lost': want - got}
+    return rows
+
+def count_monitoring_records(directory: str) -> int:
+    total = 0
+    for path in glob.glob(os.path.join(directory, 'monitoring-*.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                total += len(json.load(f).get('records', []))
+        except (OSError, ValueError):
+            continue
+    return total
+
+def build_report(results: List[Dict[str, Any]], status: Dict[str, Any], monitoring_records: int,
+                 duration: float, interval: int) -> Dict[str, Any]:
+    tally: Counter = Counter()
+    latencies: Counter = Counter()
+    per_second: Counter = Counter()
+    for result in results:
+        tally.update(result['tally'])
+        latencies.update({int(key): value for key, value in result['latencies'].items()})
+        per_second.update({int(key): value for key, value in result['per_second'].items()})
+
+    expected = expected_counters(tally)
+    detailed = status['detailed_stats']
+    counters = {
+        'total_requests': compare({'total': expected['total_requests']},
+                                  {'total': status['basic_stats']['total_requests']})['total'],
+        'request_methods': compare(expected['request_methods'], detailed['request_methods']),
+        'status_codes': compare(expected['status_codes'], {str(k): v for k, v in detailed['status_codes'].items()}),
+        'popular_endpoints': compare(expected['popular_endpoints'], detailed['popular_endpoints'])
+    }
+    lost = counters['total_requests']['lost']
+    lost_rate = lost / expected['total_requests'] if expected['total_requests'] else 0.0
+
+    drift = [reported - actual for result in results for reported, actual in result['samples']]
+    file_locks = {'acquired': 0, 'failures': 0}
+    for result in results:
+        file_locks['acquired'] += result['file_locks']['acquired']
+        file_locks['failures'] += result['file_locks']['failures']
+    attempts = file_locks['acquired'] + file_locks['failures']
+    file_locks['failure_rate'] = round(file_locks['failures'] / attempts, 4) if attempts else 0.0
+
+    timeline = []
+    if per_second:
+        first = min(per_second)
+        windows: Counter = Counter()
+        for second, count in per_second.items():
+            windows[(second - first) // interval] += count
+        for window in range(max(windows) + 1):
+            timeline.append({'start_s': window * interval, 'rps': round(windows[window] / interval, 1)})
+
+    total = sum(tally.values())
+    mismatched = [f"{group}.{key}" for group, rows in counters.items() if group != 'total_requests'
+                  for key, row in rows.items() if row['lost']]
+    if counters['total_requests']['lost']:
+        mismatched.insert(0, 'total_requests')
+    return {
+        'requests': total,
+        'rps': round(total / duration, 1) if duration else 0.0,
+        'p50_ms': histogram_percentile(latencies, 50, scale=10),
+        'p99_ms': histogram_percentile(latencies, 99, scale=10),
+        'client_errors': sum(count for key, count in tally.items() if key.endswith('|0')),
+        'counters': counters,
+        'lost_updates': lost,
+        'lost_update_rate': round(lost_rate, 4),
+        'mismatched': mismatched,
+        'active_connections': {
+            'samples': len(drift),
+            'mean_drift': round(sum(drift) / len(drift), 3) if drift else 0.0,
+            'max_abs_drift': max((abs(value) for value in drift), default=0),
+            'final': [result['final_active'] for result in results]
+        },
+        'file_locks': file_locks,
+        'monitoring': {
+            'expected_records': expected['status_calls'],
+            'records': monitoring_records,
+            'lost': expected['status_calls'] - monitoring_records
+        },
+        'timeline': timeline,
+        'failures': [failure for result in results for failure in result['failures']][:20]
+    }
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n请求: {report['requests']}  吞吐量: {report['rps']} 请求/秒  "
+          f"p50: {report['p50_ms']}ms  p99: {report['p99_ms']}ms  客户端异常: {report['client_errors']}")
+
+    print("\n吞吐量变化")
+    for window in report['timeline']:
+        print(f"  {window['start_s']:>6}s  {window['rps']:>10.1f} 请求/秒")
+
+    total = report['counters']['total_requests']
+    print("\n计数核对（丢失为正，多计为负）")
+    print(f"  total_requests: 预期 {total['expected']}  报告 {total['reported']}  "
+          f"丢失 {total['lost']} ({report['lost_update_rate']:.2%})")
+    for group in ('request_methods', 'status_codes', 'popular_endpoints'):
+        for key, row in report['counters'][group].items():
+            marker = '' if not row['lost'] else '  ✗'
+            print(f"  {group}.{key}: 预期 {row['expected']}  报告 {row['reported']}{marker}")
+
+    active = report['active_connections']
+    print(f"\n活跃连接数: {active['samples']}次采样  平均偏差 {active['mean_drift']}  "
+          f"最大偏差 {active['max_abs_drift']}  结束时 {active['final']}")
+    locks = report['file_locks']
+    print(f"文件锁: 获取 {locks['acquired']}  失败 {locks['failures']}  失败率 {locks['failure_rate']:.2%}")
+    monitoring = report['monitoring']
+    print(f"监控记录: 预期 {monitoring['expected_records']}  实际 {monitoring['records']}  丢失 {monitoring['lost']}")
+    for failure in report['failures']:
+        print(f"  ! {failure}")
+
+def main():
+    parser = argparse.ArgumentParser(description="并发压力测试：核对计数准确性和文件锁行为")
+    parser.add_argument('--processes', '-p', type=int, default=4, help="工作进程数")
+    parser.add_argument('--threads', '-t', type=int, default=8, help="每个进程的并发线程数")
+    parser.add_argument('--duration', '-d', type=float, default=30.0, help="持续时间（秒）")
+    parser.add_argument('--backend', choices=['journal', 'file'], default='journal',
+                        help="统计存储：journal 为预写日志（默认），file 为每次请求重写统计文件")
+    parser.add_argument('--names', type=int, default=200, help="问候请求使用的不同名字数")
+    parser.add_argument('--interval', type=int, default=5, help="吞吐量变化的统计窗口（秒）")
+    parser.add_argument('--sample-interval', type=float, default=0.05, help="活跃连接数的采样间隔（秒）")
+    parser.add_argument('--report', '-r', help="输出JSON报告的路径")
+    parser.add_argument('--keep', action='store_true', help="保留临时工作目录")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='soak-test-')
+    # 工作进程继承这些环境变量：所有请求完整统计，按选择的后端存储
+    os.environ['STATS_UNROUTED_TIER'] = 'full'
+    os.environ['STATS_JOURNAL'] = '1' if args.backend == 'journal' else '0'
+    print(f"工作目录: {workdir}")
+    print(f"负载: {args.processes}个进程 × {args.threads}个线程, {args.duration}秒, 统计后端 {args.backend}")
+
+    tasks = [(index, workdir, args.threads, args.duration, args.names, args.sample_interval)
+             for index in range(args.processes)]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        results = list(executor.map(run_worker, tasks))
+    elapsed = time.perf_counter() - started
+
+    # 所有工作进程退出后，在新的进程状态中读取 /status 报告的计数
+    monitoring_records = count_monitoring_records(os.path.join(workdir, 'monitoring'))
+    service, _ = load_app(workdir)
+    report = build_report(results, service.build_status(), monitoring_records,
+                          min(elapsed, args.duration), args.interval)
+    report['config'] = vars(args)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if not args.keep:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    passed = (not report['mismatched'] and report['monitoring']['lost'] == 0
+              and not any(report['active_connections']['final']))
+    print("\n✅ 计数准确" if passed else "\n❌ 计数不准确或丢失更新")
+    sys.exit(0 if passed else 1)
+
+if __name__ == '__main__':
+    main()